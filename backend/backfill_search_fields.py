@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Rattrapage ponctuel des données dérivées, à lancer une fois après une mise à jour ou un import
+fait hors de l'API (le serveur ne le fait plus au démarrage) :
+  - champs copiés "search" et "location" des moniteurs et des cours qui ne les ont pas
+  - stations recopiées dans MongoDB avec leur point GeoJSON
+  - inventaire station_availability recalculé entièrement
+Le script peut être relancé sans risque : chaque étape réécrit les mêmes valeurs.
+
+Usage : python3 backfill_search_fields.py [--skip-availability]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from server import client, rebuild_availability, refresh_instructor_copies, sync_stations
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skip-availability", action="store_true", help="Ne recalcule pas l'inventaire")
+    args = parser.parse_args()
+
+    steps = [("Champs copiés search/location", refresh_instructor_copies), ("Stations", sync_stations)]
+    if not args.skip_availability:
+        steps.append(("Inventaire station_availability", rebuild_availability))
+    try:
+        for label, step in steps:
+            start = time.perf_counter()
+            await step()
+            print(f"✅ {label} : {time.perf_counter() - start:.1f} s")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
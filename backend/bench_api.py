@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Benchmark de performance de l'API, en process
+Lance l'app FastAPI via un transport ASGI (pas de réseau) contre un MongoDB local,
+insère un volume de données configurable puis mesure p50/p95/p99 et débit
+des endpoints clés. Les résultats sont enregistrés en JSON et peuvent être
+comparés à une baseline.
+
+Usage :
+    python3 bench_api.py --mongo-url mongodb://localhost:27017 --db skimonitor_bench --reset \\
+        --instructors 1000 --lessons 100000 --bookings 500000 --output bench.json
+    python3 bench_api.py --skip-seed --baseline bench.json --output bench_new.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=os.environ.get("BENCH_MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default=os.environ.get("BENCH_DB_NAME", "skimonitor_bench"))
+    parser.add_argument("--reset", action="store_true", help="Supprime la base de benchmark avant le seeding")
+    parser.add_argument("--skip-seed", action="store_true", help="Réutilise les données déjà présentes")
+    parser.add_argument("--seed", type=int, default=42, help="Graine aléatoire")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--instructors", type=int, default=1000)
+    parser.add_argument("--lessons", type=int, default=100000)
+    parser.add_argument("--bookings", type=int, default=500000)
+    parser.add_argument("--transactions", type=int, default=50000)
+    parser.add_argument("--requests", type=int, default=200, help="Requêtes par endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--with-cache", action="store_true", help="Laisse le cache de réponses actif")
+    parser.add_argument("--only", nargs="*", help="Noms des scénarios à exécuter")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Fichier JSON d'une exécution précédente à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="Régression p95 tolérée (0.20 = +20%%)")
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+
+# server.py lit sa configuration à l'import
+os.environ["MONGO_URL"] = ARGS.mongo_url
+os.environ["DB_NAME"] = ARGS.db
+# Un seul client rejoue les scénarios en boucle : sans cela il serait limité (429/503)
+os.environ.setdefault("ADMISSION_CONTROL", "off")
+sys.path.insert(0, str(Path(__file__).parent))
+
+import httpx
+import server
+
+BATCH_SIZE = 10000
+ADMIN_TOKEN = "bench_admin_session"
+CLIENT_TOKEN = "bench_client_session"
+INSTRUCTOR_TOKEN = "bench_instructor_session"
+
+
+async def insert_batched(collection, docs):
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= BATCH_SIZE:
+            await collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+
+
+async def seed(db, rng: random.Random):
+    """Insère les volumes demandés ; renvoie les ids utiles aux scénarios"""
+    now = datetime.now(timezone.utc)
+    stations = [s["id"] for s in server.SKI_STATIONS]
+    levels = ["Débutant", "Intermédiaire", "Avancé", "Expert"]
+    specialties = ["Ski alpin", "Snowboard", "Freestyle", "Hors-piste", "Ski de fond"]
+
+    user_ids = [str(uuid.uuid4()) for _ in range(ARGS.users)]
+    instructor_user_ids = [str(uuid.uuid4()) for _ in range(ARGS.instructors)]
+    print(f"👤 {len(user_ids) + len(instructor_user_ids)} utilisateurs")
+    await insert_batched(db.users, (
+        {"id": uid, "email": f"bench{i}@skimonitor-bench.fr", "name": f"Client {i}", "picture": None,
+         "role": "client", "created_at": now.isoformat()}
+        for i, uid in enumerate(user_ids)
+    ))
+    await insert_batched(db.users, (
+        {"id": uid, "email": f"moniteur{i}@skimonitor-bench.fr", "name": f"Moniteur {i}", "picture": None,
+         "role": "instructor", "created_at": now.isoformat()}
+        for i, uid in enumerate(instructor_user_ids)
+    ))
+
+    instructor_ids = [str(uuid.uuid4()) for _ in range(ARGS.instructors)]
+    print(f"🎿 {len(instructor_ids)} moniteurs")
+    await insert_batched(db.instructors, (
+        {"id": iid, "user_id": instructor_user_ids[i], "bio": "Moniteur de benchmark",
+         "specialties": rng.sample(specialties, 2), "ski_levels": rng.sample(levels, 2),
+         "hourly_rate": float(rng.randint(45, 95)), "station_id": rng.choice(stations),
+         "status": "approved", "created_at": now.isoformat()}
+        for i, iid in enumerate(instructor_ids)
+    ))
+
+    lesson_ids = [str(uuid.uuid4()) for _ in range(ARGS.lessons)]
+    lesson_dates = {}
+
+    def lessons():
+        for lid in lesson_ids:
+            date = (now + timedelta(days=rng.randint(-60, 60))).strftime("%Y-%m-%d")
+            lesson_dates[lid] = date
+            start = rng.randint(9, 15)
+            lesson_type = rng.choice(["private", "group"])
+            yield {
+                "id": lid, "instructor_id": rng.choice(instructor_ids), "lesson_type": lesson_type,
+                "title": "Cours de benchmark", "description": "", "date": date,
+                "start_time": f"{start:02d}:00", "end_time": f"{start + 2:02d}:00",
+                "max_participants": 1 if lesson_type == "private" else 8, "current_participants": 0,
+                "price": float(rng.randint(60, 200)), "status": "available", "is_recurring": False,
+                "created_at": now.isoformat(),
+            }
+
+    print(f"📅 {len(lesson_ids)} cours")
+    await insert_batched(db.lessons, lessons())
+
+    # The benchmark client gets a realistic history for GET /bookings
+    client_id = user_ids[0]
+    booking_ids = []
+
+    def bookings():
+        for i in range(ARGS.bookings):
+            bid = str(uuid.uuid4())
+            booking_ids.append(bid)
+            yield {
+                "id": bid, "lesson_id": rng.choice(lesson_ids),
+                "user_id": client_id if i < 50 else rng.choice(user_ids),
+                "participants": 1, "status": rng.choice(["pending", "confirmed", "confirmed", "cancelled"]),
+                "payment_status": "paid", "payment_session_id": None,
+                "created_at": (now - timedelta(days=rng.randint(0, 120))).isoformat(),
+            }
+
+    print(f"🧾 {ARGS.bookings} réservations")
+    await insert_batched(db.bookings, bookings())
+
+    def transactions():
+        for _ in range(ARGS.transactions):
+            amount = float(rng.randint(60, 200))
+            commission = round(amount * server.PLATFORM_COMMISSION, 2)
+            yield {
+                "id": str(uuid.uuid4()), "session_id": str(uuid.uuid4()), "user_id": rng.choice(user_ids),
+                "booking_id": rng.choice(booking_ids), "amount": amount, "commission": commission,
+                "instructor_amount": round(amount - commission, 2), "currency": "eur",
+                "status": "paid", "payment_status": "paid", "metadata": None,
+                "created_at": (now - timedelta(days=rng.randint(0, 120))).isoformat(),
+            }
+
+    print(f"💶 {ARGS.transactions} transactions")
+    await insert_batched(db.payment_transactions, transactions())
+
+    admin_id = str(uuid.uuid4())
+    await db.users.insert_one({"id": admin_id, "email": "admin@skimonitor-bench.fr", "name": "Admin Bench",
+                               "role": "admin", "created_at": now.isoformat()})
+    expires = now + timedelta(days=7)
+    for token, uid in ((ADMIN_TOKEN, admin_id), (CLIENT_TOKEN, client_id), (INSTRUCTOR_TOKEN, instructor_user_ids[0])):
+        await db.user_sessions.insert_one({"id": str(uuid.uuid4()), "user_id": uid, "session_token": token,
+                                           "expires_at": expires, "created_at": now})
+
+
+async def scenario_params(db):
+    """Valeurs réelles à injecter dans les URLs (indépendantes du seeding courant)"""
+    instructor = await db.instructors.find_one({"status": "approved"}, {"_id": 0, "id": 1, "station_id": 1})
+    lesson = await db.lessons.find_one({"status": "available"}, {"_id": 0, "id": 1, "date": 1})
+    return {
+        "instructor_id": instructor["id"] if instructor else "",
+        "station_id": instructor["station_id"] if instructor else "",
+        "lesson_id": lesson["id"] if lesson else "",
+        "date": lesson["date"] if lesson else "",
+    }
+
+
+def scenarios(params):
+    admin = {"Authorization": f"Bearer {ADMIN_TOKEN}"}
+    client = {"Authorization": f"Bearer {CLIENT_TOKEN}"}
+    instructor = {"Authorization": f"Bearer {INSTRUCTOR_TOKEN}"}
+    return [
+        ("lessons", "/api/lessons", {}),
+        ("lessons_by_station", f"/api/lessons?station_id={params['station_id']}", {}),
+        ("lessons_by_date", f"/api/lessons?date={params['date']}", {}),
+        ("lesson_detail", f"/api/lessons/{params['lesson_id']}", {}),
+        ("instructors", "/api/instructors", {}),
+        ("instructor_detail", f"/api/instructors/{params['instructor_id']}", {}),
+        ("bookings", "/api/bookings", client),
+        ("my_lessons", "/api/my-lessons", instructor),
+        ("instructor_stats", "/api/instructor/stats", instructor),
+        ("admin_stats", "/api/admin/stats", admin),
+        ("admin_transactions", "/api/admin/transactions", admin),
+        ("instructor_export", "/api/instructor/export", instructor),
+        ("admin_export", "/api/admin/export", admin),
+    ]
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+async def run_scenario(http, url, headers):
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(ARGS.concurrency)
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await http.get(url, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    await one()  # warm-up
+    latencies.clear()
+    errors = 0
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(ARGS.requests)))
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+        "throughput_rps": round(len(latencies) / wall, 1),
+    }
+
+
+def compare(results, baseline_path):
+    """Affiche l'écart de p95 avec la baseline ; renvoie True en cas de régression"""
+    baseline = json.loads(Path(baseline_path).read_text())["results"]
+    regressed = False
+    print(f"\n{'Scénario':<22}{'p95 base':>10}{'p95 actuel':>12}{'Écart':>9}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["p95_ms"], result["p95_ms"]
+        delta = (after - before) / before if before else 0.0
+        flag = ""
+        if delta > ARGS.tolerance:
+            flag = "  ⚠️ régression"
+            regressed = True
+        print(f"{name:<22}{before:>10.2f}{after:>12.2f}{delta:>+8.0%}{flag}")
+    return regressed
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+                                       text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+async def main():
+    db = server.db
+    if ARGS.reset:
+        print(f"🗑️  Suppression de la base {ARGS.db}")
+        await server.client.drop_database(ARGS.db)
+    if not ARGS.skip_seed:
+        seed_start = time.perf_counter()
+        await seed(db, random.Random(ARGS.seed))
+        print(f"⏱️  Seeding : {time.perf_counter() - seed_start:.1f}s\n")
+
+    await server.app.router.startup()
+    if not ARGS.with_cache:
+        server.response_cache.max_entries = 0
+
+    params = await scenario_params(db)
+    results = {}
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as http:
+        print(f"{'Scénario':<22}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>9}{'err':>6}")
+        for name, url, headers in scenarios(params):
+            if ARGS.only and name not in ARGS.only:
+                continue
+            result = await run_scenario(http, url, headers)
+            results[name] = result
+            print(f"{name:<22}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+                  f"{result['throughput_rps']:>9.1f}{result['errors']:>6}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "db": ARGS.db,
+            "volumes": {
+                "users": await db.users.estimated_document_count(),
+                "instructors": await db.instructors.estimated_document_count(),
+                "lessons": await db.lessons.estimated_document_count(),
+                "bookings": await db.bookings.estimated_document_count(),
+                "transactions": await db.payment_transactions.estimated_document_count(),
+            },
+            "requests": ARGS.requests,
+            "concurrency": ARGS.concurrency,
+            "response_cache": ARGS.with_cache,
+        },
+        "results": results,
+    }
+    Path(ARGS.output).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"\n💾 Résultats enregistrés dans {ARGS.output}")
+
+    await server.app.router.shutdown()
+    if ARGS.baseline and compare(results, ARGS.baseline):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Harnais de charge "rush de réservations"
+Simule l'ouverture des cours collectifs d'un moniteur populaire : des centaines
+de clients envoient POST /api/bookings (et une partie annule) en même temps sur
+l'app en process, adossée à un MongoDB local. Mesure débit et latences, puis
+vérifie les invariants :
+  - aucun cours avec current_participants > max_participants
+  - aucune réservation active en double pour un même client et un même cours
+  - current_participants égal à la somme des réservations actives
+
+La base doit être vide, ou supprimée avec --reset ; son nom doit contenir "bench" ou "rush"
+(--any-db pour passer outre), pour ne jamais vider une vraie base par erreur.
+
+Usage : python3 bench_booking_rush.py --reset --clients 500 --lessons 5 --seats 8 --cancel-ratio 0.2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=os.environ.get("BENCH_MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default=os.environ.get("BENCH_DB_NAME", "skimonitor_rush"))
+    parser.add_argument("--reset", action="store_true", help="Supprime la base de benchmark avant le seeding")
+    parser.add_argument("--any-db", action="store_true", help="Accepte un nom de base sans \"bench\" ni \"rush\"")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--lessons", type=int, default=5, help="Cours collectifs ouverts en même temps")
+    parser.add_argument("--seats", type=int, default=8, help="Places par cours")
+    parser.add_argument("--attempts", type=int, default=2, help="Tentatives de réservation par client")
+    parser.add_argument("--cancel-ratio", type=float, default=0.2, help="Part des réservations réussies annulées")
+    parser.add_argument("--concurrency", type=int, default=200, help="Requêtes simultanées maximum")
+    parser.add_argument("--output", default="booking_rush_results.json")
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+if not ARGS.any_db and not any(marker in ARGS.db.lower() for marker in ("bench", "rush")):
+    sys.exit(f"❌ La base {ARGS.db!r} ne ressemble pas à une base de benchmark (\"bench\" ou \"rush\" dans le nom) : "
+             f"--any-db pour l'utiliser quand même")
+
+os.environ["MONGO_URL"] = ARGS.mongo_url
+os.environ["DB_NAME"] = ARGS.db
+# On mesure le chemin de réservation, pas la limitation de débit (tous les clients simulés partagent une IP)
+os.environ.setdefault("ADMISSION_CONTROL", "off")
+sys.path.insert(0, str(Path(__file__).parent))
+
+import httpx
+import server
+
+# The simulated emails are logged at INFO and would dominate the run
+logging.getLogger("server").setLevel(logging.WARNING)
+
+
+async def seed(db):
+    """Un moniteur approuvé, ses cours collectifs et les sessions des clients"""
+    if ARGS.reset:
+        print(f"🗑️  Suppression de la base {ARGS.db}")
+        await server.client.drop_database(ARGS.db)
+    elif await db.list_collection_names():
+        sys.exit(f"❌ La base {ARGS.db} n'est pas vide : --reset pour la supprimer avant le rush")
+    now = datetime.now(timezone.utc)
+    expires = now + timedelta(days=1)
+
+    instructor_user_id = str(uuid.uuid4())
+    instructor_id = str(uuid.uuid4())
+    await db.users.insert_one({"id": instructor_user_id, "email": "star@skimonitor-rush.fr", "name": "Moniteur Star",
+                               "role": "instructor", "created_at": now.isoformat()})
+    await db.instructors.insert_one({"id": instructor_id, "user_id": instructor_user_id, "bio": "", "specialties": ["Freestyle"],
+                                     "ski_levels": ["Avancé"], "hourly_rate": 80.0, "station_id": "tignes",
+                                     "status": "approved", "created_at": now.isoformat()})
+
+    lesson_ids = [str(uuid.uuid4()) for _ in range(ARGS.lessons)]
+    date = (now + timedelta(days=3)).strftime("%Y-%m-%d")
+    await db.lessons.insert_many([
+        {"id": lid, "instructor_id": instructor_id, "lesson_type": "group", "title": f"Stage freestyle {i + 1}",
+         "description": "", "date": date, "start_time": f"{9 + i:02d}:00", "end_time": f"{10 + i:02d}:00",
+         "max_participants": ARGS.seats, "current_participants": 0, "price": 80.0, "status": "available",
+         "is_recurring": False, "created_at": now.isoformat()}
+        for i, lid in enumerate(lesson_ids)
+    ])
+
+    tokens = []
+    users, sessions = [], []
+    for i in range(ARGS.clients):
+        uid = str(uuid.uuid4())
+        token = f"rush_{uid}"
+        tokens.append(token)
+        users.append({"id": uid, "email": f"client{i}@skimonitor-rush.fr", "name": f"Client {i}", "role": "client",
+                      "created_at": now.isoformat()})
+        sessions.append({"id": str(uuid.uuid4()), "user_id": uid, "session_token": token, "expires_at": expires,
+                         "created_at": now})
+    await db.users.insert_many(users)
+    await db.user_sessions.insert_many(sessions)
+    return lesson_ids, tokens
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(latencies, statuses, wall):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "statuses": dict(Counter(statuses)),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else 0.0,
+    }
+
+
+async def rush(http, lesson_ids, tokens, rng: random.Random):
+    """Toutes les tentatives de réservation partent en même temps, puis les annulations"""
+    semaphore = asyncio.Semaphore(ARGS.concurrency)
+    booked = []
+    book_latencies, book_statuses = [], []
+
+    async def book(token, lesson_id):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await http.post("/api/bookings", json={"lesson_id": lesson_id},
+                                       headers={"Authorization": f"Bearer {token}"})
+            book_latencies.append(time.perf_counter() - start)
+            book_statuses.append(response.status_code)
+            if response.status_code == 200:
+                booked.append((token, response.json()["id"]))
+
+    # Each client hammers the same lesson(s) several times, like double clicks and retries
+    attempts = []
+    for token in tokens:
+        targets = rng.sample(lesson_ids, min(2, len(lesson_ids)))
+        attempts += [(token, rng.choice(targets)) for _ in range(ARGS.attempts)]
+    rng.shuffle(attempts)
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(book(token, lesson_id) for token, lesson_id in attempts))
+    bookings = summarize(book_latencies, book_statuses, time.perf_counter() - wall_start)
+
+    cancel_latencies, cancel_statuses = [], []
+
+    async def cancel(token, booking_id):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await http.delete(f"/api/bookings/{booking_id}", headers={"Authorization": f"Bearer {token}"})
+            cancel_latencies.append(time.perf_counter() - start)
+            cancel_statuses.append(response.status_code)
+
+    to_cancel = rng.sample(booked, int(len(booked) * ARGS.cancel_ratio))
+    retries = [(token, lesson_id) for token, lesson_id in attempts[: len(to_cancel)]]
+    wall_start = time.perf_counter()
+    # Cancellations race with a second wave of booking attempts on the freed seats
+    await asyncio.gather(
+        *(cancel(token, booking_id) for token, booking_id in to_cancel),
+        *(book(token, lesson_id) for token, lesson_id in retries),
+    )
+    cancellations = summarize(cancel_latencies, cancel_statuses, time.perf_counter() - wall_start)
+    return bookings, cancellations
+
+
+async def check_invariants(db, lesson_ids):
+    """Compare l'état des cours aux réservations réellement enregistrées"""
+    violations = []
+    lessons = await db.lessons.find({"id": {"$in": lesson_ids}}, {"_id": 0}).to_list(None)
+    bookings = await db.bookings.find({"lesson_id": {"$in": lesson_ids}}, {"_id": 0}).to_list(None)
+
+    active = defaultdict(list)
+    for booking in bookings:
+        if booking["status"] != "cancelled":
+            active[booking["lesson_id"]].append(booking)
+
+    for lesson in lessons:
+        lesson_bookings = active[lesson["id"]]
+        seats = sum(b["participants"] for b in lesson_bookings)
+        if lesson["current_participants"] > lesson["max_participants"]:
+            violations.append(f"{lesson['title']}: {lesson['current_participants']} participants pour {lesson['max_participants']} places")
+        if seats > lesson["max_participants"]:
+            violations.append(f"{lesson['title']}: {seats} places réservées pour {lesson['max_participants']} places")
+        if seats != lesson["current_participants"]:
+            violations.append(f"{lesson['title']}: compteur {lesson['current_participants']} ≠ {seats} places réservées")
+        duplicates = [uid for uid, n in Counter(b["user_id"] for b in lesson_bookings).items() if n > 1]
+        if duplicates:
+            violations.append(f"{lesson['title']}: {len(duplicates)} client(s) avec plusieurs réservations actives")
+    return violations
+
+
+async def main():
+    db = server.db
+    lesson_ids, tokens = await seed(db)
+    await server.app.router.startup()
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://rush", timeout=None) as http:
+        bookings, cancellations = await rush(http, lesson_ids, tokens, random.Random(ARGS.seed))
+
+    violations = await check_invariants(db, lesson_ids)
+    await server.app.router.shutdown()
+
+    for label, result in (("Réservations", bookings), ("Annulations", cancellations)):
+        print(f"{label:<24} {result['requests']:>6} req  p50 {result['p50_ms']:>8.1f} ms  p95 {result['p95_ms']:>8.1f} ms"
+              f"  p99 {result['p99_ms']:>8.1f} ms  {result['throughput_rps']:>7.1f} req/s  {result['statuses']}")
+
+    throttled = sum(result["statuses"].get(code, 0) for result in (bookings, cancellations) for code in (429, 503))
+    if throttled:
+        print(f"\n⚠️  {throttled} requête(s) refusée(s) par la limitation de débit (ADMISSION_CONTROL=off pour l'éviter)")
+
+    if violations:
+        print(f"\n❌ {len(violations)} invariant(s) violé(s) :")
+        for violation in violations:
+            print(f"   - {violation}")
+    else:
+        print("\n✅ Invariants respectés")
+
+    report = {
+        "meta": {"timestamp": datetime.now(timezone.utc).isoformat(), "clients": ARGS.clients, "lessons": ARGS.lessons,
+                 "seats": ARGS.seats, "attempts": ARGS.attempts, "cancel_ratio": ARGS.cancel_ratio,
+                 "concurrency": ARGS.concurrency},
+        "bookings": bookings,
+        "cancellations": cancellations,
+        "violations": violations,
+    }
+    Path(ARGS.output).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"💾 Résultats enregistrés dans {ARGS.output}")
+    sys.exit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Benchmark du moteur d'inventaire des cours (LESSON_ENGINE=numpy) face aux requêtes MongoDB
+Sur une base déjà remplie (generate_season.py ou bench_api.py), construit le moteur en
+mémoire puis rejoue les mêmes combinaisons aléatoires de filtres de GET /api/lessons
+(station, type, niveau, prix, places restantes, plage de dates et d'heures) :
+  - chemin MongoDB : find + tri (date, start_time, id) + limite de 100
+  - chemin moteur : masques NumPy, puis lecture de la seule page trouvée dans MongoDB
+Vérifie que les deux chemins renvoient les mêmes cours dans le même ordre et mesure
+p50/p95/p99 de chacun.
+
+Usage : python3 bench_lesson_engine.py --db skimonitor_season --queries 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=os.environ.get("BENCH_MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default=os.environ.get("BENCH_DB_NAME", "skimonitor_bench"))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--queries", type=int, default=500, help="Combinaisons de filtres rejouées")
+    parser.add_argument("--output", default="lesson_engine_results.json")
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+
+os.environ["MONGO_URL"] = ARGS.mongo_url
+os.environ["DB_NAME"] = ARGS.db
+os.environ["LESSON_ENGINE"] = "numpy"
+sys.path.insert(0, str(Path(__file__).parent))
+
+import server
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    return {
+        "queries": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+async def filter_sets(db, rng: random.Random):
+    """Combinaisons de filtres tirées des valeurs réellement présentes"""
+    stations = [s for s in await db.lessons.distinct("search.station_id", {"status": "available"}) if s]
+    levels = await db.lessons.distinct("search.ski_levels", {"status": "available"})
+    first = await db.lessons.find_one({"status": "available"}, {"_id": 0, "date": 1}, sort=[("date", 1)])
+    last = await db.lessons.find_one({"status": "available"}, {"_id": 0, "date": 1}, sort=[("date", -1)])
+    if not first:
+        sys.exit("❌ Aucun cours disponible dans cette base")
+    start, end = date.fromisoformat(first["date"]), date.fromisoformat(last["date"])
+    span = max((end - start).days, 1)
+
+    sets = []
+    for _ in range(ARGS.queries):
+        day = start + timedelta(days=rng.randrange(span))
+        filters = {
+            "station_id": rng.choice(stations) if stations and rng.random() < 0.6 else None,
+            "lesson_type": rng.choice(["private", "group"]) if rng.random() < 0.4 else None,
+            "level": rng.choice(levels) if levels and rng.random() < 0.3 else None,
+            "max_price": float(rng.choice([80, 150, 250])) if rng.random() < 0.4 else None,
+            "min_seats": rng.choice([1, 2, 4]) if rng.random() < 0.3 else None,
+            "date_from": day.isoformat() if rng.random() < 0.7 else None,
+            "date_to": (day + timedelta(days=rng.choice([0, 2, 6]))).isoformat() if rng.random() < 0.5 else None,
+            "start_after": rng.choice(["09:00", "10:00", "13:00"]) if rng.random() < 0.3 else None,
+            "start_before": rng.choice(["12:00", "15:00"]) if rng.random() < 0.3 else None,
+        }
+        sets.append(filters)
+    return sets
+
+
+def mongo_query(filters):
+    return server.lesson_query(None, None, filters["lesson_type"], None, filters["max_price"], filters["station_id"],
+                               filters["level"], date_from=filters["date_from"], date_to=filters["date_to"],
+                               start_after=filters["start_after"], start_before=filters["start_before"],
+                               min_seats=filters["min_seats"])
+
+
+async def mongo_path(db, filters):
+    return await db.lessons.find(mongo_query(filters), {"_id": 0}).sort(server.LESSON_SORT).to_list(100)
+
+
+async def engine_path(db, filters):
+    # Comme GET /api/lessons : la page choisie est relue avec le filtre complet
+    lesson_ids = server.lesson_engine.select(**filters)
+    query = {**mongo_query(filters), "id": {"$in": lesson_ids}}
+    found = {l["id"]: l for l in await db.lessons.find(query, {"_id": 0}).to_list(None)}
+    return [found[lesson_id] for lesson_id in lesson_ids if lesson_id in found]
+
+
+async def main():
+    db = server.db
+    print("🔄 Mise à jour des champs recopiés (station, niveaux) des cours...")
+    await server.refresh_instructor_copies()
+
+    start = time.perf_counter()
+    await server.lesson_engine.build()
+    build_seconds = time.perf_counter() - start
+    engine = server.lesson_engine
+    rows = len(engine.ids)
+    column_bytes = sum(column.nbytes for column in engine.columns.values())
+    print(f"🧮 Moteur construit en {build_seconds:.2f} s : {rows} cours disponibles, colonnes {column_bytes / 1e6:.1f} Mo")
+    if engine.irregular:
+        print(f"⚠️  {len(engine.irregular)} cours disponibles illisibles (date, heure, prix ou places) : "
+              f"absents des résultats du moteur")
+
+    sets = await filter_sets(db, random.Random(ARGS.seed))
+    mongo_latencies, engine_latencies, mask_latencies = [], [], []
+    mismatches = []
+    for filters in sets:
+        t0 = time.perf_counter()
+        expected = await mongo_path(db, filters)
+        t1 = time.perf_counter()
+        got = await engine_path(db, filters)
+        t2 = time.perf_counter()
+        engine.select(**filters)
+        mask_latencies.append(time.perf_counter() - t2)
+        mongo_latencies.append(t1 - t0)
+        engine_latencies.append(t2 - t1)
+        if [l["id"] for l in expected] != [l["id"] for l in got]:
+            mismatches.append(filters)
+
+    results = {"mongo": summarize(mongo_latencies), "engine": summarize(engine_latencies),
+               "engine_masks_only": summarize(mask_latencies)}
+    for label, result in (("MongoDB", results["mongo"]), ("Moteur + page Mongo", results["engine"]),
+                          ("Moteur (masques seuls)", results["engine_masks_only"])):
+        print(f"{label:<24} p50 {result['p50_ms']:>8.2f} ms  p95 {result['p95_ms']:>8.2f} ms  p99 {result['p99_ms']:>8.2f} ms")
+    speedup = results["mongo"]["p50_ms"] / results["engine"]["p50_ms"] if results["engine"]["p50_ms"] else 0.0
+    print(f"\n⚡ Gain p50 : x{speedup:.1f}")
+
+    if mismatches:
+        print(f"❌ {len(mismatches)} combinaison(s) avec des résultats différents, par exemple : {mismatches[0]}")
+    else:
+        print("✅ Résultats identiques sur toutes les combinaisons")
+
+    report = {
+        "meta": {"timestamp": datetime.now(timezone.utc).isoformat(), "db": ARGS.db, "queries": ARGS.queries,
+                 "rows": rows, "column_bytes": column_bytes, "build_seconds": round(build_seconds, 3)},
+        **results,
+        "mismatches": mismatches,
+    }
+    Path(ARGS.output).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"💾 Résultats enregistrés dans {ARGS.output}")
+    server.client.close()
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark de sérialisation JSON des réponses de listing
+Compare le chemin FastAPI par défaut (jsonable_encoder + json) au chemin orjson
+(FastJSONResponse) sur des listings de 100 éléments, en temps CPU par requête.
+
+Usage : python3 bench_serialization.py [--items 100] [--rounds 500]
+"""
+import argparse
+import os
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+
+# server.py lit ces variables à l'import ; aucune connexion n'est ouverte ici
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "skimonitor_bench")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from server import FastJSONResponse, SKI_STATIONS
+
+
+def make_instructor(idx: int) -> dict:
+    """Moniteur tel que renvoyé par /api/instructors (user et station embarqués)"""
+    station = SKI_STATIONS[idx % len(SKI_STATIONS)]
+    user_id = str(uuid.uuid4())
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "bio": "Moniteur diplômé d'État avec 12 ans d'expérience, cours adaptés à tous les niveaux.",
+        "specialties": ["Ski alpin", "Hors-piste", "Freestyle"],
+        "ski_levels": ["Débutant", "Intermédiaire", "Avancé"],
+        "hourly_rate": 50.0 + idx % 40,
+        "station_id": station["id"],
+        "status": "approved",
+        "created_at": datetime.now(timezone.utc),
+        "user": {
+            "id": user_id,
+            "email": f"moniteur{idx}@skimonitor-demo.fr",
+            "name": f"Moniteur {idx}",
+            "picture": f"https://api.dicebear.com/7.x/avataaars/svg?seed={idx}",
+            "role": "instructor",
+            "created_at": datetime.now(timezone.utc),
+        },
+        "station": station,
+    }
+
+
+def make_lesson(idx: int) -> dict:
+    """Cours tel que renvoyé par /api/lessons"""
+    day = datetime.now(timezone.utc) + timedelta(days=idx % 30)
+    instructor = make_instructor(idx)
+    return {
+        "id": str(uuid.uuid4()),
+        "instructor_id": instructor["id"],
+        "lesson_type": "group" if idx % 2 else "private",
+        "title": "Cours particulier de ski",
+        "description": "Cours adapté à votre niveau pour une progression optimale.",
+        "date": day.strftime("%Y-%m-%d"),
+        "start_time": "09:00",
+        "end_time": "11:00",
+        "max_participants": 6,
+        "current_participants": idx % 6,
+        "price": 130.0,
+        "status": "available",
+        "is_recurring": False,
+        "recurrence_type": None,
+        "recurrence_end_date": None,
+        "parent_lesson_id": None,
+        "created_at": day,
+        "instructor": instructor,
+    }
+
+
+def default_path(content) -> bytes:
+    """Ce que fait FastAPI pour un dict renvoyé sans response_model"""
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def fast_path(content) -> bytes:
+    return FastJSONResponse(content).body
+
+
+def measure(fn, content, rounds: int) -> float:
+    """Temps CPU moyen par requête, en millisecondes"""
+    fn(content)
+    start = time.process_time()
+    for _ in range(rounds):
+        fn(content)
+    return (time.process_time() - start) / rounds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=500)
+    args = parser.parse_args()
+
+    listings = {
+        "/api/lessons": [make_lesson(i) for i in range(args.items)],
+        "/api/instructors": [make_instructor(i) for i in range(args.items)],
+    }
+
+    print(f"{'Endpoint':<20}{'Taille':>10}{'Avant (ms)':>14}{'Après (ms)':>14}{'Gain':>8}")
+    for endpoint, content in listings.items():
+        before = measure(default_path, content, args.rounds)
+        after = measure(fast_path, content, args.rounds)
+        size = len(fast_path(content))
+        print(f"{endpoint:<20}{size:>10}{before:>14.3f}{after:>14.3f}{before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
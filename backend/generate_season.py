@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Générateur de données synthétiques à l'échelle d'une saison
+Produit de façon déterministe (graine fixe) des clients, des moniteurs répartis
+sur toutes les stations de SKI_STATIONS, des cours récurrents, des réservations,
+des transactions et des avis, avec une répartition réaliste : stations
+populaires beaucoup plus demandées, pics le week-end et pendant les vacances
+scolaires. Les écritures passent par des insert_many par lots, en parallèle.
+
+Usage :
+    python3 generate_season.py --users 50000 --instructors 2000 --seed 2025 --drop
+    python3 generate_season.py --season-start 2025-12-20 --season-end 2026-04-19 --workers 8
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from itertools import accumulate
+from datetime import date, datetime, time as dtime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL"))
+    parser.add_argument("--db", default=os.environ.get("DB_NAME"))
+    parser.add_argument("--drop", action="store_true", help="Vide les collections générées avant d'écrire")
+    parser.add_argument("--seed", type=int, default=2025, help="Graine : même graine, mêmes données")
+    parser.add_argument("--users", type=int, default=50000, help="Clients")
+    parser.add_argument("--instructors", type=int, default=2000)
+    parser.add_argument("--season-start", default="2025-12-20")
+    parser.add_argument("--season-end", default="2026-04-19")
+    parser.add_argument("--today", help="Date de référence passé/futur (défaut : milieu de saison)")
+    parser.add_argument("--review-rate", type=float, default=0.25, help="Part des cours passés notés")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=4, help="insert_many simultanés")
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+
+# server.py lit sa configuration à l'import
+if ARGS.mongo_url:
+    os.environ["MONGO_URL"] = ARGS.mongo_url
+if ARGS.db:
+    os.environ["DB_NAME"] = ARGS.db
+sys.path.insert(0, str(Path(__file__).parent))
+
+from server import (db, client, SKI_STATIONS, STATION_COORDS, PLATFORM_COMMISSION, lesson_starts_at,
+                    instructor_copies, lesson_copies, rebuild_availability)
+
+COLLECTIONS = ["users", "instructors", "lessons", "bookings", "payment_transactions", "reviews"]
+
+SPECIALTIES = ["Ski alpin", "Snowboard", "Freestyle", "Hors-piste", "Ski de fond", "Télémark"]
+LEVELS = ["Débutant", "Intermédiaire", "Avancé", "Expert"]
+FIRST_NAMES = ["Pierre", "Sophie", "Marc", "Julie", "Thomas", "Emma", "Lucas", "Chloé", "Antoine", "Léa",
+               "Hugo", "Camille", "Louis", "Manon", "Nathan", "Inès", "Jules", "Sarah", "Paul", "Zoé"]
+LAST_NAMES = ["Dumont", "Martin", "Bertrand", "Rousseau", "Leroy", "Dubois", "Moreau", "Bernard", "Petit",
+              "Fontaine", "Girard", "Blanc", "Garnier", "Faure", "Roux", "Morel", "Mercier", "Lambert"]
+LESSON_TITLES = {
+    "private": ["Cours particulier de ski", "Coaching personnalisé", "Perfectionnement technique", "Initiation hors-piste"],
+    "group": ["Stage collectif débutants", "Cours groupe intermédiaire", "Session freestyle", "Sortie groupe perfectionnement"],
+}
+# Mon..Sun: weekends carry most of the demand
+WEEKDAY_WEIGHTS = [1.0, 0.9, 0.9, 1.0, 1.2, 2.6, 2.4]
+COMMENTS = ["Super moniteur, très pédagogue !", "Cours génial, on a beaucoup progressé.", "Patient et à l'écoute.",
+            "Très bon cours, je recommande.", "Un peu cher mais efficace.", "Ambiance top, merci !"]
+
+
+def in_school_holidays(day: date) -> bool:
+    """Approximation des vacances d'hiver (Noël + février, toutes zones confondues)"""
+    christmas = date(day.year if day.month == 12 else day.year - 1, 12, 20)
+    if christmas <= day <= christmas + timedelta(days=15):
+        return True
+    return date(day.year, 2, 7) <= day <= date(day.year, 3, 9)
+
+
+class Generator:
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+        self.season_start = date.fromisoformat(ARGS.season_start)
+        self.season_end = date.fromisoformat(ARGS.season_end)
+        self.today = date.fromisoformat(ARGS.today) if ARGS.today else \
+            self.season_start + (self.season_end - self.season_start) / 2
+        # The major resorts (the ones with known coordinates) draw most of the clients,
+        # the others scale with altitude (snow reliability)
+        major = set(STATION_COORDS) | {s["id"] for s in SKI_STATIONS if "lat" in s}
+        self.station_weights = [
+            8.0 if station["id"] in major else 0.3 + station["altitude"] / 2000
+            for station in SKI_STATIONS
+        ]
+        top = max(self.station_weights)
+        self.station_popularity = [w / top for w in self.station_weights]
+
+    def uuid(self) -> str:
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def timestamp(self, day: date, hour: int = 8) -> datetime:
+        return datetime.combine(day, dtime(hour, self.rng.randint(0, 59)), tzinfo=timezone.utc)
+
+    def name(self) -> str:
+        return f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}"
+
+    def clients(self):
+        # A few regulars book a lot, most clients book once or twice
+        self.client_ids = []
+        self.client_weights = []
+        for i in range(ARGS.users):
+            uid = self.uuid()
+            self.client_ids.append(uid)
+            self.client_weights.append(self.rng.paretovariate(1.5))
+            yield {
+                "id": uid,
+                "email": f"client{i}@skimonitor-gen.fr",
+                "name": self.name(),
+                "picture": None,
+                "role": "client",
+                "created_at": self.timestamp(self.season_start - timedelta(days=self.rng.randint(0, 365))),
+            }
+        self.client_cumweights = list(accumulate(self.client_weights))
+
+    def pick_client(self, exclude=()) -> Optional[str]:
+        """A client drawn by weight, not in `exclude`; None if the draws keep landing there"""
+        for _ in range(50):
+            user_id = self.rng.choices(self.client_ids, cum_weights=self.client_cumweights)[0]
+            if user_id not in exclude:
+                return user_id
+        return None
+
+    def instructor(self, i: int):
+        station_idx = self.rng.choices(range(len(SKI_STATIONS)), weights=self.station_weights)[0]
+        station = SKI_STATIONS[station_idx]
+        popularity = self.station_popularity[station_idx]
+        user_id = self.uuid()
+        name = self.name()
+        user = {
+            "id": user_id,
+            "email": f"moniteur{i}@skimonitor-gen.fr",
+            "name": name,
+            "picture": f"https://api.dicebear.com/7.x/avataaars/svg?seed={user_id[:8]}",
+            "role": "instructor",
+            "created_at": self.timestamp(self.season_start - timedelta(days=self.rng.randint(30, 700))),
+        }
+        # Premium resorts charge more
+        rate = round(45 + 40 * popularity + self.rng.uniform(-5, 15))
+        instructor = {
+            "id": self.uuid(),
+            "user_id": user_id,
+            "bio": f"Moniteur à {station['name']}, passionné de glisse.",
+            "specialties": self.rng.sample(SPECIALTIES, self.rng.randint(1, 3)),
+            "ski_levels": sorted(self.rng.sample(LEVELS, self.rng.randint(2, 4)), key=LEVELS.index),
+            "hourly_rate": float(rate),
+            "station_id": station["id"],
+            "status": self.rng.choices(["approved", "pending", "rejected"], weights=[92, 6, 2])[0],
+            "created_at": user["created_at"],
+        }
+        instructor.update(instructor_copies(instructor, user))
+        return user, instructor, popularity
+
+    def weekly_slots(self):
+        """Créneaux hebdomadaires récurrents d'un moniteur"""
+        slots = []
+        for _ in range(self.rng.randint(2, 6)):
+            lesson_type = self.rng.choices(["private", "group"], weights=[55, 45])[0]
+            start = self.rng.choice([9, 9, 10, 11, 13, 14, 14, 15])
+            duration = self.rng.choice([1, 2, 2, 3]) if lesson_type == "private" else self.rng.choice([2, 3])
+            slots.append({
+                "weekday": self.rng.choices(range(7), weights=WEEKDAY_WEIGHTS)[0],
+                "lesson_type": lesson_type,
+                "start": start,
+                "duration": duration,
+                "max_participants": 1 if lesson_type == "private" else self.rng.randint(4, 10),
+                "title": self.rng.choice(LESSON_TITLES[lesson_type]),
+            })
+        return slots
+
+    def lessons_for(self, instructor: dict, user: dict):
+        copies = lesson_copies(instructor, user)
+        for slot in self.weekly_slots():
+            offset = (slot["weekday"] - self.season_start.weekday()) % 7
+            day = self.season_start + timedelta(days=offset)
+            parent_id = None
+            price = instructor["hourly_rate"] * slot["duration"]
+            if slot["lesson_type"] == "group":
+                price = round(price / slot["max_participants"] * 2.5)
+            while day <= self.season_end:
+                lesson_id = self.uuid()
+                yield day, {
+                    "id": lesson_id,
+                    "instructor_id": instructor["id"],
+                    "lesson_type": slot["lesson_type"],
+                    "title": slot["title"],
+                    "description": "Cours adapté à votre niveau pour une progression optimale.",
+                    "date": day.isoformat(),
+                    "start_time": f"{slot['start']:02d}:00",
+                    "end_time": f"{slot['start'] + slot['duration']:02d}:00",
+                    "max_participants": slot["max_participants"],
+                    "current_participants": 0,
+                    "price": float(price),
+                    "status": "available",
+                    "is_recurring": True,
+                    "recurrence_type": "weekly",
+                    "recurrence_end_date": self.season_end.isoformat() if parent_id is None else None,
+                    "parent_lesson_id": parent_id,
+                    "starts_at": lesson_starts_at(day.isoformat(), f"{slot['start']:02d}:00"),
+                    **copies,
+                    "created_at": self.timestamp(self.season_start - timedelta(days=7)),
+                }
+                parent_id = parent_id or lesson_id
+                day += timedelta(weeks=1)
+
+    def demand(self, day: date, popularity: float) -> float:
+        """Taux de remplissage attendu d'un cours ce jour-là"""
+        factor = 0.25 + 0.6 * popularity
+        factor *= WEEKDAY_WEIGHTS[day.weekday()] / 1.5
+        if in_school_holidays(day):
+            factor *= 1.6
+        if day > self.today:
+            # Far-future lessons are still filling up
+            factor *= max(0.15, 1 - (day - self.today).days / 45)
+        return min(factor, 1.2)
+
+    def bookings_for(self, day: date, lesson: dict, instructor: dict, popularity: float, reviewed: set):
+        seats = lesson["max_participants"]
+        expected = seats * self.demand(day, popularity)
+        taken = 0
+        booked = set()  # a client books a given lesson once
+        for _ in range(seats * 2):
+            if taken >= seats or self.rng.random() > expected / seats:
+                break
+            participants = 1 if lesson["lesson_type"] == "private" else min(self.rng.choice([1, 1, 1, 2, 3]), seats - taken)
+            user_id = self.pick_client(booked)
+            if user_id is None:
+                break
+            booked.add(user_id)
+            booked_on = day - timedelta(days=self.rng.randint(0, 30))
+            cancelled = self.rng.random() < 0.05
+            past = day < self.today
+            paid = not cancelled and (past or self.rng.random() < 0.85)
+            booking = {
+                "id": self.uuid(),
+                "lesson_id": lesson["id"],
+                "user_id": user_id,
+                "participants": participants,
+                "status": "cancelled" if cancelled else ("confirmed" if paid else "pending"),
+                "payment_status": "paid" if paid else "pending",
+                "payment_session_id": f"cs_gen_{self.rng.getrandbits(64):016x}" if paid else None,
+                "created_at": self.timestamp(min(booked_on, self.today), self.rng.randint(7, 22)),
+            }
+            yield "bookings", booking
+            if cancelled:
+                continue
+            taken += participants
+            if paid:
+                amount = lesson["price"] * participants
+                commission = round(amount * PLATFORM_COMMISSION, 2)
+                yield "payment_transactions", {
+                    "id": self.uuid(),
+                    "session_id": booking["payment_session_id"],
+                    "user_id": user_id,
+                    "booking_id": booking["id"],
+                    "amount": amount,
+                    "commission": commission,
+                    "instructor_amount": round(amount - commission, 2),
+                    "currency": "eur",
+                    "status": "paid",
+                    "payment_status": "paid",
+                    "metadata": {"lesson_id": lesson["id"]},
+                    "created_at": booking["created_at"],
+                }
+            # One review per client and instructor, as enforced by the API
+            if past and paid and (user_id, instructor["id"]) not in reviewed and self.rng.random() < ARGS.review_rate:
+                reviewed.add((user_id, instructor["id"]))
+                yield "reviews", {
+                    "id": self.uuid(),
+                    "instructor_id": instructor["id"],
+                    "user_id": user_id,
+                    "booking_id": booking["id"],
+                    "rating": self.rng.choices([5, 4, 3, 2, 1], weights=[55, 28, 10, 4, 3])[0],
+                    "comment": self.rng.choice(COMMENTS),
+                    "created_at": self.timestamp(min(day + timedelta(days=self.rng.randint(0, 5)), self.today), 19),
+                }
+        lesson["current_participants"] = taken
+        if taken >= seats:
+            lesson["status"] = "full"
+
+    def documents(self):
+        """Flux de (collection, document) dans un ordre déterministe"""
+        for user in self.clients():
+            yield "users", user
+        reviewed = set()
+        for i in range(ARGS.instructors):
+            user, instructor, popularity = self.instructor(i)
+            yield "users", user
+            yield "instructors", instructor
+            if instructor["status"] != "approved":
+                continue
+            for day, lesson in self.lessons_for(instructor, user):
+                yield from self.bookings_for(day, lesson, instructor, popularity, reviewed)
+                yield "lessons", lesson
+
+
+class BatchWriter:
+    """Regroupe les documents par collection et les écrit via insert_many en parallèle"""
+
+    def __init__(self, batch_size: int, workers: int):
+        self.batch_size = batch_size
+        self.queue = asyncio.Queue(maxsize=workers * 2)
+        self.buffers = defaultdict(list)
+        self.counts = Counter()
+        self.workers = [asyncio.create_task(self._work()) for _ in range(workers)]
+
+    async def _work(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            collection, docs = item
+            await db[collection].insert_many(docs, ordered=False)
+            self.counts[collection] += len(docs)
+
+    def _failure(self):
+        for worker in self.workers:
+            if worker.done() and not worker.cancelled() and worker.exception() is not None:
+                return worker.exception()
+        return None
+
+    async def _put(self, item):
+        """queue.put qui relance l'erreur d'un worker mort au lieu d'attendre une place indéfiniment"""
+        put = asyncio.ensure_future(self.queue.put(item))
+        while True:
+            error = self._failure()
+            if error is not None:
+                put.cancel()
+                for worker in self.workers:
+                    worker.cancel()
+                raise error
+            if put.done():
+                return
+            running = [worker for worker in self.workers if not worker.done()]
+            await asyncio.wait([put, *running], return_when=asyncio.FIRST_COMPLETED)
+
+    async def add(self, collection: str, doc: dict):
+        buffer = self.buffers[collection]
+        buffer.append(doc)
+        if len(buffer) >= self.batch_size:
+            self.buffers[collection] = []
+            await self._put((collection, buffer))
+
+    async def close(self):
+        for collection, buffer in self.buffers.items():
+            if buffer:
+                await self._put((collection, buffer))
+        for _ in self.workers:
+            await self._put(None)
+        await asyncio.gather(*self.workers)
+
+
+async def generate():
+    if ARGS.drop:
+        print("🗑️  Suppression des données existantes...")
+        for collection in COLLECTIONS:
+            await db[collection].delete_many({})
+
+    start = time.perf_counter()
+    generator = Generator(ARGS.seed)
+    writer = BatchWriter(ARGS.batch_size, ARGS.workers)
+    produced = Counter()
+    for collection, doc in generator.documents():
+        await writer.add(collection, doc)
+        produced[collection] += 1
+        if sum(produced.values()) % 100000 == 0:
+            print(f"   … {sum(produced.values())} documents générés")
+    await writer.close()
+    print("📅 Recalcul des disponibilités par station...")
+    await rebuild_availability()
+    elapsed = time.perf_counter() - start
+
+    print("=" * 60)
+    print(f"✨ Saison {ARGS.season_start} → {ARGS.season_end} générée en {elapsed:.1f}s (graine {ARGS.seed})")
+    for collection in COLLECTIONS:
+        print(f"   {collection:<22} {writer.counts[collection]:>10}")
+    print(f"   {'total':<22} {sum(writer.counts.values()):>10}  ({sum(writer.counts.values()) / elapsed:,.0f} docs/s)")
+    print("=" * 60)
+
+
+async def main():
+    """Point d'entrée principal"""
+    try:
+        await generate()
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Migration en ligne des dates stockées en chaînes ISO vers des dates BSON natives
+  - created_at des utilisateurs, moniteurs, cours, réservations, transactions et avis
+  - starts_at des cours, calculé à partir de date + start_time
+Les documents sont convertis par lots (un bulk_write par lot) dans l'ordre des _id, et
+la progression est enregistrée dans la collection "migrations" : le script peut être
+interrompu et relancé à tout moment pendant que l'application reste en service (elle lit
+les deux formats tant que DATE_DUAL_READ est actif). Une fois toutes les étapes
+terminées, DATE_DUAL_READ=false désactive la lecture des anciennes chaînes.
+
+Usage : python3 migrate_dates.py [--batch-size 500] [--pause 0.05] [--dry-run] [--restart]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pymongo import UpdateOne
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from server import db, client, DATED_COLLECTIONS, as_datetime, lesson_starts_at
+
+
+def created_at_step(collection: str) -> dict:
+    def convert(doc):
+        value = as_datetime(doc["created_at"])
+        return {"created_at": value} if value else None
+
+    return {
+        "name": f"{collection}.created_at",
+        "collection": collection,
+        "filter": {"created_at": {"$type": "string"}},
+        "projection": {"created_at": 1},
+        "convert": convert,
+        # Only rewrite the value we read, never a concurrent update
+        "guard": lambda doc: {"created_at": doc["created_at"]},
+    }
+
+
+def starts_at_step() -> dict:
+    def convert(doc):
+        try:
+            return {"starts_at": lesson_starts_at(doc["date"], doc["start_time"])}
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    return {
+        "name": "lessons.starts_at",
+        "collection": "lessons",
+        "filter": {"starts_at": {"$exists": False}},
+        "projection": {"date": 1, "start_time": 1},
+        "convert": convert,
+        "guard": lambda doc: {"starts_at": {"$exists": False}},
+    }
+
+
+STEPS = [created_at_step(name) for name in DATED_COLLECTIONS] + [starts_at_step()]
+
+
+async def run_step(step: dict, args) -> None:
+    """Convertit une étape par lots en reprenant après le dernier _id traité"""
+    collection = db[step["collection"]]
+    progress = await db.migrations.find_one({"_id": step["name"]}) or {}
+    if progress.get("done") and not args.restart:
+        print(f"✔️  {step['name']} déjà migré ({progress.get('converted', 0)} documents)")
+        return
+
+    last_id = None if args.restart else progress.get("last_id")
+    converted = 0 if args.restart else progress.get("converted", 0)
+    invalid = 0 if args.restart else progress.get("invalid", 0)
+    start = time.perf_counter()
+
+    while True:
+        query = dict(step["filter"])
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await collection.find(query, step["projection"]).sort("_id", 1).limit(args.batch_size).to_list(None)
+        if not batch:
+            break
+
+        ops = []
+        for doc in batch:
+            update = step["convert"](doc)
+            if update is None:
+                invalid += 1
+                continue
+            ops.append(UpdateOne({"_id": doc["_id"], **step["guard"](doc)}, {"$set": update}))
+        if ops and not args.dry_run:
+            result = await collection.bulk_write(ops, ordered=False)
+            converted += result.modified_count
+        elif args.dry_run:
+            converted += len(ops)
+
+        last_id = batch[-1]["_id"]
+        if not args.dry_run:
+            await db.migrations.update_one(
+                {"_id": step["name"]},
+                {"$set": {"last_id": last_id, "converted": converted, "invalid": invalid, "done": False,
+                          "updated_at": datetime.now(timezone.utc)}},
+                upsert=True
+            )
+        print(f"   {step['name']}: {converted} convertis", end="\r")
+        # Let the application breathe between batches
+        await asyncio.sleep(args.pause)
+
+    if not args.dry_run:
+        await db.migrations.update_one(
+            {"_id": step["name"]},
+            {"$set": {"done": True, "converted": converted, "invalid": invalid,
+                      "updated_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+    label = "à convertir" if args.dry_run else "convertis"
+    print(f"✅ {step['name']}: {converted} {label}, {invalid} illisible(s), {time.perf_counter() - start:.1f} s")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.05, help="Pause entre deux lots, en secondes")
+    parser.add_argument("--dry-run", action="store_true", help="Compte les documents sans rien écrire")
+    parser.add_argument("--restart", action="store_true", help="Ignore la progression enregistrée")
+    args = parser.parse_args()
+
+    print("🗓️  Migration des dates vers des dates BSON natives...\n")
+    try:
+        for step in STEPS:
+            await run_step(step, args)
+    finally:
+        client.close()
+
+    if not args.dry_run:
+        print("\n💡 Toutes les étapes sont terminées : DATE_DUAL_READ=false peut être activé.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Profil du démarrage à froid du backend
+1. Temps d'import de server.py (python -X importtime), avec les modules les plus coûteux
+2. Temps jusqu'à la première réponse de /api/health d'un uvicorn lancé à froid
+   (import + warm-up Mongo + vérification des index), comparé à un objectif
+
+Usage : python3 profile_startup.py [--top 15] [--target 3.0] [--port 8765]
+Nécessite MONGO_URL / DB_NAME (ou backend/.env) pointant vers un MongoDB joignable.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).parent
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def profile_imports(top: int):
+    """Importe server dans un interpréteur neuf et agrège la sortie de -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        sys.exit("❌ Échec de l'import de server.py")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+
+    total = sum(self_us for _, self_us, _, _ in modules)
+    # Depth 0 is server itself (and interpreter startup), depth 1 its direct imports
+    roots = sorted((m for m in modules if m[3] <= 1), key=lambda m: m[2], reverse=True)
+    print(f"📦 Import de server.py : {total / 1000:.0f} ms ({len(modules)} modules)\n")
+    print(f"{'Module':<45}{'Cumulé (ms)':>14}{'Propre (ms)':>14}")
+    for name, self_us, cumulative_us, _ in roots[:top]:
+        print(f"{name:<45}{cumulative_us / 1000:>14.1f}{self_us / 1000:>14.1f}")
+    return total / 1e6
+
+
+def time_to_ready(port: int, timeout: float) -> float:
+    """Lance uvicorn et mesure le temps jusqu'à la première réponse 200 de /api/health"""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                print(process.stderr.read()[-2000:])
+                sys.exit("❌ uvicorn s'est arrêté pendant le démarrage")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=0.5).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                pass
+            time.sleep(0.02)
+        sys.exit(f"❌ Pas de réponse de /api/health après {timeout:.0f} s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15, help="Nombre de modules affichés")
+    parser.add_argument("--target", type=float, default=3.0, help="Objectif de démarrage, en secondes")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PROFILE_PORT", "8765")))
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    import_seconds = profile_imports(args.top)
+    ready_seconds = time_to_ready(args.port, args.timeout)
+
+    print(f"\n⏱️  Prêt à servir en {ready_seconds:.2f} s (dont ~{import_seconds:.2f} s d'import), objectif {args.target:.2f} s")
+    if ready_seconds > args.target:
+        print("❌ Objectif de démarrage dépassé")
+        sys.exit(1)
+    print("✅ Objectif de démarrage respecté")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,17 +11,13 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 from datetime import datetime, timezone, timedelta
 import uuid
-from random import choice, sample, randint, uniform
+from random import Random
+from pymongo import UpdateOne
 
 # Load environment
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 # Données fictives réalistes
 FICTIONAL_INSTRUCTORS = [
     {
@@ -158,119 +154,154 @@ LESSON_TEMPLATES = [
     },
 ]
 
-async def seed_instructors():
-    """Crée des moniteurs fictifs avec leurs utilisateurs et quelques cours d'exemple"""
+# Namespace des identifiants déterministes : un même email donne toujours le même id
+DEMO_NAMESPACE = uuid.UUID("6f1c2a8e-3d4b-4f5a-9e7c-2b8d1a0f4c63")
 
-    print("🎿 Début du seeding des moniteurs fictifs...\n")
 
-    # Vérifier si des moniteurs existent déjà
-    existing_count = await db.instructors.count_documents({"status": "approved"})
-    if existing_count > 0:
-        print(f"⚠️  {existing_count} moniteur(s) approuvé(s) trouvé(s) dans la base.")
-        response = input("Voulez-vous continuer et ajouter les moniteurs fictifs ? (o/n): ")
-        if response.lower() != 'o':
-            print("❌ Seeding annulé.")
-            return
+def demo_id(kind: str, key: str) -> str:
+    """Identifiant stable d'un document de démo (même entrée → même id à chaque exécution)"""
+    return str(uuid.uuid5(DEMO_NAMESPACE, f"{kind}:{key}"))
 
-    created_users = 0
-    created_instructors = 0
-    created_lessons = 0
 
-    for idx, instructor_data in enumerate(FICTIONAL_INSTRUCTORS):
-        # Vérifier si l'utilisateur existe déjà (par email)
-        existing_user = await db.users.find_one({"email": instructor_data["email"]})
+def demo_lessons(instructor_data: dict, instructor_id: str, now: datetime) -> list:
+    """Cours d'exemple d'un moniteur, tirés avec un générateur initialisé sur son email"""
+    rng = Random(instructor_data["email"])
+    lessons = []
+    for i in range(rng.randint(2, 4)):
+        # Alterner entre cours privé et collectif
+        lesson_type = "private" if i % 2 == 0 else "group"
+        template = rng.choice([t for t in LESSON_TEMPLATES if lesson_type in t["types"]])
 
-        if existing_user:
-            print(f"ℹ️  Utilisateur {instructor_data['name']} existe déjà, passage...")
-            continue
+        # Dates dans les 2 prochaines semaines, horaires entre 9h et 16h
+        lesson_date = (now + timedelta(days=rng.randint(1, 14))).strftime("%Y-%m-%d")
+        start_hour = rng.randint(9, 15)
+        end_hour = start_hour + rng.randint(1, 2)
 
-        # Créer l'utilisateur
-        user_id = str(uuid.uuid4())
-        user = {
-            "id": user_id,
-            "email": instructor_data["email"],
-            "name": instructor_data["name"],
-            "picture": AVATAR_URLS[idx],
-            "role": "instructor",
-            "created_at": datetime.now(timezone.utc)
-        }
+        lessons.append({
+            "id": demo_id("lesson", f"{instructor_data['email']}:{i}"),
+            "instructor_id": instructor_id,
+            "lesson_type": lesson_type,
+            "title": rng.choice(template["titles"]),
+            "description": rng.choice(template["descriptions"]),
+            "date": lesson_date,
+            "start_time": f"{start_hour:02d}:00",
+            "end_time": f"{end_hour:02d}:00",
+            "max_participants": 1 if lesson_type == "private" else rng.randint(4, 8),
+            "current_participants": 0,
+            "price": instructor_data["hourly_rate"] * (end_hour - start_hour),
+            "status": "available",
+            "is_recurring": False,
+            "recurrence_type": None,
+            "recurrence_end_date": None,
+            "parent_lesson_id": None,
+            "starts_at": datetime.strptime(f"{lesson_date} {start_hour:02d}:00", "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc),
+            "created_at": now,
+        })
+    return lessons
 
-        await db.users.insert_one(user)
-        created_users += 1
-        print(f"✅ Utilisateur créé: {instructor_data['name']}")
 
-        # Créer le profil instructeur (directement approuvé)
-        instructor_id = str(uuid.uuid4())
-        instructor = {
-            "id": instructor_id,
-            "user_id": user_id,
-            "bio": instructor_data["bio"],
-            "specialties": instructor_data["specialties"],
-            "ski_levels": instructor_data["ski_levels"],
-            "hourly_rate": instructor_data["hourly_rate"],
-            "station_id": instructor_data["station"],
-            "status": "approved",  # Directement approuvé
-            "created_at": datetime.now(timezone.utc)
-        }
+async def upsert_demo_instructors(db) -> dict:
+    """Applique le jeu de démo en un bulk_write par collection, sans jamais créer de doublon.
 
-        await db.instructors.insert_one(instructor)
-        created_instructors += 1
-        print(f"   → Profil moniteur approuvé: {instructor_data['station']}, {instructor_data['hourly_rate']}€/h")
+    Les utilisateurs sont identifiés par email, les profils par user_id et les cours
+    par un id déterministe : relancer le seeding met à jour les profils existants et
+    ne recrée rien. Les cours de démo passés et sans réservation sont reportés dans
+    les deux prochaines semaines, pour que la démo reste à jour d'un déploiement à l'autre.
+    """
+    now = datetime.now(timezone.utc)
+    emails = [d["email"] for d in FICTIONAL_INSTRUCTORS]
 
-        # Créer quelques cours d'exemple pour chaque moniteur
-        num_lessons = randint(2, 4)
-        for i in range(num_lessons):
-            # Alterner entre cours privé et collectif
-            lesson_type = "private" if i % 2 == 0 else "group"
+    users = await db.users.bulk_write([
+        UpdateOne(
+            {"email": data["email"]},
+            {
+                "$set": {"name": data["name"], "picture": AVATAR_URLS[idx]},
+                "$setOnInsert": {"id": demo_id("user", data["email"]), "role": "instructor", "created_at": now},
+            },
+            upsert=True,
+        )
+        for idx, data in enumerate(FICTIONAL_INSTRUCTORS)
+    ], ordered=False)
+    user_ids = {
+        u["email"]: u["id"]
+        for u in await db.users.find({"email": {"$in": emails}}, {"_id": 0, "email": 1, "id": 1}).to_list(None)
+    }
 
-            # Choisir un template de cours
-            template = choice([t for t in LESSON_TEMPLATES if lesson_type in t["types"]])
+    instructors = await db.instructors.bulk_write([
+        UpdateOne(
+            {"user_id": user_ids[data["email"]]},
+            {
+                "$set": {
+                    "bio": data["bio"],
+                    "specialties": data["specialties"],
+                    "ski_levels": data["ski_levels"],
+                    "hourly_rate": data["hourly_rate"],
+                    "station_id": data["station"],
+                },
+                "$setOnInsert": {"id": demo_id("instructor", data["email"]), "status": "approved", "created_at": now},
+            },
+            upsert=True,
+        )
+        for data in FICTIONAL_INSTRUCTORS
+    ], ordered=False)
+    instructor_ids = {
+        i["user_id"]: i["id"]
+        for i in await db.instructors.find(
+            {"user_id": {"$in": list(user_ids.values())}}, {"_id": 0, "user_id": 1, "id": 1}
+        ).to_list(None)
+    }
 
-            # Dates dans les 2 prochaines semaines
-            days_ahead = randint(1, 14)
-            lesson_date = (datetime.now() + timedelta(days=days_ahead)).strftime("%Y-%m-%d")
+    # Un cours réservé n'est jamais déplacé ; un cours passé resté vide reprend la date du jour + N
+    today = now.strftime("%Y-%m-%d")
+    lesson_ops = []
+    for data in FICTIONAL_INSTRUCTORS:
+        for lesson in demo_lessons(data, instructor_ids[user_ids[data["email"]]], now):
+            lesson_ops.append(UpdateOne(
+                {"id": lesson["id"], "date": {"$lt": today}, "status": "available", "current_participants": 0},
+                {"$set": {"date": lesson["date"], "starts_at": lesson["starts_at"]}},
+            ))
+            lesson_ops.append(UpdateOne({"id": lesson["id"]}, {"$setOnInsert": lesson}, upsert=True))
+    lessons = await db.lessons.bulk_write(lesson_ops, ordered=False)
 
-            # Horaires aléatoires entre 9h et 16h
-            start_hour = randint(9, 15)
-            end_hour = start_hour + randint(1, 2)
+    return {
+        "created_users": users.upserted_count,
+        "created_instructors": instructors.upserted_count,
+        "created_lessons": lessons.upserted_count,
+        "moved_lessons": lessons.modified_count,
+        "updated_instructors": instructors.modified_count,
+        "skipped": len(FICTIONAL_INSTRUCTORS) - users.upserted_count,
+        "instructor_ids": list(instructor_ids.values()),
+    }
 
-            lesson_id = str(uuid.uuid4())
-            lesson = {
-                "id": lesson_id,
-                "instructor_id": instructor_id,
-                "lesson_type": lesson_type,
-                "title": choice(template["titles"]),
-                "description": choice(template["descriptions"]),
-                "date": lesson_date,
-                "start_time": f"{start_hour:02d}:00",
-                "end_time": f"{end_hour:02d}:00",
-                "max_participants": 1 if lesson_type == "private" else randint(4, 8),
-                "current_participants": 0,
-                "price": instructor_data["hourly_rate"] * (end_hour - start_hour),
-                "status": "available",
-                "is_recurring": False,
-                "created_at": datetime.now(timezone.utc)
-            }
 
-            await db.lessons.insert_one(lesson)
-            created_lessons += 1
+async def seed_instructors(db):
+    """Crée (ou réapplique) les moniteurs fictifs avec leurs utilisateurs et quelques cours d'exemple"""
+
+    print("🎿 Début du seeding des moniteurs fictifs...\n")
 
-        print(f"   → {num_lessons} cours créés\n")
+    result = await upsert_demo_instructors(db)
 
     print("=" * 60)
     print(f"✨ Seeding terminé avec succès !")
-    print(f"   📊 {created_users} utilisateurs créés")
-    print(f"   🎿 {created_instructors} moniteurs approuvés créés")
-    print(f"   📅 {created_lessons} cours d'exemple créés")
+    print(f"   📊 {result['created_users']} utilisateurs créés ({result['skipped']} déjà présents)")
+    print(f"   🎿 {result['created_instructors']} moniteurs approuvés créés, {result['updated_instructors']} mis à jour")
+    print(f"   📅 {result['created_lessons']} cours d'exemple créés, {result['moved_lessons']} reportés")
     print("=" * 60)
     print("\n💡 Les moniteurs sont maintenant visibles sur le site !")
     print("   Vous pouvez les voir sur : /instructors")
     print("   Et leurs cours sur : /lessons\n")
+    return result
 
 async def main():
     """Point d'entrée principal"""
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
     try:
-        await seed_instructors()
+        result = await seed_instructors(client[os.environ['DB_NAME']])
+        # Copies dénormalisées (noms, station, position) et disponibilités : mêmes fonctions que l'API.
+        # Importé ici car server.py lit sa configuration à l'import et importe lui-même ce module.
+        from server import refresh_instructor_copies, rebuild_availability
+        await refresh_instructor_copies(result["instructor_ids"])
+        await rebuild_availability()
     except Exception as e:
         print(f"\n❌ Erreur lors du seeding: {e}")
         import traceback
@@ -1,38 +1,329 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Depends, Query
 from fastapi.responses import StreamingResponse
+from bson import ObjectId
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.routing import compile_path
 from motor.motor_asyncio import AsyncIOMotorClient
+import pymongo
+from pymongo import monitoring, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+from pymongo.errors import OperationFailure, PyMongoError
 import os
 import logging
 import io
 import csv
+import asyncio
+import base64
+import bisect
+import contextvars
+import gzip
+import hashlib
+import hmac
+import functools
+import ipaddress
+import math
+import time
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlencode
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict
+from typing import Any, List, Optional, Dict
 import uuid
 from datetime import datetime, timezone, timedelta
 import httpx
+import orjson
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+try:
+    import numpy as np
+except ImportError:  # LESSON_ENGINE=mongo only
+    np = None
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# ============== METRICS ==============
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    """Monotonic counter per label set (thread-safe: Mongo events arrive on Motor's threads)"""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, labels, value) for labels, value in self._values.items()]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: tuple = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+class Histogram(Counter):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+
+    def observe(self, labels: tuple, value: float):
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 2)  # buckets, +Inf, sum
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {labels: list(counts) for labels, counts in self._values.items()}
+        out = []
+        for labels, counts in values.items():
+            for bound, count in zip(self.buckets, counts):
+                out.append((f"{self.name}_bucket", labels + (bound,), count))
+            out.append((f"{self.name}_bucket", labels + ("+Inf",), counts[-2]))
+            out.append((f"{self.name}_count", labels, counts[-2]))
+            out.append((f"{self.name}_sum", labels, counts[-1]))
+        return out
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                names = metric.labels + ("le",) if len(labels) > len(metric.labels) else metric.labels
+                lines.append(f"{name}{_format_labels(names, labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+HTTP_REQUESTS = metrics.register(Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status")))
+HTTP_LATENCY = metrics.register(Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route")))
+HTTP_IN_FLIGHT = metrics.register(Gauge("http_requests_in_flight", "HTTP requests currently being served"))
+MONGO_COMMANDS = metrics.register(Counter("mongo_commands_total", "MongoDB commands by collection and outcome", ("collection", "command", "outcome")))
+MONGO_LATENCY = metrics.register(Histogram("mongo_command_duration_seconds", "MongoDB command latency", ("collection", "command")))
+OUTBOUND_LATENCY = metrics.register(Histogram("outbound_request_duration_seconds", "Outbound HTTP call latency", ("service", "outcome")))
+HTTP_REJECTED = metrics.register(Counter("http_requests_rejected_total", "Requests refused by admission control", ("method", "route", "reason")))
+HEAVY_IN_FLIGHT = metrics.register(Gauge("heavy_requests_in_flight", "Heavy requests currently being served"))
+HEAVY_QUEUED = metrics.register(Gauge("heavy_requests_queued", "Heavy requests waiting for a slot"))
+
+# ============== QUERY BUDGET ==============
+
+# Mongo commands allowed per request before a warning is logged; override per "METHOD /route"
+QUERY_BUDGET = int(os.environ.get('QUERY_BUDGET', '20'))
+QUERY_BUDGETS = {
+    "POST /api/lessons": 200,  # one insert per recurring occurrence
+}
+QUERY_DEBUG_HEADERS = os.environ.get('QUERY_DEBUG_HEADERS', '').lower() in ('1', 'true', 'yes')
+
+class QueryStats:
+    """Mongo commands issued on behalf of one request (or one test block)"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.duration += seconds
+
+# Motor runs pymongo on executor threads with a copy of the caller's context,
+# so the command listener sees the stats object of the request that issued it
+_request_query_stats: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("request_query_stats", default=None)
+
+@contextmanager
+def query_budget(max_queries: int):
+    """Test helper: fail if the code (or in-process requests) in the block exceed max_queries.
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+            with query_budget(4):
+                await c.get("/api/lessons")
+    """
+    stats = QueryStats()
+    token = _request_query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _request_query_stats.reset(token)
+    if stats.count > max_queries:
+        raise AssertionError(f"{stats.count} commandes Mongo exécutées, budget de {max_queries}")
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Feeds pymongo command monitoring events into the Mongo metrics"""
+
+    def __init__(self):
+        self._collections: Dict[tuple, str] = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+
+    def _finish(self, event, outcome: str):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMANDS.inc((collection, event.command_name, outcome))
+        MONGO_LATENCY.observe((collection, event.command_name), event.duration_micros / 1e6)
+        stats = _request_query_stats.get()
+        if stats is not None:
+            stats.record(event.duration_micros / 1e6)
+
+    def succeeded(self, event):
+        self._finish(event, "success")
+
+    def failed(self, event):
+        self._finish(event, "failure")
+
+@asynccontextmanager
+async def track_outbound(service: str):
+    """Time an outbound HTTP call for the outbound latency histogram"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        OUTBOUND_LATENCY.observe((service, outcome), time.perf_counter() - start)
+
+# ============== REQUEST DEADLINES ==============
+
+# Time budget of a request from entry, in seconds; override per "METHOD /route"
+REQUEST_DEADLINE = float(os.environ.get('REQUEST_DEADLINE', '10'))
+ROUTE_DEADLINES = {
+    "GET /api/admin/export": 30,
+    "GET /api/instructor/export": 30,
+    "POST /api/lessons": 20,  # recurring series insert one lesson per occurrence
+    "POST /api/admin/seed-instructors": 30,
+    "POST /api/admin/send-reminders": 30,
+}
+
+class DeadlineExceeded(Exception):
+    """The current request ran out of time before an outbound call"""
+
+_request_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+@contextmanager
+def request_deadline(seconds: float):
+    """Time budget for the enclosed work.
+
+    Mongo operations get it through pymongo's client-side operation timeout
+    (maxTimeMS is set to what is left), outbound calls through outbound_timeout().
+    """
+    token = _request_deadline.set(time.monotonic() + seconds)
+    try:
+        with pymongo.timeout(seconds):
+            yield
+    finally:
+        _request_deadline.reset(token)
+
+def outbound_timeout(default: float) -> float:
+    """httpx timeout for an outbound call: `default`, capped by what is left of the request deadline"""
+    deadline = _request_deadline.get()
+    if deadline is None:
+        return default
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded()
+    return min(default, remaining)
+
+def check_deadline():
+    """Raise DeadlineExceeded once the request is out of time, e.g. when an outbound call
+    timed out because outbound_timeout() capped it, so fallbacks don't hide the 504"""
+    deadline = _request_deadline.get()
+    if deadline is not None and deadline <= time.monotonic():
+        raise DeadlineExceeded()
+
+def background_task(coro) -> asyncio.Task:
+    """Start a task in an empty context, so work spawned by a request does not inherit
+    its deadline (pymongo.timeout), query stats or loaders"""
+    return contextvars.Context().run(asyncio.create_task, coro)
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# Connections opened by the startup warm-up and kept in the pool afterwards
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '4'))
+# tz_aware: native dates come back as aware UTC datetimes, like the ones the app writes
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, minPoolSize=MONGO_MIN_POOL_SIZE,
+                            event_listeners=[MongoCommandMetrics()])
 db = client[os.environ['DB_NAME']]
 
 # Stripe setup
-from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
 stripe_api_key = os.environ.get('STRIPE_API_KEY', 'sk_test_emergent')
 
+def stripe_checkout_client(request: Request):
+    """Stripe client for this host; the payment SDK is heavy, so it is imported on first use"""
+    from emergentintegrations.payments.stripe.checkout import StripeCheckout
+    host_url = str(request.base_url).rstrip('/')
+    return StripeCheckout(api_key=stripe_api_key, webhook_url=f"{host_url}/api/webhook/stripe")
+
 # Weather API
 OPENWEATHER_API_KEY = os.environ.get('OPENWEATHER_API_KEY', '')
 
 # Platform settings
 PLATFORM_COMMISSION = 0.10  # 10% commission
 
-app = FastAPI()
+# ============== JSON RESPONSES ==============
+
+def _json_default(obj: Any):
+    """Encode the types orjson does not know natively"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Type non sérialisable: {type(obj).__name__}")
+
+class FastJSONResponse(Response):
+    """JSON response rendered with orjson (datetimes, UUIDs, ObjectIds supported).
+
+    Returning it directly from a handler also skips FastAPI's
+    jsonable_encoder walk, which is most of the cost on raw Mongo listings.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+
+app = FastAPI(default_response_class=FastJSONResponse)
 api_router = APIRouter(prefix="/api")
 
 # Configure logging
@@ -364,6 +655,9 @@ SKI_STATIONS = [
     {"id": "vergio", "name": "Vergio", "region": "Haute-Corse", "altitude": 1400},
 ]
 
+# The station list never changes at runtime: serialize it once
+SKI_STATIONS_JSON = orjson.dumps(SKI_STATIONS)
+
 # ============== MODELS ==============
 
 class User(BaseModel):
@@ -476,45 +770,1335 @@ class BookingCreate(BaseModel):
     lesson_id: str
     participants: int = 1
 
-class PaymentRequest(BaseModel):
-    booking_id: str
-    origin_url: str
+class PaymentRequest(BaseModel):
+    booking_id: str
+    origin_url: str
+
+class ReviewCreate(BaseModel):
+    instructor_id: str
+    rating: int  # 1-5
+    comment: str = ""
+    booking_id: Optional[str] = None
+
+# ============== DATES ==============
+
+# Collections whose created_at used to be stored as an ISO string (see migrate_dates.py)
+DATED_COLLECTIONS = ["users", "instructors", "lessons", "bookings", "payment_transactions", "reviews"]
+# While migrate_dates.py has not run everywhere, range queries also match the legacy strings
+DATE_DUAL_READ = os.environ.get('DATE_DUAL_READ', 'true').lower() in ('1', 'true', 'yes')
+
+def as_datetime(value) -> Optional[datetime]:
+    """Read a stored date, native or legacy ISO string, as an aware UTC datetime"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    return None
+
+def lesson_starts_at(date: str, start_time: str) -> datetime:
+    """Native start of a lesson from its YYYY-MM-DD date and HH:MM start time (station wall clock as UTC)"""
+    return datetime.strptime(f"{date} {start_time}", "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc)
+
+def period_range(year: Optional[int] = None, month: Optional[int] = None) -> Optional[tuple]:
+    """[start, end) of a year or of a month (current year if only the month is given)"""
+    if not month:
+        if not year:
+            return None
+        return datetime(year, 1, 1, tzinfo=timezone.utc), datetime(year + 1, 1, 1, tzinfo=timezone.utc)
+    year = year or datetime.now(timezone.utc).year
+    start = datetime(year, month, 1, tzinfo=timezone.utc)
+    end = datetime(year + 1, 1, 1, tzinfo=timezone.utc) if month == 12 else datetime(year, month + 1, 1, tzinfo=timezone.utc)
+    return start, end
+
+def date_range_query(field: str, start: datetime, end: datetime) -> dict:
+    """Index-friendly [start, end) filter on a date field"""
+    native = {field: {"$gte": start, "$lt": end}}
+    if not DATE_DUAL_READ:
+        return native
+    # BSON range operators only match values of the same type, so both branches are needed
+    legacy = {field: {"$gte": start.isoformat(), "$lt": end.isoformat()}}
+    return {"$or": [native, legacy]}
+
+def lesson_range_query(start: datetime, end: datetime) -> dict:
+    """[start, end) filter on the lesson start; unmigrated lessons are matched on their date (day precision)"""
+    native = {"starts_at": {"$gte": start, "$lt": end}}
+    if not DATE_DUAL_READ:
+        return native
+    legacy = {"starts_at": {"$exists": False}, "date": {"$gte": start.strftime("%Y-%m-%d"), "$lt": end.strftime("%Y-%m-%d")}}
+    return {"$or": [native, legacy]}
+
+async def ensure_date_indexes():
+    """Indexes backing the time-bounded queries of the lesson list, exports, stats and reminders"""
+    await db.lessons.create_index([("starts_at", 1)])
+    # Equality on status, then date/start_time serve both the range filters and the sort
+    await db.lessons.create_index([("status", 1), ("date", 1), ("start_time", 1), ("id", 1)])
+    await db.payment_transactions.create_index([("status", 1), ("created_at", 1)])
+
+# ============== READ ROUTING ==============
+
+# Heavy read-only analytics/export routes may read from secondaries; every other route
+# (bookings, payments, auth) stays on the primary. Per-route override:
+# READ_PREFERENCES="GET /api/admin/export=secondary;GET /api/admin/stats=primary"
+ANALYTICS_READ_PREFERENCE = os.environ.get('ANALYTICS_READ_PREFERENCE', 'secondaryPreferred')
+# How far behind the primary a secondary may be to serve these reads (MongoDB rejects less than 90 s)
+READ_MIN_STALENESS_SECONDS = 90
+READ_MAX_STALENESS_SECONDS = int(os.environ.get('READ_MAX_STALENESS_SECONDS', '120'))
+ANALYTICS_ROUTES = (
+    "GET /api/admin/stats",
+    "GET /api/admin/transactions",
+    "GET /api/admin/export",
+    "GET /api/instructor/stats",
+    "GET /api/instructor/export",
+)
+
+_READ_MODES = {
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+def parse_read_preferences(overrides: str, analytics: str = ANALYTICS_READ_PREFERENCE) -> Dict[str, str]:
+    """Read preference by "METHOD /route": analytics routes, then the "route=mode;..." overrides"""
+    preferences = dict.fromkeys(ANALYTICS_ROUTES, analytics)
+    preferences.update(
+        (" ".join(route.split()), mode.strip())
+        for route, _, mode in (item.partition("=") for item in overrides.split(";"))
+        if mode.strip()
+    )
+    for route, mode in preferences.items():
+        if mode != "primary" and mode not in _READ_MODES:
+            raise ValueError(f"Unknown read preference {mode!r} for {route}")
+    return preferences
+
+READ_PREFERENCES = parse_read_preferences(os.environ.get('READ_PREFERENCES', ''))
+
+def read_preference(mode: str, max_staleness: int = READ_MAX_STALENESS_SECONDS):
+    """pymongo read preference for a mode name, max_staleness raised to the MongoDB minimum"""
+    if mode == "primary":
+        return Primary()
+    return _READ_MODES[mode](max_staleness=max(READ_MIN_STALENESS_SECONDS, max_staleness))
+
+_read_dbs: Dict[str, Any] = {"primary": db}
+
+def read_db(route: str):
+    """Database handle with the read preference configured for a "METHOD /route" (primary by default)"""
+    mode = READ_PREFERENCES.get(route, "primary")
+    handle = _read_dbs.get(mode)
+    if handle is None:
+        handle = db.with_options(read_preference=read_preference(mode))
+        _read_dbs[mode] = handle
+    return handle
+
+# ============== DATA LOADERS ==============
+
+class DataLoader:
+    """Batches find-by-id lookups on one collection and memoizes them.
+
+    Every key requested during the same event-loop tick is fetched with a
+    single `$in` query. Results are cached for the lifetime of the loader,
+    so only use it for reads, never to re-check a document you just wrote.
+    """
+
+    def __init__(self, collection, key: str = "id"):
+        self.collection = collection
+        self.key = key
+        self._cache: Dict[str, asyncio.Future] = {}
+        self._queue: List[str] = []
+        self._tasks = set()
+
+    def _future(self, key: str) -> asyncio.Future:
+        future = self._cache.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._cache[key] = future
+            self._queue.append(key)
+            if len(self._queue) == 1:
+                loop.call_soon(self._dispatch)
+        return future
+
+    def _dispatch(self):
+        keys, self._queue = self._queue, []
+        task = asyncio.ensure_future(self._fetch(keys))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, keys: List[str]):
+        try:
+            docs = await self.collection.find({self.key: {"$in": keys}}, {"_id": 0}).to_list(None)
+        except Exception as e:
+            for key in keys:
+                future = self._cache.pop(key)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        found = {doc[self.key]: doc for doc in docs}
+        for key in keys:
+            future = self._cache[key]
+            if not future.done():
+                future.set_result(found.get(key))
+
+    async def load(self, key: Optional[str]) -> Optional[dict]:
+        """Return a copy of the document with this key, or None"""
+        if not key:
+            return None
+        doc = await asyncio.shield(self._future(key))
+        return dict(doc) if doc else None
+
+    async def load_many(self, keys: List[Optional[str]]) -> List[Optional[dict]]:
+        """Load several keys in one round trip, preserving order"""
+        pending = [self._future(key) if key else None for key in keys]
+        docs = []
+        for future in pending:
+            doc = await asyncio.shield(future) if future else None
+            docs.append(dict(doc) if doc else None)
+        return docs
+
+    def clear(self, key: str):
+        """Forget a cached key so the next load hits the database again"""
+        future = self._cache.get(key)
+        if future is not None and future.done():
+            del self._cache[key]
+
+class Loaders:
+    """Per-request set of loaders for the collections looked up by id"""
+
+    def __init__(self, database=None):
+        database = db if database is None else database
+        self.users = DataLoader(database.users)
+        self.instructors = DataLoader(database.instructors)
+        self.lessons = DataLoader(database.lessons)
+
+_request_loaders: contextvars.ContextVar[Optional[Loaders]] = contextvars.ContextVar("request_loaders", default=None)
+
+def get_loaders() -> Loaders:
+    """Loaders bound to the current request (or a fresh set outside a request)"""
+    loaders = _request_loaders.get()
+    if loaders is None:
+        loaders = Loaders()
+        _request_loaders.set(loaders)
+    return loaders
+
+def find_station(station_id: Optional[str]) -> Optional[dict]:
+    return next((s for s in SKI_STATIONS if s["id"] == station_id), None)
+
+async def attach_instructor_details(instructors: List[dict]) -> List[dict]:
+    """Embed user and station into instructor documents (one users query)"""
+    users = await get_loaders().users.load_many([i["user_id"] for i in instructors])
+    for instructor, user in zip(instructors, users):
+        without_copies(instructor)
+        instructor["user"] = user
+        if instructor.get("station_id"):
+            instructor["station"] = find_station(instructor["station_id"])
+    return instructors
+
+# ============== SEARCH & GEO FIELDS ==============
+
+# One text index per collection, so names living elsewhere (user, station) are copied into "search",
+# and instructors and lessons carry their station's point so $geoNear can sort them by distance
+SEARCH_LANGUAGE = os.environ.get('SEARCH_LANGUAGE', 'french')
+# The copies are internal: every read returned by the API leaves them out
+COPIED_FIELDS = ("search", "location")
+PUBLIC_PROJECTION = {"_id": 0, **{field: 0 for field in COPIED_FIELDS}}
+
+def without_copies(doc: dict) -> dict:
+    """Drop the copied fields from a document about to be returned"""
+    for field in COPIED_FIELDS:
+        doc.pop(field, None)
+    return doc
+
+def station_point(station_id: Optional[str]) -> Optional[dict]:
+    """GeoJSON point of a station, None when its coordinates are unknown"""
+    station = find_station(station_id) or {}
+    coords = station if "lat" in station else STATION_COORDS.get(station_id)
+    if not coords:
+        return None
+    return {"type": "Point", "coordinates": [coords["lon"], coords["lat"]]}
+
+def instructor_copies(instructor: dict, user: Optional[dict]) -> dict:
+    """Fields copied onto an instructor document"""
+    station = find_station(instructor.get("station_id"))
+    return {
+        "search": {"name": (user or {}).get("name", ""), "station": station["name"] if station else ""},
+        "location": station_point(instructor.get("station_id")),
+    }
+
+def lesson_copies(instructor: dict, user: Optional[dict]) -> dict:
+    """Fields copied onto a lesson: searchable names, the instructor fields lessons are filtered on, location"""
+    station = find_station(instructor.get("station_id"))
+    return {
+        "search": {
+            "instructor": (user or {}).get("name", ""),
+            "station": station["name"] if station else "",
+            "station_id": instructor.get("station_id"),
+            "ski_levels": instructor.get("ski_levels", []),
+            "specialties": instructor.get("specialties", []),
+        },
+        "location": station_point(instructor.get("station_id")),
+    }
+
+async def refresh_instructor_copies(instructor_ids: Optional[List[str]] = None):
+    """Rewrite the copied fields of these instructors and their lessons (default: everything missing them).
+
+    Call it after every write to a source field: the user's name, the instructor's station, levels or specialties.
+    """
+    if instructor_ids is None:
+        missing = {"$or": [{"search": {"$exists": False}}, {"location": {"$exists": False}}]}
+        instructor_ids = await db.instructors.distinct("id", missing)
+        instructor_ids += await db.lessons.distinct("instructor_id", missing)
+        instructor_ids = list(set(instructor_ids))
+    if not instructor_ids:
+        return
+
+    instructors = await db.instructors.find({"id": {"$in": instructor_ids}}, {"_id": 0}).to_list(None)
+    users = await db.users.find({"id": {"$in": [i["user_id"] for i in instructors]}}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+    users_by_id = {u["id"]: u for u in users}
+
+    instructor_ops, lesson_ops = [], []
+    for instructor in instructors:
+        user = users_by_id.get(instructor["user_id"])
+        instructor_ops.append(UpdateOne({"id": instructor["id"]}, {"$set": instructor_copies(instructor, user)}))
+        lesson_ops.append(UpdateMany({"instructor_id": instructor["id"]}, {"$set": lesson_copies(instructor, user)}))
+    if instructor_ops:
+        await db.instructors.bulk_write(instructor_ops, ordered=False)
+        await db.lessons.bulk_write(lesson_ops, ordered=False)
+
+async def ensure_search_indexes():
+    """Weighted text indexes for /api/search"""
+    indexes = (
+        (db.instructors, "instructors_search",
+         {"search.name": 10, "specialties": 5, "search.station": 5, "bio": 1}),
+        (db.lessons, "lessons_search",
+         {"title": 10, "search.station": 5, "search.instructor": 3, "description": 1}),
+    )
+    for collection, name, weights in indexes:
+        try:
+            await collection.create_index([(field, "text") for field in weights], name=name,
+                                          weights=weights, default_language=SEARCH_LANGUAGE)
+        except OperationFailure as e:
+            # A collection has at most one text index: an older definition must be dropped by hand
+            logger.warning(f"Text index {name} not created: {e}")
+
+async def ensure_geo_indexes():
+    """2dsphere index on every location (documents whose location is null are skipped)"""
+    for collection in (db.stations, db.instructors, db.lessons):
+        await collection.create_index([("location", "2dsphere")])
+
+async def sync_stations():
+    """Mirror the stations with their GeoJSON points into Mongo, for $geoNear on /api/stations"""
+    await db.stations.bulk_write([
+        UpdateOne({"id": station["id"]}, {"$set": {**station, "location": station_point(station["id"])}}, upsert=True)
+        for station in SKI_STATIONS
+    ], ordered=False)
+
+def parse_near(near: str) -> dict:
+    """GeoJSON point from a "lat,lon" query parameter"""
+    try:
+        lat, lon = (float(part) for part in near.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Paramètre near invalide (attendu : lat,lon)")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise HTTPException(status_code=400, detail="Coordonnées hors limites")
+    return {"type": "Point", "coordinates": [lon, lat]}
+
+async def find_near(collection, near: str, radius_km: float, query: dict, limit: int = 100) -> List[dict]:
+    """Documents matching `query` within radius_km of `near`, closest first, with distance_km"""
+    return await collection.aggregate([
+        {"$geoNear": {
+            "near": parse_near(near),
+            "key": "location",
+            "distanceField": "distance_km",
+            "distanceMultiplier": 0.001,
+            "maxDistance": radius_km * 1000,  # meters for GeoJSON points
+            "query": query,
+            "spherical": True,
+        }},
+        {"$limit": limit},
+        {"$project": PUBLIC_PROJECTION},
+    ]).to_list(None)
+
+# ============== AVAILABILITY INVENTORY ==============
+
+# One document per (station, day) with open lessons and seats left by lesson type: API writes
+# apply their lessons' change with $inc, bulk imports and station moves recompute from the lessons
+AVAILABILITY_MAX_DAYS = int(os.environ.get('AVAILABILITY_MAX_DAYS', '93'))
+
+_LESSON_OPEN = {"$and": [{"$eq": ["$status", "available"]}, {"$lt": ["$current_participants", "$max_participants"]}]}
+
+async def availability_rows(match: dict) -> Dict[tuple, dict]:
+    """Inventory documents keyed by (station_id, date) for the lessons matching `match`"""
+    groups = await db.lessons.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": {"station_id": "$search.station_id", "date": "$date", "lesson_type": "$lesson_type"},
+            "open_lessons": {"$sum": {"$cond": [_LESSON_OPEN, 1, 0]}},
+            "seats_left": {"$sum": {"$cond": [_LESSON_OPEN, {"$subtract": ["$max_participants", "$current_participants"]}, 0]}},
+        }},
+    ]).to_list(None)
+    rows = {}
+    now = datetime.now(timezone.utc)
+    for group in groups:
+        key = (group["_id"]["station_id"], group["_id"]["date"])
+        row = rows.setdefault(key, {"station_id": key[0], "date": key[1], "open_lessons": 0, "seats_left": 0,
+                                    "by_type": {}, "updated_at": now})
+        row["open_lessons"] += group["open_lessons"]
+        row["seats_left"] += group["seats_left"]
+        row["by_type"][group["_id"]["lesson_type"]] = {"open_lessons": group["open_lessons"], "seats_left": group["seats_left"]}
+    return rows
+
+async def write_availability(rows: Dict[tuple, dict]):
+    if rows:
+        await db.station_availability.bulk_write([
+            ReplaceOne({"station_id": station_id, "date": date}, row, upsert=True)
+            for (station_id, date), row in rows.items()
+        ], ordered=False)
+
+async def refresh_availability(station_id: Optional[str], dates: List[str]):
+    """Recompute the inventory of a station for these days"""
+    if not station_id or not dates:
+        return
+    dates = sorted(set(dates))
+    rows = await availability_rows({"search.station_id": station_id, "date": {"$in": dates}})
+    await write_availability(rows)
+    # Days whose last lesson left the station
+    empty = [date for date in dates if (station_id, date) not in rows]
+    if empty:
+        await db.station_availability.delete_many({"station_id": station_id, "date": {"$in": empty}})
+
+def _add_availability(deltas: Dict[tuple, dict], lesson: dict, sign: int):
+    """Add (sign=1) or remove (sign=-1) a lesson's open seat counts to the $inc of its station and day"""
+    station_id = (lesson.get("search") or {}).get("station_id")
+    if not station_id:
+        return
+    is_open = lesson.get("status") == "available" and lesson["current_participants"] < lesson["max_participants"]
+    seats = lesson["max_participants"] - lesson["current_participants"] if is_open else 0
+    inc = deltas.setdefault((station_id, lesson["date"]), {})
+    for prefix in ("", f"by_type.{lesson['lesson_type']}."):
+        inc[prefix + "open_lessons"] = inc.get(prefix + "open_lessons", 0) + sign * int(is_open)
+        inc[prefix + "seats_left"] = inc.get(prefix + "seats_left", 0) + sign * seats
+
+async def update_availability(before: List[dict], after: List[dict]):
+    """Apply a change of lessons (their documents before and after the write) to the inventory:
+    one $inc per station and day, in a single bulk write"""
+    deltas: Dict[tuple, dict] = {}
+    for lesson in before:
+        _add_availability(deltas, lesson, -1)
+    for lesson in after:
+        _add_availability(deltas, lesson, 1)
+    now = datetime.now(timezone.utc)
+    ops = [
+        UpdateOne({"station_id": station_id, "date": date}, {"$inc": inc, "$set": {"updated_at": now}}, upsert=True)
+        # New lessons always get their row and lesson type, like a rebuild gives them
+        for (station_id, date), inc in deltas.items() if not before or any(inc.values())
+    ]
+    if ops:
+        await db.station_availability.bulk_write(ops, ordered=False)
+
+async def rebuild_availability():
+    """Recompute the whole inventory (after bulk imports that bypass the API)"""
+    started = datetime.now(timezone.utc)
+    await write_availability(await availability_rows({"search.station_id": {"$ne": None}}))
+    await db.station_availability.delete_many({"updated_at": {"$lt": started}})
+
+async def ensure_availability():
+    await db.station_availability.create_index([("station_id", 1), ("date", 1)], unique=True)
+    await db.lessons.create_index([("search.station_id", 1), ("date", 1)])
+    # Counts from collection metadata: the rebuild itself is left to backfill_search_fields.py
+    if not await db.station_availability.estimated_document_count() and await db.lessons.estimated_document_count():
+        logger.warning("station_availability is empty: run backend/backfill_search_fields.py to build it")
+
+# ============== RESPONSE CACHE ==============
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '2000'))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', '300'))  # safety net for writes made outside the API
+
+class ResponseCache:
+    """LRU cache of rendered JSON bodies, invalidated by tags emitted on writes"""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()  # key -> (body, tags, expires_at)
+        self._tags: Dict[str, set] = {}
+        self.size = 0
+        self.version = 0  # bumped by every invalidation
+        self.stats: Dict[str, Dict[str, int]] = {}
+        # Called with the invalidated tags, or None on clear(), by in-memory views of the same data
+        self.listeners: List = []
+
+    def _stat(self, endpoint: str) -> Dict[str, int]:
+        return self.stats.setdefault(endpoint, {"hits": 0, "misses": 0, "evictions": 0})
+
+    def get(self, endpoint: str, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] < time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self._stat(endpoint)["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stat(endpoint)["hits"] += 1
+        return entry[0]
+
+    def set(self, endpoint: str, key: str, body: bytes, tags: List[str], ttl: Optional[int] = None):
+        if len(body) > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (body, tags, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self.size += len(body)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._stat(oldest.split("?", 1)[0])["evictions"] += 1
+            self._remove(oldest)
+
+    def invalidate(self, *tags: str):
+        """Drop every cached response carrying one of these tags ("lesson:*" matches every lesson tag)"""
+        self.version += 1
+        for tag in tags:
+            matched = [t for t in self._tags if t.startswith(tag[:-1])] if tag.endswith("*") else [tag]
+            for key in set().union(*(self._tags.pop(t, set()) for t in matched)):
+                self._remove(key)
+        for listener in self.listeners:
+            listener(tags)
+
+    def clear(self):
+        self.version += 1
+        self._entries.clear()
+        self._tags.clear()
+        self.size = 0
+        for listener in self.listeners:
+            listener(None)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        body, tags, _ = entry
+        self.size -= len(body)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def snapshot(self) -> dict:
+        endpoints = {}
+        for endpoint, stat in sorted(self.stats.items()):
+            lookups = stat["hits"] + stat["misses"]
+            endpoints[endpoint] = {**stat, "hit_rate": round(stat["hits"] / lookups, 3) if lookups else 0.0}
+        return {"entries": len(self._entries), "bytes": self.size, "endpoints": endpoints}
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL)
+
+def cached_response(endpoint: str, tags, ttl: Optional[int] = None):
+    """Read-through cache for a public GET handler.
+
+    The key is the endpoint plus its normalized parameters; `tags(**params)`
+    names what the response depends on, and write handlers call
+    `response_cache.invalidate(...)` with the matching tags. `ttl` overrides
+    RESPONSE_CACHE_TTL for this endpoint.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(**params):
+            key = endpoint + "?" + urlencode(sorted((k, v) for k, v in params.items() if v is not None))
+            body = response_cache.get(endpoint, key)
+            if body is None:
+                version = response_cache.version
+                result = await handler(**params)
+                if isinstance(result, Response):
+                    if result.status_code != 200:
+                        return result
+                    body = result.body
+                else:
+                    body = FastJSONResponse(result).body
+                # Don't store a result that raced with a write
+                if version == response_cache.version:
+                    response_cache.set(endpoint, key, body, list(tags(**params)), ttl)
+            return Response(content=body, media_type="application/json")
+        return wrapper
+    return decorator
+
+# ============== CACHE INVALIDATION BUS ==============
+
+# With several workers (WEB_CONCURRENCY, also read by uvicorn) or replicas, a write only
+# evicts the cache of the process that handled it; the bus tails MongoDB change streams
+# so every process evicts the same tags. Change streams need a replica set (or Atlas):
+# "auto" uses them when available, "on" refuses to start without them, "off" disables them
+CACHE_INVALIDATION = os.environ.get('CACHE_INVALIDATION', 'auto').lower()
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', '1'))
+WATCHED_COLLECTIONS = ["users", "instructors", "lessons", "bookings", "reviews"]
+
+def change_tags(change: dict) -> Optional[List[str]]:
+    """Cache tags touched by a change event; None for a collection with no known tags.
+
+    Deletes carry the document only as its pre-image (fullDocumentBeforeChange);
+    without one, the per-document tag widens to every tag of that collection.
+    """
+    doc = change.get("fullDocument") or change.get("fullDocumentBeforeChange")
+    field = (lambda name: doc.get(name)) if doc else (lambda name: "*")
+    collection = change["ns"]["coll"]
+    if collection == "users":
+        return ["users"]
+    if collection == "instructors":
+        return ["instructors", f"instructor:{field('id')}"]
+    if collection == "lessons":
+        return ["lessons", f"lesson:{field('id')}"]
+    if collection == "bookings":
+        return ["lessons", f"lesson:{field('lesson_id')}"]
+    if collection == "reviews":
+        return [f"reviews:{field('instructor_id')}"]
+    return None
+
+class CacheInvalidationBus:
+    """Tails change streams on the watched collections and evicts this worker's cache"""
+
+    def __init__(self, cache: ResponseCache):
+        self.cache = cache
+        self.resume_token = None
+        self.events = 0
+        self.restarts = 0
+        # True when other workers' writes can't reach this one: in-memory views must not be used
+        self.local_only = False
+        # Deleted documents come with their pre-image (MongoDB 6.0+), so their exact tags are evicted
+        self.pre_images = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def supported(self) -> bool:
+        hello = await client.admin.command("hello")
+        return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+    async def enable_pre_images(self) -> bool:
+        """Record pre-images on the watched collections (idempotent); False when the server can't"""
+        try:
+            for name in WATCHED_COLLECTIONS:
+                if name not in await db.list_collection_names(filter={"name": name}):
+                    await db.create_collection(name)
+                await db.command("collMod", name, changeStreamPreAndPostImages={"enabled": True})
+        except PyMongoError as e:
+            logger.warning(f"Change stream pre-images unavailable, deletes evict whole collections: {e}")
+            return False
+        return True
+
+    async def start(self):
+        if CACHE_INVALIDATION == "off":
+            return
+        if not await self.supported():
+            if CACHE_INVALIDATION == "on":
+                raise RuntimeError("CACHE_INVALIDATION=on requires MongoDB change streams (replica set)")
+            if WEB_CONCURRENCY > 1:
+                # Other workers' writes would never reach this cache: don't cache at all
+                self.cache.max_entries = 0
+                self.local_only = True
+                logger.warning("Change streams unavailable with several workers: response cache disabled")
+            return
+        self.pre_images = await self.enable_pre_images()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def apply(self, change: dict):
+        self.events += 1
+        tags = change_tags(change)
+        if tags is None:
+            self.cache.clear()
+        else:
+            self.cache.invalidate(*tags)
+
+    async def _run(self):
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": WATCHED_COLLECTIONS},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+        }}]
+        while True:
+            try:
+                async with db.watch(pipeline, full_document="updateLookup", resume_after=self.resume_token,
+                                    full_document_before_change="whenAvailable" if self.pre_images else None) as stream:
+                    async for change in stream:
+                        self.apply(change)
+                        self.resume_token = stream.resume_token
+            except OperationFailure as e:
+                # Resume token fell off the oplog (or was rejected): events were missed
+                logger.warning(f"Change stream could not resume, clearing response cache: {e}")
+                self.resume_token = None
+                self.cache.clear()
+            except PyMongoError as e:
+                logger.warning(f"Change stream interrupted, resuming: {e}")
+            self.restarts += 1
+            await asyncio.sleep(1)
+
+    def snapshot(self) -> dict:
+        return {"mode": CACHE_INVALIDATION, "running": self.running, "pre_images": self.pre_images,
+                "events": self.events, "restarts": self.restarts}
+
+invalidation_bus = CacheInvalidationBus(response_cache)
+
+# ============== INSTRUCTOR DIRECTORY ==============
+
+# In-process copy of the approved instructors (with user and station embedded) for GET /api/instructors
+INSTRUCTOR_DIRECTORY = os.environ.get('INSTRUCTOR_DIRECTORY', 'on').lower() not in ('0', 'off', 'false', 'no')
+INSTRUCTOR_DIRECTORY_MAX_AGE = int(os.environ.get('INSTRUCTOR_DIRECTORY_MAX_AGE', str(RESPONSE_CACHE_TTL)))
+INSTRUCTOR_DIRECTORY_TAGS = {"instructors", "users"}
+
+def hourly_rate(instructor: dict) -> Optional[float]:
+    """The numeric hourly rate, None when missing or not a number (never matched by $gte/$lte)"""
+    rate = instructor.get("hourly_rate")
+    return rate if isinstance(rate, (int, float)) and not isinstance(rate, bool) else None
+
+class InstructorDirectory:
+    """Approved instructors sorted by (hourly_rate, id), with one bitmap per station, specialty and level.
+
+    Bit i of a bitmap (a Python int) is set when entry i has that value, so
+    combined filters are a few big-int ANDs, and sorting by rate turns a
+    price range into a contiguous run of bits. Any "instructors"/"users"
+    invalidation, local or from the change stream bus, marks it stale; it
+    is then rebuilt in the background while requests fall back to Mongo.
+    """
+
+    def __init__(self):
+        self.entries: List[dict] = []
+        self.rates: List[float] = []  # -inf where the rate is missing
+        self.unrated = 0
+        self.stations: Dict[str, int] = {}
+        self.specialties: Dict[str, int] = {}
+        self.levels: Dict[str, int] = {}
+        self.built_at = 0.0
+        self.version = 0  # bumped by every relevant invalidation
+        self.built_version = -1
+        self.builds = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return (self.built_version == self.version
+                and time.monotonic() - self.built_at < INSTRUCTOR_DIRECTORY_MAX_AGE)
+
+    def on_invalidate(self, tags: Optional[tuple]):
+        if tags is None or INSTRUCTOR_DIRECTORY_TAGS.intersection(tags):
+            self.version += 1
+
+    async def build(self):
+        """Load the approved instructors and their users (two queries) and rebuild the bitmaps"""
+        version = self.version
+        instructors = await db.instructors.find({"status": "approved"}, PUBLIC_PROJECTION).to_list(None)
+        users = await db.users.find({"id": {"$in": [i["user_id"] for i in instructors]}}, {"_id": 0}).to_list(None)
+        users_by_id = {u["id"]: u for u in users}
+
+        # As in Mongo: instructors without a rate sort first and never match a price bound
+        instructors.sort(key=lambda i: (hourly_rate(i) is not None, hourly_rate(i) or 0.0, i["id"]))
+        stations, specialties, levels = {}, {}, {}
+        for position, instructor in enumerate(instructors):
+            # Same shape as attach_instructor_details()
+            instructor["user"] = users_by_id.get(instructor["user_id"])
+            if instructor.get("station_id"):
+                instructor["station"] = find_station(instructor["station_id"])
+            bit = 1 << position
+            stations[instructor.get("station_id")] = stations.get(instructor.get("station_id"), 0) | bit
+            for specialty in set(instructor.get("specialties") or []):
+                specialties[specialty] = specialties.get(specialty, 0) | bit
+            for level in set(instructor.get("ski_levels") or []):
+                levels[level] = levels.get(level, 0) | bit
+
+        self.entries = instructors
+        self.rates = [-math.inf if hourly_rate(i) is None else hourly_rate(i) for i in instructors]
+        self.unrated = bisect.bisect_right(self.rates, -math.inf)
+        self.stations, self.specialties, self.levels = stations, specialties, levels
+        self.built_at = time.monotonic()
+        # A write that landed during the load leaves the directory stale, to be rebuilt again
+        self.built_version = version
+        self.builds += 1
+
+    def _schedule_build(self):
+        if self._task is None or self._task.done():
+            self._task = background_task(self._build_logged())
+
+    async def _build_logged(self):
+        try:
+            await self.build()
+        except PyMongoError as e:
+            logger.warning(f"Instructor directory build failed: {e}")
+
+    def select(self, station_id: Optional[str] = None, specialty: Optional[str] = None, level: Optional[str] = None,
+               min_price: Optional[float] = None, max_price: Optional[float] = None, limit: int = 100) -> Optional[List[dict]]:
+        """Matching instructors by increasing rate, or None when the directory can't answer (cold or stale)"""
+        if not INSTRUCTOR_DIRECTORY or invalidation_bus.local_only:
+            return None
+        if not self.ready:
+            self._schedule_build()
+            return None
+
+        mask = (1 << len(self.entries)) - 1
+        if station_id:
+            mask &= self.stations.get(station_id, 0)
+        if specialty:
+            mask &= self.specialties.get(specialty, 0)
+        if level:
+            mask &= self.levels.get(level, 0)
+        if min_price is not None or max_price is not None:
+            low = max(self.unrated, bisect.bisect_left(self.rates, min_price) if min_price is not None else 0)
+            high = bisect.bisect_right(self.rates, max_price) if max_price is not None else len(self.rates)
+            mask &= ((1 << high) - 1) ^ ((1 << low) - 1) if high > low else 0
+
+        selected = []
+        while mask and len(selected) < limit:
+            lowest = mask & -mask
+            selected.append(self.entries[lowest.bit_length() - 1])
+            mask ^= lowest
+        return selected
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def snapshot(self) -> dict:
+        return {"enabled": INSTRUCTOR_DIRECTORY, "ready": self.ready, "entries": len(self.entries), "builds": self.builds}
+
+instructor_directory = InstructorDirectory()
+response_cache.listeners.append(instructor_directory.on_invalidate)
+
+# ============== LESSON ENGINE ==============
+
+# "numpy": GET /api/lessons filters run as vectorized masks over in-memory columns and only the
+# matching page is read from Mongo; "mongo": every call is a Mongo query
+LESSON_ENGINE = os.environ.get('LESSON_ENGINE', 'mongo').lower()
+LESSON_ENGINE_MAX_AGE = int(os.environ.get('LESSON_ENGINE_MAX_AGE', str(RESPONSE_CACHE_TTL)))
+
+if LESSON_ENGINE not in ("mongo", "numpy"):
+    raise RuntimeError(f"Invalid LESSON_ENGINE: {LESSON_ENGINE}")
+if LESSON_ENGINE == "numpy" and np is None:
+    raise RuntimeError("LESSON_ENGINE=numpy requires numpy (pip install -r requirements-engine.txt)")
+
+LESSON_ENGINE_PROJECTION = {"_id": 0, "id": 1, "status": 1, "date": 1, "start_time": 1, "price": 1, "lesson_type": 1,
+                            "instructor_id": 1, "max_participants": 1, "current_participants": 1, "search": 1}
+
+def _day(value: str) -> int:
+    """Ordinal of a YYYY-MM-DD date, unpadded legacy values ("2026-1-5") included"""
+    return datetime.strptime(value, "%Y-%m-%d").toordinal()
+
+def _minute(value: str) -> int:
+    """Minutes of an HH:MM time, unpadded legacy values ("9:00") included"""
+    parsed = datetime.strptime(value, "%H:%M")
+    return parsed.hour * 60 + parsed.minute
+
+def _number(value) -> float:
+    """A price or seat count; numeric strings of legacy documents are read as numbers"""
+    if isinstance(value, str):
+        return float(value)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise TypeError(f"not a number: {value!r}")
+    return value
+
+class LessonEngine:
+    """Available lessons as NumPy columns sorted like the Mongo path, by (date, start_time, id).
+
+    Stations, lesson types and instructors are stored as small integer codes
+    and the instructor's levels as a bitmask. Writes invalidate "lesson:<id>"
+    tags (locally or through the change stream bus): those rows are re-read
+    and patched in place, or appended and re-sorted for new lessons. Any
+    other lesson/instructor invalidation triggers a full rebuild. Until the
+    pending refresh is applied, select() returns None and the caller queries
+    Mongo. Legacy rows ("9:00" start times, "2026-1-5" dates, numeric strings)
+    are stored by their value; a row that can't be read at all is left out on
+    its own and counted in `irregular`. Events from other workers arrive with a
+    delay and legacy strings compare differently in Mongo, so the caller reads
+    the selected page back with the full filter: a listed lesson always still
+    matches in Mongo.
+    """
+
+    COLUMNS = {"day": "int32", "start": "int16", "price": "float64", "seats": "int32", "station": "int32",
+               "type": "int16", "instructor": "int32", "levels": "uint64", "alive": "bool"}
+
+    def __init__(self):
+        self.codes: Dict[str, Dict[str, int]] = {"station": {}, "type": {}, "instructor": {}}
+        self.level_bits: Dict[str, int] = {}
+        self.columns: Dict[str, Any] = {}
+        self.ids: List[str] = []
+        self.positions: Dict[str, int] = {}
+        self.irregular: set = set()  # ids of available lessons left out of the columns
+        self.built_at = 0.0
+        self.version = 0
+        self.applied_version = -1
+        self.builds = 0
+        self.patches = 0
+        self._pending: set = set()
+        self._rebuild = True
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return (self.applied_version == self.version
+                and time.monotonic() - self.built_at < LESSON_ENGINE_MAX_AGE)
+
+    def _code(self, kind: str, value: Optional[str]) -> int:
+        codes = self.codes[kind]
+        return codes.setdefault(value, len(codes))
+
+    def _levels(self, levels: List[str]) -> int:
+        mask = 0
+        for level in levels:
+            if level not in self.level_bits:
+                if len(self.level_bits) == 64:
+                    raise ValueError("more than 64 ski levels")
+                self.level_bits[level] = len(self.level_bits)
+            mask |= 1 << self.level_bits[level]
+        return mask
+
+    def _row(self, lesson: dict):
+        """Column values of an available lesson, None if it is not listed, or "irregular" if it is
+        listed by Mongo but can't be read (left out of the columns)"""
+        if lesson.get("status") != "available":
+            return None
+        search = lesson.get("search") or {}
+        try:
+            return (_day(lesson["date"]), _minute(lesson["start_time"]), _number(lesson["price"]),
+                    _number(lesson["max_participants"]) - _number(lesson["current_participants"]),
+                    self._code("station", search.get("station_id")), self._code("type", lesson.get("lesson_type")),
+                    self._code("instructor", lesson.get("instructor_id")),
+                    self._levels(search.get("ski_levels") or []), True)
+        except (KeyError, TypeError, ValueError):
+            return "irregular"
+
+    def _columns(self, rows: List[tuple]) -> Dict[str, Any]:
+        return {name: np.array([row[i] for row in rows], dtype=dtype) if rows else np.empty(0, dtype=dtype)
+                for i, (name, dtype) in enumerate(self.COLUMNS.items())}
+
+    def _load(self, ids: List[str], columns: Dict[str, Any]):
+        """Replace the columns, sorted by (date, start_time, id)"""
+        order = np.lexsort((np.array(ids, dtype=str), columns["start"], columns["day"])) if ids else np.empty(0, dtype=int)
+        self.columns = {name: column[order] for name, column in columns.items()}
+        self.ids = [ids[i] for i in order]
+        self.positions = {lesson_id: position for position, lesson_id in enumerate(self.ids)}
+
+    async def build(self):
+        # Everything invalidated so far is covered by this full read
+        self._rebuild, self._pending = False, set()
+        version = self.version
+        ids, rows, irregular = [], [], set()
+        async for lesson in db.lessons.find({"status": "available"}, LESSON_ENGINE_PROJECTION):
+            row = self._row(lesson)
+            if row == "irregular":
+                irregular.add(lesson["id"])
+            elif row:
+                ids.append(lesson["id"])
+                rows.append(row)
+        if irregular:
+            logger.warning(f"Lesson engine: {len(irregular)} available lessons with an unreadable date, time, price "
+                           f"or seat count are left out of the engine's results")
+        self._load(ids, self._columns(rows))
+        self.irregular = irregular
+        self.built_at = time.monotonic()
+        self.applied_version = version
+        self.builds += 1
+
+    async def patch(self, lesson_ids: List[str]):
+        """Re-read these lessons and update, drop or add their rows"""
+        version = self.version
+        lessons = await db.lessons.find({"id": {"$in": lesson_ids}}, LESSON_ENGINE_PROJECTION).to_list(None)
+        rows = {lesson["id"]: self._row(lesson) for lesson in lessons}
+        added_ids, added_rows = [], []
+        for lesson_id in lesson_ids:
+            row = rows.get(lesson_id)
+            if row == "irregular":
+                self.irregular.add(lesson_id)
+                row = None
+            else:
+                self.irregular.discard(lesson_id)
+            position = self.positions.get(lesson_id)
+            if position is not None:
+                if row is None:
+                    self.columns["alive"][position] = False
+                else:
+                    for column, value in zip(self.COLUMNS, row):
+                        self.columns[column][position] = value
+            elif row is not None:
+                added_ids.append(lesson_id)
+                added_rows.append(row)
+        if added_rows:
+            # New lessons are rare (creation only): re-sort everything to keep the page order
+            alive = np.flatnonzero(self.columns["alive"])
+            added = self._columns(added_rows)
+            self._load([self.ids[i] for i in alive] + added_ids,
+                       {name: np.concatenate([self.columns[name][alive], added[name]]) for name in self.COLUMNS})
+        self.applied_version = version
+        self.patches += 1
+
+    def on_invalidate(self, tags: Optional[tuple]):
+        if LESSON_ENGINE != "numpy":
+            return
+        if tags is None:
+            self._rebuild = True
+        else:
+            lesson_ids = [tag.split(":", 1)[1] for tag in tags if tag.startswith("lesson:")]
+            if "*" in lesson_ids:
+                self._rebuild = True  # a lesson deleted without its pre-image
+            elif lesson_ids:
+                self._pending.update(lesson_ids)
+            elif "lessons" in tags or "instructors" in tags:
+                # Station or levels of an instructor changed, or lessons written without ids
+                self._rebuild = True
+            else:
+                return
+        self.version += 1
+        self._schedule()
+
+    def _schedule(self):
+        if self._task is None or self._task.done():
+            self._task = background_task(self._sync())
+
+    async def _sync(self):
+        try:
+            while self._rebuild or self._pending:
+                if self._rebuild or time.monotonic() - self.built_at >= LESSON_ENGINE_MAX_AGE:
+                    await self.build()
+                else:
+                    lesson_ids, self._pending = list(self._pending), set()
+                    await self.patch(lesson_ids)
+        except PyMongoError as e:
+            self._rebuild = True
+            logger.warning(f"Lesson engine refresh failed: {e}")
+
+    def select(self, instructor_id: Optional[str] = None, date: Optional[str] = None, lesson_type: Optional[str] = None,
+               station_id: Optional[str] = None, min_price: Optional[float] = None, max_price: Optional[float] = None,
+               level: Optional[str] = None, date_from: Optional[str] = None, date_to: Optional[str] = None,
+               start_after: Optional[str] = None, start_before: Optional[str] = None, min_seats: Optional[int] = None,
+               limit: int = 100) -> Optional[List[str]]:
+        """Ids of the first matching lessons in (date, start_time, id) order, None when the engine
+        can't answer (not ready, or an exact `date` that is not YYYY-MM-DD).
+
+        Takes the values lesson_query() builds its filter from: `date` as given (Mongo
+        compares it as a raw string), ranges already normalized (see normalized_date()).
+        """
+        if LESSON_ENGINE != "numpy" or invalidation_bus.local_only:
+            return None
+        if not self.ready:
+            if time.monotonic() - self.built_at >= LESSON_ENGINE_MAX_AGE:
+                self._rebuild = True
+            self._schedule()
+            return None
+
+        c = self.columns
+        mask = c["alive"].copy()
+        for kind, column, value in (("instructor", "instructor", instructor_id), ("type", "type", lesson_type),
+                                    ("station", "station", station_id)):
+            if value:
+                code = self.codes[kind].get(value)
+                if code is None:
+                    return []
+                mask &= c[column] == code
+        if level:
+            if level not in self.level_bits:
+                return []
+            mask &= (c["levels"] & np.uint64(1 << self.level_bits[level])) != 0
+        if date:
+            # Mongo compares the raw string: only the canonical form can be answered from the day column
+            try:
+                day = _day(date)
+            except ValueError:
+                return None
+            if datetime.fromordinal(day).strftime("%Y-%m-%d") != date:
+                return None
+            mask &= c["day"] == day
+        if date_from:
+            mask &= c["day"] >= _day(date_from)
+        if date_to:
+            mask &= c["day"] <= _day(date_to)
+        if start_after:
+            mask &= c["start"] >= _minute(start_after)
+        if start_before:
+            mask &= c["start"] < _minute(start_before)
+        if min_price is not None:
+            mask &= c["price"] >= min_price
+        if max_price is not None:
+            mask &= c["price"] <= max_price
+        if min_seats is not None:
+            mask &= c["seats"] >= min_seats
+        return [self.ids[i] for i in np.flatnonzero(mask)[:limit]]
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def snapshot(self) -> dict:
+        return {"engine": LESSON_ENGINE, "ready": self.ready, "rows": int(self.columns["alive"].sum()) if self.columns else 0,
+                "irregular": len(self.irregular), "builds": self.builds, "patches": self.patches}
+
+lesson_engine = LessonEngine()
+response_cache.listeners.append(lesson_engine.on_invalidate)
+
+# ============== AUTH HELPERS ==============
+
+SESSION_TTL_DAYS = int(os.environ.get('SESSION_TTL_DAYS', '7'))
+# Oldest sessions of a user are dropped beyond this many concurrent logins
+MAX_SESSIONS_PER_USER = int(os.environ.get('MAX_SESSIONS_PER_USER', '5'))
+# Verified opaque tokens remembered per worker so rate limiting can key on the user
+VERIFIED_SESSIONS_MAX = int(os.environ.get('VERIFIED_SESSIONS_MAX', '10000'))
+
+async def ensure_session_indexes():
+    """TTL + unique token indexes on user_sessions; converts legacy ISO string dates first"""
+    # The TTL monitor ignores non-date values, so string expiries would never be purged
+    for field in ("expires_at", "created_at"):
+        converted = await db.user_sessions.update_many(
+            {field: {"$type": "string"}}, [{"$set": {field: {"$toDate": f"${field}"}}}]
+        )
+        if converted.modified_count:
+            logger.info(f"Converted user_sessions.{field} to a native date on {converted.modified_count} sessions")
+
+    await db.user_sessions.create_index("expires_at", expireAfterSeconds=0)
+    await db.user_sessions.create_index([("user_id", 1), ("created_at", -1)])
+    try:
+        await db.user_sessions.create_index("session_token", unique=True)
+    except OperationFailure as e:
+        logger.warning(f"Unique index on user_sessions.session_token not created (duplicate tokens?): {e}")
+
+async def trim_user_sessions(user_id: str):
+    """Keep only the MAX_SESSIONS_PER_USER most recent sessions of a user"""
+    stale = await db.user_sessions.find(
+        {"user_id": user_id}, {"_id": 0, "session_token": 1}
+    ).sort("created_at", -1).skip(MAX_SESSIONS_PER_USER).to_list(None)
+    if stale:
+        await db.user_sessions.delete_many({"session_token": {"$in": [s["session_token"] for s in stale]}})
+
+class SessionOwners:
+    """Opaque session tokens already verified against user_sessions, by token hash -> (user id, expiry).
+
+    Lets the rate limiter key verified clients by user without querying Mongo before the route runs.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._owners: OrderedDict = OrderedDict()
+
+    @staticmethod
+    def _key(session_token: str) -> str:
+        return hashlib.blake2b(session_token.encode(), digest_size=16).hexdigest()
+
+    def remember(self, session_token: str, user_id: str, expires_at: datetime):
+        key = self._key(session_token)
+        self._owners.pop(key, None)
+        self._owners[key] = (user_id, expires_at.timestamp())
+        if len(self._owners) > self.max_entries:
+            self._owners.popitem(last=False)
+
+    def forget(self, session_token: str):
+        self._owners.pop(self._key(session_token), None)
+
+    def get(self, session_token: str) -> Optional[str]:
+        owner = self._owners.get(self._key(session_token))
+        if owner is None or owner[1] < time.time():
+            return None
+        return owner[0]
+
+session_owners = SessionOwners(VERIFIED_SESSIONS_MAX)
+
+# ============== SIGNED SESSIONS ==============
+
+# "database": opaque tokens looked up in user_sessions; "signed": self-contained HMAC tokens
+SESSION_MODE = os.environ.get('SESSION_MODE', 'database').lower()
+SESSION_SECRET = os.environ.get('SESSION_SECRET', '')
+# How often each worker pulls new revocations (logout, role changes) from Mongo
+REVOCATION_SYNC_SECONDS = float(os.environ.get('REVOCATION_SYNC_SECONDS', '5'))
+
+if SESSION_MODE not in ("database", "signed"):
+    raise RuntimeError(f"Invalid SESSION_MODE: {SESSION_MODE}")
+if SESSION_MODE == "signed" and len(SESSION_SECRET) < 32:
+    raise RuntimeError("SESSION_MODE=signed requires a SESSION_SECRET of at least 32 characters")
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _signature(payload: str) -> str:
+    return _b64encode(hmac.new(SESSION_SECRET.encode(), payload.encode(), hashlib.sha256).digest())
+
+def sign_session(user: User) -> str:
+    """Mint a signed token carrying the user's identity and role"""
+    now = time.time()
+    payload = _b64encode(orjson.dumps({
+        "sid": uuid.uuid4().hex,
+        "sub": user.id,
+        "email": user.email,
+        "name": user.name,
+        "picture": user.picture,
+        "role": user.role,
+        "iat": now,
+        "exp": int(now + SESSION_TTL_DAYS * 24 * 60 * 60),
+    }))
+    return f"{payload}.{_signature(payload)}"
+
+def verify_session(token: str) -> Optional[dict]:
+    """Claims of a valid, unexpired and unrevoked signed token, else None"""
+    payload, _, signature = token.partition(".")
+    # Compare bytes: compare_digest raises TypeError on non-ASCII str (crafted cookies would 500)
+    if not signature or not hmac.compare_digest(signature.encode(), _signature(payload).encode()):
+        return None
+    try:
+        claims = orjson.loads(_b64decode(payload))
+    except ValueError:  # malformed base64 or JSON
+        return None
+    if claims["exp"] < time.time() or revocations.is_revoked(claims):
+        return None
+    return claims
+
+class RevocationList:
+    """Revoked session ids and per-user cut-offs, mirrored from Mongo into every worker"""
+
+    def __init__(self):
+        self.sessions: Dict[str, float] = {}  # sid -> token expiry
+        self.users: Dict[str, float] = {}  # user id -> tokens issued before are revoked
+        self.last_sync = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def is_revoked(self, claims: dict) -> bool:
+        return claims["sid"] in self.sessions or claims["iat"] < self.users.get(claims["sub"], 0.0)
+
+    def _add(self, entry: dict):
+        if entry.get("sid"):
+            self.sessions[entry["sid"]] = entry["expires_at"].timestamp()
+        else:
+            self.users[entry["user_id"]] = max(self.users.get(entry["user_id"], 0.0), entry["not_before"])
+
+    async def _record(self, entry: dict):
+        self._add(entry)
+        await db.session_revocations.insert_one({**entry, "revoked_at": datetime.now(timezone.utc)})
+
+    async def revoke_session(self, claims: dict):
+        await self._record({"sid": claims["sid"], "user_id": claims["sub"],
+                            "expires_at": datetime.fromtimestamp(claims["exp"], timezone.utc)})
+
+    async def revoke_user(self, user_id: str):
+        """Invalidate every token issued to a user so far (role change)"""
+        now = time.time()
+        expires_at = datetime.fromtimestamp(now + SESSION_TTL_DAYS * 24 * 60 * 60, timezone.utc)
+        await self._record({"user_id": user_id, "not_before": now, "expires_at": expires_at})
+
+    async def sync(self):
+        """Pull revocations recorded by other workers since the last sync and drop expired ones"""
+        started = datetime.now(timezone.utc)
+        # Overlap a little with the previous window so concurrent inserts are not missed
+        since = datetime.fromtimestamp(max(self.last_sync - 1, 0), timezone.utc)
+        async for entry in db.session_revocations.find({"revoked_at": {"$gte": since}}, {"_id": 0}):
+            self._add(entry)
+        self.last_sync = started.timestamp()
+
+        now = time.time()
+        self.sessions = {sid: exp for sid, exp in self.sessions.items() if exp > now}
+        # A cut-off outlives every token it could reject after SESSION_TTL_DAYS
+        horizon = now - SESSION_TTL_DAYS * 24 * 60 * 60
+        self.users = {uid: nb for uid, nb in self.users.items() if nb > horizon}
+
+    async def start(self):
+        if SESSION_MODE != "signed":
+            return
+        await db.session_revocations.create_index("expires_at", expireAfterSeconds=0)
+        await db.session_revocations.create_index("revoked_at")
+        await self.sync()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
 
-class ReviewCreate(BaseModel):
-    instructor_id: str
-    rating: int  # 1-5
-    comment: str = ""
-    booking_id: Optional[str] = None
+    async def _run(self):
+        while True:
+            await asyncio.sleep(REVOCATION_SYNC_SECONDS)
+            try:
+                await self.sync()
+            except PyMongoError as e:
+                logger.warning(f"Revocation list sync failed: {e}")
 
-# ============== AUTH HELPERS ==============
+revocations = RevocationList()
 
-async def get_session_from_request(request: Request) -> Optional[UserSession]:
+def set_session_cookie(response: Response, session_token: str):
+    response.set_cookie(
+        key="session_token",
+        value=session_token,
+        httponly=True,
+        secure=True,
+        samesite="none",
+        path="/",
+        max_age=SESSION_TTL_DAYS*24*60*60
+    )
+
+async def reissue_session(response: Response, user: User):
+    """After a role change, revoke the user's signed tokens and hand this client a fresh one"""
+    if SESSION_MODE != "signed":
+        return  # database sessions read the role from users on every request
+    await revocations.revoke_user(user.id)
+    set_session_cookie(response, sign_session(user))
+
+def session_token_from_request(request: Request) -> Optional[str]:
     session_token = request.cookies.get("session_token")
     if not session_token:
         auth_header = request.headers.get("Authorization")
         if auth_header and auth_header.startswith("Bearer "):
             session_token = auth_header.split(" ")[1]
-    
+    return session_token
+
+async def get_session_from_request(request: Request) -> Optional[UserSession]:
+    session_token = session_token_from_request(request)
     if not session_token:
         return None
     
-    session = await db.user_sessions.find_one({"session_token": session_token})
+    session = await db.user_sessions.find_one({"session_token": session_token}, {"_id": 0})
     if not session:
         return None
     
-    expires_at = session.get("expires_at")
-    if isinstance(expires_at, str):
-        expires_at = datetime.fromisoformat(expires_at.replace('Z', '+00:00'))
-    elif isinstance(expires_at, datetime) and expires_at.tzinfo is None:
-        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    expires_at = as_datetime(session.get("expires_at"))
     
-    if expires_at < datetime.now(timezone.utc):
-        await db.user_sessions.delete_one({"session_token": session_token})
+    # The TTL monitor purges expired sessions about once a minute; until then just ignore them
+    if not expires_at or expires_at < datetime.now(timezone.utc):
         return None
     
-    return UserSession(**{k: v for k, v in session.items() if k != '_id'})
+    session_owners.remember(session_token, session["user_id"], expires_at)
+    return UserSession(**session)
 
 async def get_current_user(request: Request) -> Optional[User]:
+    if SESSION_MODE == "signed":
+        session_token = session_token_from_request(request)
+        # Signed tokens contain a dot; opaque legacy tokens still go through user_sessions
+        if session_token and "." in session_token:
+            claims = verify_session(session_token)
+            if not claims:
+                return None
+            # The account creation date is not carried in the token; nothing on the auth path reads it
+            return User(id=claims["sub"], email=claims["email"], name=claims["name"],
+                        picture=claims["picture"], role=claims["role"],
+                        created_at=datetime.fromtimestamp(claims["iat"], timezone.utc))
+    
     session = await get_session_from_request(request)
     if not session:
         return None
@@ -549,7 +2133,7 @@ async def require_instructor(request: Request) -> User:
 async def process_session(request: Request, response: Response, data: SessionRequest):
     """Process session_id from Google OAuth redirect"""
     try:
-        async with httpx.AsyncClient() as http_client:
+        async with httpx.AsyncClient(timeout=outbound_timeout(5)) as http_client, track_outbound("emergent_auth"):
             resp = await http_client.get(
                 "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
                 headers={"X-Session-ID": data.session_id}
@@ -558,7 +2142,10 @@ async def process_session(request: Request, response: Response, data: SessionReq
                 raise HTTPException(status_code=401, detail="Session invalide")
             
             user_data = resp.json()
+    except DeadlineExceeded:
+        raise
     except Exception as e:
+        check_deadline()
         logger.error(f"Auth error: {e}")
         raise HTTPException(status_code=401, detail="Erreur d'authentification")
     
@@ -568,6 +2155,12 @@ async def process_session(request: Request, response: Response, data: SessionReq
     if existing_user:
         user_id = existing_user["id"]
         role = existing_user.get("role", "client")
+        # Keep the profile in sync with the OAuth provider; the name is copied onto instructors and lessons
+        profile = {"name": user_data["name"], "picture": user_data.get("picture")}
+        if any(existing_user.get(field) != value for field, value in profile.items()):
+            await db.users.update_one({"id": user_id}, {"$set": profile})
+            await refresh_instructor_copies(await db.instructors.distinct("id", {"user_id": user_id}))
+            response_cache.invalidate("users", "instructors", "lessons")
     else:
         user_id = str(uuid.uuid4())
         role = "client"
@@ -579,33 +2172,32 @@ async def process_session(request: Request, response: Response, data: SessionReq
             role=role
         )
         user_doc = new_user.model_dump()
-        user_doc["created_at"] = user_doc["created_at"].isoformat()
         await db.users.insert_one(user_doc)
     
-    # Create session
-    session_token = user_data.get("session_token", str(uuid.uuid4()))
-    expires_at = datetime.now(timezone.utc) + timedelta(days=7)
-    
-    session = UserSession(
-        user_id=user_id,
-        session_token=session_token,
-        expires_at=expires_at
-    )
-    session_doc = session.model_dump()
-    session_doc["created_at"] = session_doc["created_at"].isoformat()
-    session_doc["expires_at"] = session_doc["expires_at"].isoformat()
-    await db.user_sessions.insert_one(session_doc)
+    if SESSION_MODE == "signed":
+        # Self-contained token: nothing to store, verified in-process on every request
+        session_token = sign_session(User(id=user_id, email=user_data["email"], name=user_data["name"],
+                                          picture=user_data.get("picture"), role=role))
+    else:
+        # Create session
+        session_token = user_data.get("session_token", str(uuid.uuid4()))
+        expires_at = datetime.now(timezone.utc) + timedelta(days=SESSION_TTL_DAYS)
+    
+        session = UserSession(
+            user_id=user_id,
+            session_token=session_token,
+            expires_at=expires_at
+        )
+        # Native datetimes so the TTL index can expire the session; a replayed token refreshes it
+        session_doc = session.model_dump()
+        await db.user_sessions.update_one(
+            {"session_token": session_token},
+            {"$set": {k: v for k, v in session_doc.items() if k != "id"}, "$setOnInsert": {"id": session_doc["id"]}},
+            upsert=True
+        )
+        await trim_user_sessions(user_id)
     
-    # Set cookie
-    response.set_cookie(
-        key="session_token",
-        value=session_token,
-        httponly=True,
-        secure=True,
-        samesite="none",
-        path="/",
-        max_age=7*24*60*60
-    )
+    set_session_cookie(response, session_token)
     
     return {
         "id": user_id,
@@ -641,9 +2233,14 @@ async def get_me(request: Request):
 @api_router.post("/auth/logout")
 async def logout(request: Request, response: Response):
     """Logout user"""
-    session_token = request.cookies.get("session_token")
+    session_token = session_token_from_request(request)
     if session_token:
-        await db.user_sessions.delete_one({"session_token": session_token})
+        claims = verify_session(session_token) if SESSION_MODE == "signed" and "." in session_token else None
+        if claims:
+            await revocations.revoke_session(claims)
+        else:
+            await db.user_sessions.delete_one({"session_token": session_token})
+            session_owners.forget(session_token)
     
     response.delete_cookie(key="session_token", path="/")
     return {"message": "Déconnecté"}
@@ -651,22 +2248,123 @@ async def logout(request: Request, response: Response):
 # ============== STATIONS ROUTES ==============
 
 @api_router.get("/stations")
-async def list_stations():
-    """List all ski stations"""
-    return SKI_STATIONS
+async def list_stations(
+    near: Optional[str] = Query(None, description="lat,lon"),
+    radius_km: float = Query(50, gt=0, le=500)
+):
+    """List all ski stations, or those around a point sorted by distance"""
+    if near is None:
+        return Response(content=SKI_STATIONS_JSON, media_type="application/json")
+    stations = await find_near(db.stations, near, radius_km, {})
+    for station in stations:
+        station.pop("location", None)
+    return FastJSONResponse(stations)
+
+@api_router.get("/stations/{station_id}/availability")
+@cached_response("station_availability", lambda **_: ["lessons"])
+async def get_station_availability(
+    station_id: str,
+    from_: Optional[str] = Query(None, alias="from", description="AAAA-MM-JJ, aujourd'hui par défaut"),
+    to: Optional[str] = Query(None, description="AAAA-MM-JJ, 30 jours après from par défaut")
+):
+    """Open lessons and seats left per day and lesson type at a station"""
+    if not find_station(station_id):
+        raise HTTPException(status_code=404, detail="Station non trouvée")
+    try:
+        start = datetime.strptime(from_, "%Y-%m-%d").date() if from_ else datetime.now(timezone.utc).date()
+        end = datetime.strptime(to, "%Y-%m-%d").date() if to else start + timedelta(days=30)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Date invalide (format AAAA-MM-JJ)")
+    if end < start or (end - start).days >= AVAILABILITY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Période invalide (au plus {AVAILABILITY_MAX_DAYS} jours)")
+
+    rows = await db.station_availability.find(
+        {"station_id": station_id, "date": {"$gte": start.isoformat(), "$lte": end.isoformat()}},
+        {"_id": 0, "date": 1, "open_lessons": 1, "seats_left": 1, "by_type": 1}
+    ).to_list(None)
+    by_date = {row["date"]: row for row in rows}
+    days = []
+    for offset in range((end - start).days + 1):
+        day = (start + timedelta(days=offset)).isoformat()
+        days.append(by_date.get(day) or {"date": day, "open_lessons": 0, "seats_left": 0, "by_type": {}})
+    return FastJSONResponse({"station_id": station_id, "from": start.isoformat(), "to": end.isoformat(), "days": days})
 
 @api_router.get("/stations/{station_id}")
 async def get_station(station_id: str):
     """Get station details"""
-    station = next((s for s in SKI_STATIONS if s["id"] == station_id), None)
+    station = find_station(station_id)
     if not station:
         raise HTTPException(status_code=404, detail="Station non trouvée")
     return station
 
-# ============== INSTRUCTOR ROUTES ==============
+# ============== FACETS ROUTES ==============
 
-@api_router.get("/instructors")
-async def list_instructors(
+# Counts are invalidated by writes like the lists; the short TTL bounds drift from writes made elsewhere
+FACETS_CACHE_TTL = int(os.environ.get('FACETS_CACHE_TTL', '30'))
+LESSON_PRICE_BUCKETS = [0, 50, 100, 150, 200, 300, 500]
+INSTRUCTOR_RATE_BUCKETS = [0, 40, 60, 80, 100, 150]
+
+async def facet_counts(collection, match: dict, facets: Dict[str, tuple], price_field: str, boundaries: List[float]) -> dict:
+    """Total, counts per value of each facet and a price histogram in one $facet aggregation.
+
+    `facets` maps a facet name to (document field, is_array).
+    """
+    stages = {
+        name: ([{"$unwind": f"${field}"}] if is_array else []) + [
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+        ]
+        for name, (field, is_array) in facets.items()
+    }
+    stages["price"] = [{"$bucket": {
+        "groupBy": f"${price_field}",
+        "boundaries": boundaries,
+        "default": boundaries[-1],  # everything above the last boundary (or without a price)
+        "output": {"count": {"$sum": 1}},
+    }}]
+    stages["total"] = [{"$count": "count"}]
+
+    result = (await collection.aggregate([{"$match": match}, {"$facet": stages}]).to_list(None))[0]
+    counts = {row["_id"]: row["count"] for row in result["price"]}
+    edges = boundaries + [None]
+    return {
+        "total": result["total"][0]["count"] if result["total"] else 0,
+        "facets": {
+            name: [{"value": row["_id"], "count": row["count"]} for row in result[name] if row["_id"] is not None]
+            for name in facets
+        },
+        "price": [{"min": low, "max": high, "count": counts.get(low, 0)} for low, high in zip(edges, edges[1:])],
+    }
+
+@api_router.get("/lessons/facets")
+@cached_response("lesson_facets", lambda **_: ["lessons", "instructors"], ttl=FACETS_CACHE_TTL)
+async def lesson_facets(
+    instructor_id: Optional[str] = None,
+    date: Optional[str] = None,
+    lesson_type: Optional[str] = None,
+    station_id: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    level: Optional[str] = None,
+    specialty: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    start_after: Optional[str] = None,
+    start_before: Optional[str] = None
+):
+    """Counts per station, lesson type, level and specialty plus a price histogram for the lesson filters"""
+    query = lesson_query(instructor_id, date, lesson_type, min_price, max_price, station_id, level, specialty,
+                         date_from, date_to, start_after, start_before)
+    return FastJSONResponse(await facet_counts(db.lessons, query, {
+        "station_id": ("search.station_id", False),
+        "lesson_type": ("lesson_type", False),
+        "level": ("search.ski_levels", True),
+        "specialty": ("search.specialties", True),
+    }, "price", LESSON_PRICE_BUCKETS))
+
+@api_router.get("/instructors/facets")
+@cached_response("instructor_facets", lambda **_: ["instructors"], ttl=FACETS_CACHE_TTL)
+async def instructor_facets(
     status: Optional[str] = None,
     station_id: Optional[str] = None,
     specialty: Optional[str] = None,
@@ -674,7 +2372,20 @@ async def list_instructors(
     min_price: Optional[float] = None,
     max_price: Optional[float] = None
 ):
-    """List instructors with filters"""
+    """Counts per station, level and specialty plus an hourly rate histogram for the instructor filters"""
+    query = instructor_query(status, station_id, specialty, level, min_price, max_price)
+    return FastJSONResponse(await facet_counts(db.instructors, query, {
+        "station_id": ("station_id", False),
+        "level": ("ski_levels", True),
+        "specialty": ("specialties", True),
+    }, "hourly_rate", INSTRUCTOR_RATE_BUCKETS))
+
+# ============== INSTRUCTOR ROUTES ==============
+
+def instructor_query(status: Optional[str] = None, station_id: Optional[str] = None, specialty: Optional[str] = None,
+                     level: Optional[str] = None, min_price: Optional[float] = None,
+                     max_price: Optional[float] = None) -> dict:
+    """Mongo filter for the instructor list filters"""
     query = {"status": "approved"} if status is None else {"status": status}
     
     if station_id:
@@ -690,23 +2401,37 @@ async def list_instructors(
             query["hourly_rate"]["$lte"] = max_price
         else:
             query["hourly_rate"] = {"$lte": max_price}
-    
-    instructors = await db.instructors.find(query, {"_id": 0}).to_list(100)
+    return query
+
+@api_router.get("/instructors")
+@cached_response("list_instructors", lambda **_: ["instructors", "users"])
+async def list_instructors(
+    status: Optional[str] = None,
+    station_id: Optional[str] = None,
+    specialty: Optional[str] = None,
+    level: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    near: Optional[str] = Query(None, description="lat,lon"),
+    radius_km: float = Query(50, gt=0, le=500)
+):
+    """List instructors with filters, by hourly rate (closest first when `near` is given)"""
+    if not near and status in (None, "approved"):
+        instructors = instructor_directory.select(station_id, specialty, level, min_price, max_price)
+        if instructors is not None:
+            return FastJSONResponse(instructors)
+    
+    query = instructor_query(status, station_id, specialty, level, min_price, max_price)
+    if near:
+        instructors = await find_near(db.instructors, near, radius_km, query)
+    else:
+        instructors = await db.instructors.find(query, PUBLIC_PROJECTION).sort([("hourly_rate", 1), ("id", 1)]).to_list(100)
     
     # Enrich with user data and station
-    for instructor in instructors:
-        user = await db.users.find_one({"id": instructor["user_id"]}, {"_id": 0})
-        if user:
-            instructor["user"] = user
-        # Add station info
-        if instructor.get("station_id"):
-            station = next((s for s in SKI_STATIONS if s["id"] == instructor["station_id"]), None)
-            instructor["station"] = station
-    
-    return instructors
+    return FastJSONResponse(await attach_instructor_details(instructors))
 
 @api_router.post("/instructors")
-async def create_instructor(data: InstructorCreate, request: Request):
+async def create_instructor(data: InstructorCreate, request: Request, response: Response):
     """Register as instructor (requires auth)"""
     user = await require_auth(request)
     
@@ -726,32 +2451,28 @@ async def create_instructor(data: InstructorCreate, request: Request):
     )
     
     instructor_doc = instructor.model_dump()
-    instructor_doc["created_at"] = instructor_doc["created_at"].isoformat()
+    instructor_doc.update(instructor_copies(instructor_doc, user.model_dump()))
     await db.instructors.insert_one(instructor_doc)
     
     # Update user role
     await db.users.update_one({"id": user.id}, {"$set": {"role": "instructor"}})
+    response_cache.invalidate("instructors", "users")
+    await reissue_session(response, user.model_copy(update={"role": "instructor"}))
     
     # Return without _id
     instructor_doc.pop("_id", None)
-    return instructor_doc
+    return without_copies(instructor_doc)
 
 @api_router.get("/instructors/{instructor_id}")
+@cached_response("get_instructor", lambda instructor_id: [f"instructor:{instructor_id}", "users"])
 async def get_instructor(instructor_id: str):
     """Get instructor details"""
-    instructor = await db.instructors.find_one({"id": instructor_id}, {"_id": 0})
+    instructor = await get_loaders().instructors.load(instructor_id)
     if not instructor:
         raise HTTPException(status_code=404, detail="Moniteur non trouvé")
     
-    user = await db.users.find_one({"id": instructor["user_id"]}, {"_id": 0})
-    instructor["user"] = user
-    
-    # Add station info
-    if instructor.get("station_id"):
-        station = next((s for s in SKI_STATIONS if s["id"] == instructor["station_id"]), None)
-        instructor["station"] = station
-    
-    return instructor
+    await attach_instructor_details([instructor])
+    return FastJSONResponse(instructor)
 
 @api_router.put("/instructors/{instructor_id}")
 async def update_instructor(instructor_id: str, data: InstructorCreate, request: Request):
@@ -775,6 +2496,13 @@ async def update_instructor(instructor_id: str, data: InstructorCreate, request:
             "station_id": data.station_id
         }}
     )
+    # Station, location and levels are copied onto the instructor's lessons
+    await refresh_instructor_copies([instructor_id])
+    if data.station_id != instructor.get("station_id"):
+        dates = await db.lessons.distinct("date", {"instructor_id": instructor_id})
+        await refresh_availability(instructor.get("station_id"), dates)
+        await refresh_availability(data.station_id, dates)
+    response_cache.invalidate("instructors", f"instructor:{instructor_id}", "lessons")
     
     return {"message": "Profil mis à jour"}
 
@@ -793,27 +2521,64 @@ async def update_instructor_status(instructor_id: str, data: InstructorStatusUpd
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Moniteur non trouvé")
+    response_cache.invalidate("instructors", f"instructor:{instructor_id}")
     
     return {"message": f"Moniteur {data.status}"}
 
 # ============== LESSON ROUTES ==============
 
-@api_router.get("/lessons")
-async def list_lessons(
-    instructor_id: Optional[str] = None,
-    date: Optional[str] = None,
-    lesson_type: Optional[str] = None,
-    station_id: Optional[str] = None,
-    min_price: Optional[float] = None,
-    max_price: Optional[float] = None,
-    level: Optional[str] = None
-):
-    """List available lessons with filters"""
+def normalized(value: Optional[str], fmt: str, detail: str) -> Optional[str]:
+    """Zero-padded date or time parameter, so it compares like the stored strings"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, fmt).strftime(fmt)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=detail)
+
+def normalized_date(value: Optional[str]) -> Optional[str]:
+    return normalized(value, "%Y-%m-%d", "Date invalide (format AAAA-MM-JJ)")
+
+def normalized_time(value: Optional[str]) -> Optional[str]:
+    return normalized(value, "%H:%M", "Heure invalide (format HH:MM)")
+
+def lesson_query(instructor_id: Optional[str] = None, date: Optional[str] = None, lesson_type: Optional[str] = None,
+                 min_price: Optional[float] = None, max_price: Optional[float] = None,
+                 station_id: Optional[str] = None, level: Optional[str] = None, specialty: Optional[str] = None,
+                 date_from: Optional[str] = None, date_to: Optional[str] = None,
+                 start_after: Optional[str] = None, start_before: Optional[str] = None,
+                 min_seats: Optional[int] = None) -> dict:
+    """Mongo filter for the lesson list filters (instructor fields through the copies in "search")"""
     query = {"status": "available"}
     if instructor_id:
         query["instructor_id"] = instructor_id
     if date:
         query["date"] = date
+    date_from, date_to = normalized_date(date_from), normalized_date(date_to)
+    if date_from or date_to:
+        # YYYY-MM-DD strings sort chronologically
+        query.setdefault("date", {})
+        if isinstance(query["date"], str):
+            query["date"] = {"$eq": query["date"]}
+        if date_from:
+            query["date"]["$gte"] = date_from
+        if date_to:
+            query["date"]["$lte"] = date_to
+    start_after, start_before = normalized_time(start_after), normalized_time(start_before)
+    if start_after or start_before:
+        query["start_time"] = {}
+        if start_after:
+            query["start_time"]["$gte"] = start_after
+        if start_before:
+            query["start_time"]["$lt"] = start_before
+    if station_id:
+        query["search.station_id"] = station_id
+    if level:
+        query["search.ski_levels"] = level
+    if specialty:
+        query["search.specialties"] = specialty
+    if min_seats is not None:
+        query["$expr"] = {"$gte": [{"$subtract": ["$max_participants", "$current_participants"]}, min_seats]}
     if lesson_type:
         query["lesson_type"] = lesson_type
     if min_price is not None:
@@ -823,36 +2588,76 @@ async def list_lessons(
             query["price"]["$lte"] = max_price
         else:
             query["price"] = {"$lte": max_price}
-    
-    lessons = await db.lessons.find(query, {"_id": 0}).to_list(100)
-    
-    # Filter by station or level (need to check instructor)
+    return query
+
+LESSON_SORT = [("date", 1), ("start_time", 1), ("id", 1)]
+LESSON_PAGE_SIZE = 100
+
+@api_router.get("/lessons")
+@cached_response("list_lessons", lambda **_: ["lessons", "instructors", "users"])
+async def list_lessons(
+    instructor_id: Optional[str] = None,
+    date: Optional[str] = None,
+    lesson_type: Optional[str] = None,
+    station_id: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    level: Optional[str] = None,
+    date_from: Optional[str] = Query(None, description="AAAA-MM-JJ, inclus"),
+    date_to: Optional[str] = Query(None, description="AAAA-MM-JJ, inclus"),
+    start_after: Optional[str] = Query(None, description="HH:MM, début à partir de cette heure"),
+    start_before: Optional[str] = Query(None, description="HH:MM, début avant cette heure"),
+    min_seats: Optional[int] = Query(None, ge=1, description="Places restantes minimum"),
+    near: Optional[str] = Query(None, description="lat,lon"),
+    radius_km: float = Query(50, gt=0, le=500)
+):
+    """List available lessons with filters, by date and start time (closest first when `near` is given)"""
+    # Normalized once, so the engine evaluates exactly the values the Mongo filter uses
+    date_from, date_to = normalized_date(date_from), normalized_date(date_to)
+    start_after, start_before = normalized_time(start_after), normalized_time(start_before)
+    query = lesson_query(instructor_id, date, lesson_type, min_price, max_price, station_id, level,
+                         date_from=date_from, date_to=date_to, start_after=start_after, start_before=start_before,
+                         min_seats=min_seats)
+    # Twice the page: rows the Mongo read-back drops still leave a full page
+    lesson_ids = None if near else lesson_engine.select(
+        instructor_id, date, lesson_type, station_id, min_price, max_price, level,
+        date_from, date_to, start_after, start_before, min_seats, limit=2 * LESSON_PAGE_SIZE
+    )
+    lessons = None
+    if near:
+        lessons = await find_near(db.lessons, near, radius_km, query)
+    elif lesson_ids is not None:
+        # Only the ids picked by the engine are read from Mongo, which re-checks the filters: a lesson
+        # booked or cancelled on another worker before its change event arrived is dropped, not listed
+        found = {l["id"]: l for l in await db.lessons.find({**query, "id": {"$in": lesson_ids}}, PUBLIC_PROJECTION).to_list(None)}
+        lessons = [found[lesson_id] for lesson_id in lesson_ids if lesson_id in found][:LESSON_PAGE_SIZE]
+        if len(lessons) < LESSON_PAGE_SIZE and len(lesson_ids) == 2 * LESSON_PAGE_SIZE:
+            lessons = None  # more matches may lie beyond what the engine returned
+    if lessons is None:
+        # Served in order by the (status, date, start_time) index
+        lessons = await db.lessons.find(query, PUBLIC_PROJECTION).sort(LESSON_SORT).to_list(LESSON_PAGE_SIZE)
+    
+    instructors = await get_loaders().instructors.load_many([l["instructor_id"] for l in lessons])
     filtered_lessons = []
-    for lesson in lessons:
-        instructor = await db.instructors.find_one({"id": lesson["instructor_id"]}, {"_id": 0})
+    for lesson, instructor in zip(lessons, instructors):
         if instructor:
-            # Filter by station
-            if station_id and instructor.get("station_id") != station_id:
-                continue
-            # Filter by level
-            if level and level not in instructor.get("ski_levels", []):
-                continue
-            
-            user = await db.users.find_one({"id": instructor["user_id"]}, {"_id": 0})
-            instructor["user"] = user
-            if instructor.get("station_id"):
-                station = next((s for s in SKI_STATIONS if s["id"] == instructor["station_id"]), None)
-                instructor["station"] = station
             lesson["instructor"] = instructor
             filtered_lessons.append(lesson)
     
-    return filtered_lessons
+    await attach_instructor_details([l["instructor"] for l in filtered_lessons])
+    return FastJSONResponse(filtered_lessons)
 
 @api_router.post("/lessons")
 async def create_lesson(data: LessonCreate, request: Request):
     """Instructor: Create a lesson (with optional recurrence)"""
     user = await require_instructor(request)
     
+    # Stored zero-padded: the list filters and the lesson engine compare them as strings
+    data.date, data.recurrence_end_date = normalized_date(data.date), normalized_date(data.recurrence_end_date)
+    data.start_time, data.end_time = normalized_time(data.start_time), normalized_time(data.end_time)
+    if not (data.date and data.start_time and data.end_time):
+        raise HTTPException(status_code=400, detail="Date, heure de début et heure de fin requises")
+    
     instructor = await db.instructors.find_one({"user_id": user.id})
     if not instructor:
         raise HTTPException(status_code=400, detail="Profil moniteur non trouvé")
@@ -878,8 +2683,10 @@ async def create_lesson(data: LessonCreate, request: Request):
         recurrence_end_date=data.recurrence_end_date
     )
     
+    copies = lesson_copies(instructor, user.model_dump())
     lesson_doc = lesson.model_dump()
-    lesson_doc["created_at"] = lesson_doc["created_at"].isoformat()
+    lesson_doc["starts_at"] = lesson_starts_at(lesson.date, lesson.start_time)
+    lesson_doc.update(copies)
     await db.lessons.insert_one(lesson_doc)
     lesson_doc.pop("_id", None)
     created_lessons.append(lesson_doc)
@@ -910,32 +2717,36 @@ async def create_lesson(data: LessonCreate, request: Request):
             )
             
             recurring_doc = recurring_lesson.model_dump()
-            recurring_doc["created_at"] = recurring_doc["created_at"].isoformat()
+            recurring_doc["starts_at"] = lesson_starts_at(recurring_lesson.date, recurring_lesson.start_time)
+            recurring_doc.update(copies)
             await db.lessons.insert_one(recurring_doc)
             recurring_doc.pop("_id", None)
             created_lessons.append(recurring_doc)
             
             current_date += delta
     
+    await update_availability([], created_lessons)
+    response_cache.invalidate("lessons", *[f"lesson:{l['id']}" for l in created_lessons])
+    for created in created_lessons:
+        without_copies(created)
     return created_lessons[0] if len(created_lessons) == 1 else {"lessons_created": len(created_lessons), "first_lesson": created_lessons[0]}
 
 @api_router.get("/lessons/{lesson_id}")
+@cached_response("get_lesson", lambda lesson_id: [f"lesson:{lesson_id}", "instructors", "users"])
 async def get_lesson(lesson_id: str):
     """Get lesson details"""
-    lesson = await db.lessons.find_one({"id": lesson_id}, {"_id": 0})
+    loaders = get_loaders()
+    lesson = await loaders.lessons.load(lesson_id)
     if not lesson:
         raise HTTPException(status_code=404, detail="Cours non trouvé")
+    without_copies(lesson)
     
-    instructor = await db.instructors.find_one({"id": lesson["instructor_id"]}, {"_id": 0})
+    instructor = await loaders.instructors.load(lesson["instructor_id"])
     if instructor:
-        user = await db.users.find_one({"id": instructor["user_id"]}, {"_id": 0})
-        instructor["user"] = user
-        if instructor.get("station_id"):
-            station = next((s for s in SKI_STATIONS if s["id"] == instructor["station_id"]), None)
-            instructor["station"] = station
+        await attach_instructor_details([instructor])
         lesson["instructor"] = instructor
     
-    return lesson
+    return FastJSONResponse(lesson)
 
 @api_router.delete("/lessons/{lesson_id}")
 async def delete_lesson(lesson_id: str, request: Request):
@@ -951,6 +2762,8 @@ async def delete_lesson(lesson_id: str, request: Request):
         raise HTTPException(status_code=403, detail="Non autorisé")
     
     await db.lessons.update_one({"id": lesson_id}, {"$set": {"status": "cancelled"}})
+    await update_availability([lesson], [{**lesson, "status": "cancelled"}])
+    response_cache.invalidate("lessons", f"lesson:{lesson_id}")
     return {"message": "Cours annulé"}
 
 @api_router.get("/my-lessons")
@@ -962,17 +2775,79 @@ async def get_my_lessons(request: Request):
     if not instructor:
         raise HTTPException(status_code=400, detail="Profil moniteur non trouvé")
     
-    lessons = await db.lessons.find({"instructor_id": instructor["id"]}, {"_id": 0}).to_list(100)
+    lessons = await db.lessons.find({"instructor_id": instructor["id"]}, PUBLIC_PROJECTION).to_list(100)
     
     # Add booking info
+    bookings = await db.bookings.find(
+        {"lesson_id": {"$in": [l["id"] for l in lessons]}, "status": {"$ne": "cancelled"}},
+        {"_id": 0}
+    ).to_list(None)
+    users = await get_loaders().users.load_many([b["user_id"] for b in bookings])
+    bookings_by_lesson = {}
+    for booking, user_data in zip(bookings, users):
+        booking["user"] = user_data
+        bookings_by_lesson.setdefault(booking["lesson_id"], []).append(booking)
     for lesson in lessons:
-        bookings = await db.bookings.find({"lesson_id": lesson["id"], "status": {"$ne": "cancelled"}}, {"_id": 0}).to_list(100)
-        for booking in bookings:
-            user_data = await db.users.find_one({"id": booking["user_id"]}, {"_id": 0})
-            booking["user"] = user_data
-        lesson["bookings"] = bookings
+        lesson["bookings"] = bookings_by_lesson.get(lesson["id"], [])[:100]
     
-    return lessons
+    return FastJSONResponse(lessons)
+
+# ============== SEARCH ROUTES ==============
+
+SEARCH_PROJECTION = {**PUBLIC_PROJECTION, "score": {"$meta": "textScore"}}
+SEARCH_SORT = [("score", {"$meta": "textScore"}), ("id", 1)]
+
+async def text_search(collection, query: dict, page: int, page_size: int) -> tuple:
+    """(total, page of documents ranked by relevance) for a $text query"""
+    total, docs = await asyncio.gather(
+        collection.count_documents(query),
+        collection.find(query, SEARCH_PROJECTION).sort(SEARCH_SORT).skip((page - 1) * page_size).limit(page_size).to_list(None),
+    )
+    return total, docs
+
+@api_router.get("/search")
+@cached_response("search", lambda **_: ["lessons", "instructors", "users"])
+async def search(
+    q: str = Query(..., min_length=2, max_length=100, description="Mots recherchés"),
+    kind: str = Query("all", pattern="^(all|instructors|lessons)$"),
+    station_id: Optional[str] = None,
+    specialty: Optional[str] = None,
+    level: Optional[str] = None,
+    lesson_type: Optional[str] = None,
+    date: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=50)
+):
+    """Full-text search over approved instructors and available lessons, ranked by relevance"""
+    text = {"$text": {"$search": q}}
+    result = {"query": q, "page": page, "page_size": page_size}
+    searches = {}
+
+    if kind in ("all", "instructors"):
+        query = {**instructor_query(None, station_id, specialty, level, min_price, max_price), **text}
+        searches["instructors"] = text_search(db.instructors, query, page, page_size)
+    if kind in ("all", "lessons"):
+        # Price bounds apply to hourly rates for instructors and to lesson prices here
+        query = {**lesson_query(None, date, lesson_type, min_price, max_price, station_id, level, specialty), **text}
+        searches["lessons"] = text_search(db.lessons, query, page, page_size)
+
+    found = dict(zip(searches, await asyncio.gather(*searches.values())))
+
+    if "instructors" in found:
+        total, instructors = found["instructors"]
+        await attach_instructor_details(instructors)
+        result["instructors"] = {"total": total, "results": instructors}
+    if "lessons" in found:
+        total, lessons = found["lessons"]
+        instructors = await get_loaders().instructors.load_many([l["instructor_id"] for l in lessons])
+        for lesson, instructor in zip(lessons, instructors):
+            lesson["instructor"] = instructor
+        await attach_instructor_details([i for i in instructors if i])
+        result["lessons"] = {"total": total, "results": lessons}
+
+    return FastJSONResponse(result)
 
 # ============== BOOKING ROUTES ==============
 
@@ -1007,7 +2882,6 @@ async def create_booking(data: BookingCreate, request: Request):
     )
     
     booking_doc = booking.model_dump()
-    booking_doc["created_at"] = booking_doc["created_at"].isoformat()
     await db.bookings.insert_one(booking_doc)
     
     # Update lesson participants
@@ -1016,6 +2890,8 @@ async def create_booking(data: BookingCreate, request: Request):
     if new_count >= lesson["max_participants"]:
         update_data["status"] = "full"
     await db.lessons.update_one({"id": data.lesson_id}, {"$set": update_data})
+    await update_availability([lesson], [{**lesson, **update_data}])
+    response_cache.invalidate("lessons", f"lesson:{data.lesson_id}")
     
     # Send email notifications
     instructor = await db.instructors.find_one({"id": lesson["instructor_id"]})
@@ -1053,20 +2929,17 @@ async def list_bookings(request: Request):
     
     bookings = await db.bookings.find({"user_id": user.id}, {"_id": 0}).to_list(100)
     
-    for booking in bookings:
-        lesson = await db.lessons.find_one({"id": booking["lesson_id"]}, {"_id": 0})
+    loaders = get_loaders()
+    lessons = await loaders.lessons.load_many([b["lesson_id"] for b in bookings])
+    instructors = await loaders.instructors.load_many([l["instructor_id"] if l else None for l in lessons])
+    await attach_instructor_details([i for i in instructors if i])
+    for booking, lesson, instructor in zip(bookings, lessons, instructors):
         if lesson:
-            instructor = await db.instructors.find_one({"id": lesson["instructor_id"]}, {"_id": 0})
             if instructor:
-                user_data = await db.users.find_one({"id": instructor["user_id"]}, {"_id": 0})
-                instructor["user"] = user_data
-                if instructor.get("station_id"):
-                    station = next((s for s in SKI_STATIONS if s["id"] == instructor["station_id"]), None)
-                    instructor["station"] = station
                 lesson["instructor"] = instructor
             booking["lesson"] = lesson
     
-    return bookings
+    return FastJSONResponse(bookings)
 
 @api_router.delete("/bookings/{booking_id}")
 async def cancel_booking(booking_id: str, request: Request):
@@ -1086,10 +2959,10 @@ async def cancel_booking(booking_id: str, request: Request):
     lesson = await db.lessons.find_one({"id": booking["lesson_id"]})
     if lesson:
         new_count = max(0, lesson["current_participants"] - booking["participants"])
-        await db.lessons.update_one(
-            {"id": booking["lesson_id"]},
-            {"$set": {"current_participants": new_count, "status": "available"}}
-        )
+        update_data = {"current_participants": new_count, "status": "available"}
+        await db.lessons.update_one({"id": booking["lesson_id"]}, {"$set": update_data})
+        await update_availability([lesson], [{**lesson, **update_data}])
+        response_cache.invalidate("lessons", f"lesson:{booking['lesson_id']}")
     
     return {"message": "Réservation annulée"}
 
@@ -1118,13 +2991,12 @@ async def create_checkout(data: PaymentRequest, request: Request):
     commission = round(total_amount * PLATFORM_COMMISSION, 2)
     instructor_amount = round(total_amount - commission, 2)
     
-    host_url = str(request.base_url).rstrip('/')
-    webhook_url = f"{host_url}/api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=stripe_api_key, webhook_url=webhook_url)
+    stripe_checkout = stripe_checkout_client(request)
     
     success_url = f"{data.origin_url}/payment-success?session_id={{CHECKOUT_SESSION_ID}}"
     cancel_url = f"{data.origin_url}/bookings"
     
+    from emergentintegrations.payments.stripe.checkout import CheckoutSessionRequest
     checkout_request = CheckoutSessionRequest(
         amount=total_amount,
         currency="eur",
@@ -1156,7 +3028,6 @@ async def create_checkout(data: PaymentRequest, request: Request):
     )
     
     transaction_doc = transaction.model_dump()
-    transaction_doc["created_at"] = transaction_doc["created_at"].isoformat()
     await db.payment_transactions.insert_one(transaction_doc)
     
     # Update booking with session id
@@ -1176,9 +3047,7 @@ async def create_checkout(data: PaymentRequest, request: Request):
 @api_router.get("/payments/status/{session_id}")
 async def get_payment_status(session_id: str, request: Request):
     """Check payment status"""
-    host_url = str(request.base_url).rstrip('/')
-    webhook_url = f"{host_url}/api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=stripe_api_key, webhook_url=webhook_url)
+    stripe_checkout = stripe_checkout_client(request)
     
     status = await stripe_checkout.get_checkout_status(session_id)
     
@@ -1226,9 +3095,7 @@ async def stripe_webhook(request: Request):
     body = await request.body()
     signature = request.headers.get("Stripe-Signature")
     
-    host_url = str(request.base_url).rstrip('/')
-    webhook_url = f"{host_url}/api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=stripe_api_key, webhook_url=webhook_url)
+    stripe_checkout = stripe_checkout_client(request)
     
     try:
         webhook_response = await stripe_checkout.handle_webhook(body, signature)
@@ -1258,30 +3125,24 @@ async def get_pending_instructors(request: Request):
     """Admin: Get pending instructor applications"""
     await require_admin(request)
     
-    instructors = await db.instructors.find({"status": "pending"}, {"_id": 0}).to_list(100)
-    
-    for instructor in instructors:
-        user = await db.users.find_one({"id": instructor["user_id"]}, {"_id": 0})
-        instructor["user"] = user
-        if instructor.get("station_id"):
-            station = next((s for s in SKI_STATIONS if s["id"] == instructor["station_id"]), None)
-            instructor["station"] = station
+    instructors = await db.instructors.find({"status": "pending"}, PUBLIC_PROJECTION).to_list(100)
     
-    return instructors
+    return FastJSONResponse(await attach_instructor_details(instructors))
 
 @api_router.get("/admin/stats")
 async def get_admin_stats(request: Request):
     """Admin: Get platform statistics including commission"""
     await require_admin(request)
+    reads = read_db("GET /api/admin/stats")
     
-    total_users = await db.users.count_documents({})
-    total_instructors = await db.instructors.count_documents({"status": "approved"})
-    pending_instructors = await db.instructors.count_documents({"status": "pending"})
-    total_lessons = await db.lessons.count_documents({"status": "available"})
-    total_bookings = await db.bookings.count_documents({"status": {"$ne": "cancelled"}})
+    total_users = await reads.users.count_documents({})
+    total_instructors = await reads.instructors.count_documents({"status": "approved"})
+    pending_instructors = await reads.instructors.count_documents({"status": "pending"})
+    total_lessons = await reads.lessons.count_documents({"status": "available"})
+    total_bookings = await reads.bookings.count_documents({"status": {"$ne": "cancelled"}})
     
     # Calculate revenue stats
-    paid_transactions = await db.payment_transactions.find({"status": "paid"}, {"_id": 0}).to_list(1000)
+    paid_transactions = await reads.payment_transactions.find({"status": "paid"}, {"_id": 0}).to_list(1000)
     total_revenue = sum(t.get("amount", 0) for t in paid_transactions)
     total_commission = sum(t.get("commission", 0) for t in paid_transactions)
     
@@ -1296,24 +3157,37 @@ async def get_admin_stats(request: Request):
         "commission_rate": f"{int(PLATFORM_COMMISSION * 100)}%"
     }
 
+@api_router.get("/admin/cache-stats")
+async def get_cache_stats(request: Request):
+    """Admin: Response cache size, per-endpoint hit rates and state of the invalidation bus and in-memory indexes"""
+    await require_admin(request)
+    return {**response_cache.snapshot(), "invalidation_bus": invalidation_bus.snapshot(),
+            "instructor_directory": instructor_directory.snapshot(), "lesson_engine": lesson_engine.snapshot()}
+
 @api_router.get("/admin/transactions")
 async def get_transactions(request: Request):
     """Admin: Get all payment transactions"""
     await require_admin(request)
+    reads = read_db("GET /api/admin/transactions")
     
-    transactions = await db.payment_transactions.find({}, {"_id": 0}).sort("created_at", -1).to_list(100)
+    transactions = await reads.payment_transactions.find({}, {"_id": 0}).sort("created_at", -1).to_list(100)
     
-    for tx in transactions:
+    loaders = Loaders(reads)
+    users = await loaders.users.load_many([tx.get("user_id") for tx in transactions])
+    bookings = await reads.bookings.find(
+        {"id": {"$in": [tx["booking_id"] for tx in transactions if tx.get("booking_id")]}},
+        {"_id": 0, "id": 1, "lesson_id": 1}
+    ).to_list(None)
+    booking_lessons = {b["id"]: b["lesson_id"] for b in bookings}
+    lessons = await loaders.lessons.load_many([booking_lessons.get(tx.get("booking_id")) for tx in transactions])
+    
+    for tx, user, lesson in zip(transactions, users, lessons):
         if tx.get("user_id"):
-            user = await db.users.find_one({"id": tx["user_id"]}, {"_id": 0})
             tx["user"] = user
-        if tx.get("booking_id"):
-            booking = await db.bookings.find_one({"id": tx["booking_id"]}, {"_id": 0})
-            if booking:
-                lesson = await db.lessons.find_one({"id": booking["lesson_id"]}, {"_id": 0})
-                tx["lesson"] = lesson
+        if tx.get("booking_id") in booking_lessons:
+            tx["lesson"] = lesson
     
-    return transactions
+    return FastJSONResponse(transactions)
 
 # ============== REMINDER SYSTEM ==============
 
@@ -1322,23 +3196,33 @@ async def send_lesson_reminders(request: Request):
     """Admin: Manually trigger 24h lesson reminders"""
     await require_admin(request)
     
-    tomorrow = (datetime.now(timezone.utc) + timedelta(days=1)).strftime("%Y-%m-%d")
+    tomorrow = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
     
     # Find lessons for tomorrow
-    lessons = await db.lessons.find({"date": tomorrow, "status": {"$ne": "cancelled"}}, {"_id": 0}).to_list(100)
+    lessons = await db.lessons.find(
+        {**lesson_range_query(tomorrow, tomorrow + timedelta(days=1)), "status": {"$ne": "cancelled"}},
+        {"_id": 0}
+    ).to_list(100)
+    
+    loaders = get_loaders()
+    instructors = await loaders.instructors.load_many([l["instructor_id"] for l in lessons])
+    instructor_users = await loaders.users.load_many([i["user_id"] if i else None for i in instructors])
+    
+    # Get bookings for these lessons
+    all_bookings = await db.bookings.find(
+        {"lesson_id": {"$in": [l["id"] for l in lessons]}, "status": {"$ne": "cancelled"}},
+        {"_id": 0}
+    ).to_list(None)
+    clients = await loaders.users.load_many([b["user_id"] for b in all_bookings])
+    bookings_by_lesson = {}
+    for booking, user in zip(all_bookings, clients):
+        bookings_by_lesson.setdefault(booking["lesson_id"], []).append((booking, user))
     
     reminders_sent = 0
-    for lesson in lessons:
-        # Get instructor info
-        instructor = await db.instructors.find_one({"id": lesson["instructor_id"]})
-        instructor_user = await db.users.find_one({"id": instructor["user_id"]}) if instructor else None
-        station = next((s for s in SKI_STATIONS if s["id"] == instructor.get("station_id", "")), None) if instructor else None
-        
-        # Get bookings for this lesson
-        bookings = await db.bookings.find({"lesson_id": lesson["id"], "status": {"$ne": "cancelled"}}).to_list(100)
+    for lesson, instructor, instructor_user in zip(lessons, instructors, instructor_users):
+        station = find_station(instructor.get("station_id", "")) if instructor else None
         
-        for booking in bookings:
-            user = await db.users.find_one({"id": booking["user_id"]})
+        for booking, user in bookings_by_lesson.get(lesson["id"], [])[:100]:
             if user:
                 await email_service.send_lesson_reminder(
                     user_email=user["email"],
@@ -1355,181 +3239,20 @@ async def send_lesson_reminders(request: Request):
 
 @api_router.post("/admin/seed-instructors")
 async def seed_instructors(request: Request):
-    """Admin: Seed database with fictional instructors for demo purposes"""
+    """Admin: Seed (or re-apply) the fictional demo instructors; safe to run on every deploy"""
     await require_admin(request)
 
-    from random import choice, randint
-
-    # Fictional instructors data
-    FICTIONAL_INSTRUCTORS = [
-        {
-            "name": "Pierre Dumont",
-            "email": "pierre.dumont@skimonitor-demo.fr",
-            "bio": "Moniteur diplômé d'État avec 12 ans d'expérience. Passionné par la transmission de ma passion du ski alpin, j'adapte mes cours à tous les niveaux avec patience et pédagogie.",
-            "specialties": ["Ski alpin", "Hors-piste"],
-            "ski_levels": ["Débutant", "Intermédiaire", "Avancé"],
-            "hourly_rate": 65.0,
-            "station": "courchevel"
-        },
-        {
-            "name": "Sophie Martin",
-            "email": "sophie.martin@skimonitor-demo.fr",
-            "bio": "Ancienne membre de l'équipe de France de ski freestyle, je propose des cours de ski et snowboard avec une approche ludique et technique. Spécialiste des figures et du freestyle.",
-            "specialties": ["Snowboard", "Freestyle", "Ski alpin"],
-            "ski_levels": ["Intermédiaire", "Avancé", "Expert"],
-            "hourly_rate": 75.0,
-            "station": "val-thorens"
-        },
-        {
-            "name": "Marc Bertrand",
-            "email": "marc.bertrand@skimonitor-demo.fr",
-            "bio": "Moniteur ESF depuis 8 ans, je me spécialise dans l'enseignement aux enfants et débutants. Patience et bonne humeur garanties pour progresser en toute confiance !",
-            "specialties": ["Ski alpin", "Ski de fond"],
-            "ski_levels": ["Débutant", "Intermédiaire"],
-            "hourly_rate": 55.0,
-            "station": "meribel"
-        },
-        {
-            "name": "Julie Rousseau",
-            "email": "julie.rousseau@skimonitor-demo.fr",
-            "bio": "Guide de haute montagne et monitrice de ski, j'organise des sorties hors-piste exceptionnelles et des cours techniques pour skieurs confirmés. Sécurité et plaisir avant tout !",
-            "specialties": ["Hors-piste", "Ski alpin"],
-            "ski_levels": ["Avancé", "Expert"],
-            "hourly_rate": 85.0,
-            "station": "chamonix"
-        },
-        {
-            "name": "Thomas Leroy",
-            "email": "thomas.leroy@skimonitor-demo.fr",
-            "bio": "Moniteur polyvalent avec 15 ans d'expérience dans différentes stations alpines. J'enseigne le ski et le snowboard à tous les niveaux avec une approche personnalisée.",
-            "specialties": ["Ski alpin", "Snowboard"],
-            "ski_levels": ["Débutant", "Intermédiaire", "Avancé", "Expert"],
-            "hourly_rate": 70.0,
-            "station": "tignes"
-        },
-        {
-            "name": "Emma Dubois",
-            "email": "emma.dubois@skimonitor-demo.fr",
-            "bio": "Spécialiste du ski de fond et des cours pour enfants. Mon objectif : faire découvrir les joies du ski nordique dans un cadre naturel exceptionnel avec patience et enthousiasme.",
-            "specialties": ["Ski de fond", "Ski alpin"],
-            "ski_levels": ["Débutant", "Intermédiaire"],
-            "hourly_rate": 50.0,
-            "station": "les-saisies"
-        },
-        {
-            "name": "Lucas Moreau",
-            "email": "lucas.moreau@skimonitor-demo.fr",
-            "bio": "Champion régional de snowboard, je partage ma passion pour le freestyle et le freeride. Cours dynamiques et techniques pour progresser rapidement tout en s'amusant !",
-            "specialties": ["Snowboard", "Freestyle"],
-            "ski_levels": ["Intermédiaire", "Avancé", "Expert"],
-            "hourly_rate": 72.0,
-            "station": "avoriaz"
-        },
-        {
-            "name": "Chloé Bernard",
-            "email": "chloe.bernard@skimonitor-demo.fr",
-            "bio": "Monitrice diplômée spécialisée dans l'accompagnement des adultes débutants. Méthode douce et progressive pour vaincre vos appréhensions et prendre du plaisir sur les pistes.",
-            "specialties": ["Ski alpin"],
-            "ski_levels": ["Débutant", "Intermédiaire"],
-            "hourly_rate": 58.0,
-            "station": "megeve"
-        },
-        {
-            "name": "Antoine Petit",
-            "email": "antoine.petit@skimonitor-demo.fr",
-            "bio": "Moniteur passionné avec une double compétence ski alpin et hors-piste. J'accompagne les skieurs expérimentés à la découverte des plus beaux itinéraires de montagne.",
-            "specialties": ["Ski alpin", "Hors-piste"],
-            "ski_levels": ["Avancé", "Expert"],
-            "hourly_rate": 80.0,
-            "station": "val-disere"
-        },
-        {
-            "name": "Léa Fontaine",
-            "email": "lea.fontaine@skimonitor-demo.fr",
-            "bio": "Monitrice polyvalente et diplômée, j'enseigne le ski et le snowboard dans une ambiance conviviale. Spécialiste des cours collectifs et des groupes de tous âges.",
-            "specialties": ["Ski alpin", "Snowboard", "Freestyle"],
-            "ski_levels": ["Débutant", "Intermédiaire", "Avancé"],
-            "hourly_rate": 62.0,
-            "station": "les-arcs"
-        },
-    ]
-
-    AVATAR_URLS = [
-        f"https://api.dicebear.com/7.x/avataaars/svg?seed={name.split()[0]}"
-        for name in [i["name"] for i in FICTIONAL_INSTRUCTORS]
-    ]
-
-    LESSON_TITLES = {
-        "private": ["Cours particulier de ski", "Coaching personnalisé ski alpin", "Perfectionnement technique"],
-        "group": ["Stage collectif débutants", "Cours groupe niveau intermédiaire", "Session groupe perfectionnement"]
-    }
-
-    created_users = 0
-    created_instructors = 0
-    created_lessons = 0
-    skipped = 0
-
-    for idx, instructor_data in enumerate(FICTIONAL_INSTRUCTORS):
-        # Check if user already exists
-        existing_user = await db.users.find_one({"email": instructor_data["email"]})
-        if existing_user:
-            skipped += 1
-            continue
-
-        # Create user
-        user = User(
-            email=instructor_data["email"],
-            name=instructor_data["name"],
-            picture=AVATAR_URLS[idx],
-            role="instructor"
-        )
-        await db.users.insert_one(user.model_dump())
-        created_users += 1
-
-        # Create instructor profile (approved)
-        instructor = Instructor(
-            user_id=user.id,
-            bio=instructor_data["bio"],
-            specialties=instructor_data["specialties"],
-            ski_levels=instructor_data["ski_levels"],
-            hourly_rate=instructor_data["hourly_rate"],
-            station_id=instructor_data["station"],
-            status="approved"
-        )
-        await db.instructors.insert_one(instructor.model_dump())
-        created_instructors += 1
-
-        # Create sample lessons
-        num_lessons = randint(2, 4)
-        for i in range(num_lessons):
-            lesson_type = "private" if i % 2 == 0 else "group"
-            days_ahead = randint(1, 14)
-            lesson_date = (datetime.now(timezone.utc) + timedelta(days=days_ahead)).strftime("%Y-%m-%d")
-            start_hour = randint(9, 15)
-            end_hour = start_hour + randint(1, 2)
-
-            lesson = Lesson(
-                instructor_id=instructor.id,
-                lesson_type=lesson_type,
-                title=choice(LESSON_TITLES[lesson_type]),
-                description="Cours adapté à votre niveau pour une progression optimale.",
-                date=lesson_date,
-                start_time=f"{start_hour:02d}:00",
-                end_time=f"{end_hour:02d}:00",
-                max_participants=1 if lesson_type == "private" else randint(4, 8),
-                price=instructor_data["hourly_rate"] * (end_hour - start_hour),
-                status="available"
-            )
-            await db.lessons.insert_one(lesson.model_dump())
-            created_lessons += 1
+    from seed_instructors import upsert_demo_instructors
 
+    result = await upsert_demo_instructors(db)
+    # A re-run may have changed names or stations: rewrite the copies of every demo instructor
+    await refresh_instructor_copies(result.pop("instructor_ids"))
+    await rebuild_availability()
+    response_cache.invalidate("users", "instructors", "lessons")
     return {
         "success": True,
         "message": "Seeding terminé avec succès !",
-        "created_users": created_users,
-        "created_instructors": created_instructors,
-        "created_lessons": created_lessons,
-        "skipped": skipped
+        **result
     }
 
 # ============== INSTRUCTOR DASHBOARD STATS ==============
@@ -1538,21 +3261,22 @@ async def seed_instructors(request: Request):
 async def get_instructor_stats(request: Request):
     """Get instructor dashboard statistics"""
     user = await require_instructor(request)
+    reads = read_db("GET /api/instructor/stats")
     instructor = await db.instructors.find_one({"user_id": user.id})
     
     if not instructor:
         raise HTTPException(status_code=404, detail="Profil moniteur non trouvé")
     
     # Get all lessons
-    lessons = await db.lessons.find({"instructor_id": instructor["id"]}, {"_id": 0}).to_list(1000)
+    lessons = await reads.lessons.find({"instructor_id": instructor["id"]}, {"_id": 0}).to_list(1000)
     
     # Get all bookings for instructor's lessons
     lesson_ids = [l["id"] for l in lessons]
-    bookings = await db.bookings.find({"lesson_id": {"$in": lesson_ids}}, {"_id": 0}).to_list(1000)
+    bookings = await reads.bookings.find({"lesson_id": {"$in": lesson_ids}}, {"_id": 0}).to_list(1000)
     
     # Get transactions
     booking_ids = [b["id"] for b in bookings]
-    transactions = await db.payment_transactions.find({
+    transactions = await reads.payment_transactions.find({
         "booking_id": {"$in": booking_ids},
         "status": "paid"
     }, {"_id": 0}).to_list(1000)
@@ -1571,9 +3295,9 @@ async def get_instructor_stats(request: Request):
     # Monthly revenue (last 6 months)
     monthly_revenue = {}
     for t in transactions:
-        created = t.get("created_at", "")
-        if isinstance(created, str) and len(created) >= 7:
-            month_key = created[:7]  # YYYY-MM
+        created = as_datetime(t.get("created_at"))
+        if created:
+            month_key = created.strftime("%Y-%m")
             monthly_revenue[month_key] = monthly_revenue.get(month_key, 0) + t.get("instructor_amount", 0)
     
     # Upcoming lessons
@@ -1584,14 +3308,15 @@ async def get_instructor_stats(request: Request):
     )[:10]
     
     # Add booking info to upcoming lessons
+    upcoming_ids = {l["id"] for l in upcoming_lessons}
+    upcoming_bookings = [b for b in bookings if b["lesson_id"] in upcoming_ids and b["status"] != "cancelled"]
+    clients = await Loaders(reads).users.load_many([b["user_id"] for b in upcoming_bookings])
+    for booking, client in zip(upcoming_bookings, clients):
+        booking["user"] = client
     for lesson in upcoming_lessons:
-        lesson_bookings = [b for b in bookings if b["lesson_id"] == lesson["id"] and b["status"] != "cancelled"]
-        for booking in lesson_bookings:
-            client = await db.users.find_one({"id": booking["user_id"]}, {"_id": 0})
-            booking["user"] = client
-        lesson["bookings"] = lesson_bookings
+        lesson["bookings"] = [b for b in upcoming_bookings if b["lesson_id"] == lesson["id"]]
     
-    return {
+    return FastJSONResponse({
         "total_lessons": total_lessons,
         "available_lessons": available_lessons,
         "completed_lessons": completed_lessons,
@@ -1601,36 +3326,35 @@ async def get_instructor_stats(request: Request):
         "total_commission_paid": round(total_commission_paid, 2),
         "monthly_revenue": monthly_revenue,
         "upcoming_lessons": upcoming_lessons
-    }
+    })
 
 @api_router.get("/instructor/export")
 async def export_instructor_data(request: Request, year: Optional[int] = None, month: Optional[int] = None):
     """Export instructor transactions for accounting (CSV)"""
     user = await require_instructor(request)
+    reads = read_db("GET /api/instructor/export")
     instructor = await db.instructors.find_one({"user_id": user.id})
     
     if not instructor:
         raise HTTPException(status_code=404, detail="Profil moniteur non trouvé")
     
     # Get all lessons
-    lessons = await db.lessons.find({"instructor_id": instructor["id"]}, {"_id": 0}).to_list(1000)
+    lessons = await reads.lessons.find({"instructor_id": instructor["id"]}, {"_id": 0}).to_list(1000)
     lesson_ids = [l["id"] for l in lessons]
     lessons_dict = {l["id"]: l for l in lessons}
     
     # Get bookings
-    bookings = await db.bookings.find({"lesson_id": {"$in": lesson_ids}}, {"_id": 0}).to_list(1000)
+    bookings = await reads.bookings.find({"lesson_id": {"$in": lesson_ids}}, {"_id": 0}).to_list(1000)
     bookings_dict = {b["id"]: b for b in bookings}
     
     # Get transactions
     query = {"booking_id": {"$in": [b["id"] for b in bookings]}, "status": "paid"}
-    transactions = await db.payment_transactions.find(query, {"_id": 0}).to_list(1000)
     
     # Filter by year/month if specified
-    if year:
-        transactions = [t for t in transactions if t.get("created_at", "").startswith(str(year))]
-    if month:
-        month_str = f"{year or datetime.now().year}-{month:02d}"
-        transactions = [t for t in transactions if t.get("created_at", "").startswith(month_str)]
+    period = period_range(year, month)
+    if period:
+        query.update(date_range_query("created_at", *period))
+    transactions = await reads.payment_transactions.find(query, {"_id": 0}).to_list(1000)
     
     # Create CSV
     output = io.StringIO()
@@ -1650,13 +3374,18 @@ async def export_instructor_data(request: Request, year: Optional[int] = None, m
     ])
     
     # Data rows
-    for tx in sorted(transactions, key=lambda x: x.get("created_at", "")):
+    for tx in transactions:
+        tx["created_at"] = as_datetime(tx.get("created_at"))
+    transactions = sorted(transactions, key=lambda x: x["created_at"] or datetime.min.replace(tzinfo=timezone.utc))
+    clients = await Loaders(reads).users.load_many(
+        [bookings_dict.get(tx.get("booking_id", ""), {}).get("user_id") for tx in transactions]
+    )
+    for tx, client in zip(transactions, clients):
         booking = bookings_dict.get(tx.get("booking_id", ""), {})
         lesson = lessons_dict.get(booking.get("lesson_id", ""), {})
-        client = await db.users.find_one({"id": booking.get("user_id", "")}, {"_id": 0})
         
         writer.writerow([
-            tx.get("created_at", "")[:10] if tx.get("created_at") else "",
+            tx["created_at"].strftime("%Y-%m-%d") if tx["created_at"] else "",
             tx.get("id", "")[:8],
             client.get("name", "Inconnu") if client else "Inconnu",
             lesson.get("title", ""),
@@ -1697,16 +3426,15 @@ async def export_instructor_data(request: Request, year: Optional[int] = None, m
 async def export_admin_data(request: Request, year: Optional[int] = None, month: Optional[int] = None):
     """Admin: Export all transactions for accounting (CSV)"""
     await require_admin(request)
+    reads = read_db("GET /api/admin/export")
     
     query = {"status": "paid"}
-    transactions = await db.payment_transactions.find(query, {"_id": 0}).to_list(10000)
     
     # Filter by year/month if specified
-    if year:
-        transactions = [t for t in transactions if t.get("created_at", "").startswith(str(year))]
-    if month:
-        month_str = f"{year or datetime.now().year}-{month:02d}"
-        transactions = [t for t in transactions if t.get("created_at", "").startswith(month_str)]
+    period = period_range(year, month)
+    if period:
+        query.update(date_range_query("created_at", *period))
+    transactions = await reads.payment_transactions.find(query, {"_id": 0}).to_list(10000)
     
     # Create CSV
     output = io.StringIO()
@@ -1728,15 +3456,24 @@ async def export_admin_data(request: Request, year: Optional[int] = None, month:
     ])
     
     # Data rows
-    for tx in sorted(transactions, key=lambda x: x.get("created_at", "")):
-        booking = await db.bookings.find_one({"id": tx.get("booking_id", "")}, {"_id": 0})
-        client = await db.users.find_one({"id": tx.get("user_id", "")}, {"_id": 0}) if tx.get("user_id") else None
-        lesson = await db.lessons.find_one({"id": booking.get("lesson_id", "")}, {"_id": 0}) if booking else None
-        instructor = await db.instructors.find_one({"id": lesson.get("instructor_id", "")}, {"_id": 0}) if lesson else None
-        instructor_user = await db.users.find_one({"id": instructor.get("user_id", "")}, {"_id": 0}) if instructor else None
-        
+    for tx in transactions:
+        tx["created_at"] = as_datetime(tx.get("created_at"))
+    transactions = sorted(transactions, key=lambda x: x["created_at"] or datetime.min.replace(tzinfo=timezone.utc))
+    bookings = await reads.bookings.find(
+        {"id": {"$in": [tx["booking_id"] for tx in transactions if tx.get("booking_id")]}},
+        {"_id": 0, "id": 1, "lesson_id": 1}
+    ).to_list(None)
+    booking_lessons = {b["id"]: b.get("lesson_id") for b in bookings}
+    
+    loaders = Loaders(reads)
+    clients = await loaders.users.load_many([tx.get("user_id") for tx in transactions])
+    lessons = await loaders.lessons.load_many([booking_lessons.get(tx.get("booking_id", "")) for tx in transactions])
+    instructors = await loaders.instructors.load_many([l.get("instructor_id") if l else None for l in lessons])
+    instructor_users = await loaders.users.load_many([i.get("user_id") if i else None for i in instructors])
+    
+    for tx, client, lesson, instructor_user in zip(transactions, clients, lessons, instructor_users):
         writer.writerow([
-            tx.get("created_at", "")[:10] if tx.get("created_at") else "",
+            tx["created_at"].strftime("%Y-%m-%d") if tx["created_at"] else "",
             tx.get("id", "")[:8],
             client.get("name", "Inconnu") if client else "Inconnu",
             client.get("email", "") if client else "",
@@ -1803,7 +3540,7 @@ STATION_COORDS = {
 async def get_weather(station_id: str):
     """Get weather for a ski station"""
     # Find station
-    station = next((s for s in SKI_STATIONS if s["id"] == station_id), None)
+    station = find_station(station_id)
     if not station:
         raise HTTPException(status_code=404, detail="Station non trouvée")
     
@@ -1822,7 +3559,7 @@ async def get_weather(station_id: str):
         return get_simulated_weather(station)
     
     try:
-        async with httpx.AsyncClient() as http_client:
+        async with httpx.AsyncClient(timeout=outbound_timeout(10)) as http_client, track_outbound("openweathermap"):
             response = await http_client.get(
                 "https://api.openweathermap.org/data/2.5/weather",
                 params={
@@ -1831,8 +3568,7 @@ async def get_weather(station_id: str):
                     "appid": OPENWEATHER_API_KEY,
                     "units": "metric",
                     "lang": "fr"
-                },
-                timeout=10
+                }
             )
             
             if response.status_code == 200:
@@ -1853,7 +3589,10 @@ async def get_weather(station_id: str):
                 }
             else:
                 return get_simulated_weather(station)
+    except DeadlineExceeded:
+        raise
     except Exception as e:
+        check_deadline()
         logger.error(f"Weather API error: {e}")
         return get_simulated_weather(station)
 
@@ -1941,17 +3680,19 @@ async def create_review(review_data: ReviewCreate, request: Request):
     )
 
     await db.reviews.insert_one(review.model_dump())
+    response_cache.invalidate(f"reviews:{review_data.instructor_id}")
     return review
 
 @api_router.get("/reviews")
+@cached_response("get_reviews", lambda instructor_id: [f"reviews:{instructor_id}", "users"])
 async def get_reviews(instructor_id: str = Query(..., description="ID du moniteur")):
     """Get all reviews for an instructor"""
     reviews = []
-    cursor = db.reviews.find({"instructor_id": instructor_id}).sort("created_at", -1)
+    docs = await db.reviews.find({"instructor_id": instructor_id}, {"_id": 0}).sort("created_at", -1).to_list(None)
+    users = await get_loaders().users.load_many([r["user_id"] for r in docs])
 
-    async for review in cursor:
+    for review, user in zip(docs, users):
         # Get user info
-        user = await db.users.find_one({"id": review["user_id"]})
         review_with_user = {
             **review,
             "user_name": user["name"] if user else "Utilisateur",
@@ -1959,7 +3700,7 @@ async def get_reviews(instructor_id: str = Query(..., description="ID du moniteu
         }
         reviews.append(review_with_user)
 
-    return reviews
+    return FastJSONResponse(reviews)
 
 @api_router.get("/instructors/{instructor_id}/rating")
 async def get_instructor_rating(instructor_id: str):
@@ -1989,7 +3730,7 @@ async def get_instructor_rating(instructor_id: str):
 # ============== UTILITY ROUTES ==============
 
 @api_router.post("/auth/promote-to-admin")
-async def promote_to_admin(request: Request, secret: str = None):
+async def promote_to_admin(request: Request, response: Response, secret: str = None):
     """Promote current user to admin role (secured with secret key)
 
     Usage: POST /auth/promote-to-admin?secret=YOUR_ADMIN_SECRET
@@ -2019,6 +3760,8 @@ async def promote_to_admin(request: Request, secret: str = None):
         {"id": user.id},
         {"$set": {"role": "admin"}}
     )
+    response_cache.invalidate("users")
+    await reissue_session(response, user.model_copy(update={"role": "admin"}))
 
     logger.info(f"User {user.email} promoted to admin")
 
@@ -2036,9 +3779,366 @@ async def root():
 async def health():
     return {"status": "healthy"}
 
+@api_router.get("/metrics")
+async def get_metrics(request: Request):
+    """Prometheus metrics, only for scrapers presenting METRICS_TOKEN (disabled when unset)"""
+    metrics_token = os.environ.get('METRICS_TOKEN')
+    if not metrics_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    authorization = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(authorization.encode(), f"Bearer {metrics_token}".encode()):
+        raise HTTPException(status_code=403, detail="Accès refusé")
+    
+    lines = [
+        "# HELP response_cache_lookups_total Response cache lookups by endpoint and result",
+        "# TYPE response_cache_lookups_total counter",
+    ]
+    for endpoint, stat in response_cache.stats.items():
+        lines.append(f'response_cache_lookups_total{{endpoint="{endpoint}",result="hit"}} {stat["hits"]}')
+        lines.append(f'response_cache_lookups_total{{endpoint="{endpoint}",result="miss"}} {stat["misses"]}')
+    body = metrics.render() + "\n".join(lines) + "\n"
+    return Response(content=body, media_type="text/plain; version=0.0.4")
+
+# ============== HTTP CACHING ==============
+
+# Cache-Control policy per public GET route; only these get ETags and compression
+CACHE_POLICIES = {
+    "/api/stations": "public, max-age=86400",
+    "/api/stations/{station_id}": "public, max-age=86400",
+    "/api/instructors": "public, max-age=60",
+    "/api/instructors/{instructor_id}": "public, max-age=60",
+    "/api/lessons": "no-cache",  # seats change on every booking: always revalidate
+    "/api/lessons/{lesson_id}": "no-cache",
+    "/api/reviews": "public, max-age=60",
+}
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against our ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in candidates)
+
+def pick_encoding(accept_encoding: str) -> Optional[str]:
+    """Best supported content coding accepted by the client (br > gzip)"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+# ============== ADMISSION CONTROL ==============
+
+ADMISSION_CONTROL = os.environ.get('ADMISSION_CONTROL', 'on').lower() not in ('0', 'off', 'false', 'no')
+# Token bucket per client (user of a verified session, else IP): refill rate and burst size, in cost units
+RATE_LIMIT_PER_SECOND = float(os.environ.get('RATE_LIMIT_PER_SECOND', '10'))
+RATE_LIMIT_BURST = float(os.environ.get('RATE_LIMIT_BURST', '60'))
+RATE_LIMIT_MAX_CLIENTS = int(os.environ.get('RATE_LIMIT_MAX_CLIENTS', '10000'))
+# Reverse proxies (IPs or CIDRs, comma-separated) whose X-Forwarded-For is trusted for the client IP
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(proxy.strip(), strict=False)
+    for proxy in os.environ.get('TRUSTED_PROXIES', '').split(',') if proxy.strip()
+]
+# Cost of one request per "METHOD /route"; unlisted routes cost 1
+RATE_LIMIT_COSTS = {
+    "GET /api/admin/export": 20,
+    "GET /api/instructor/export": 20,
+    "GET /api/weather/{station_id}": 5,
+    "GET /api/admin/stats": 5,
+    "GET /api/instructor/stats": 5,
+    "GET /api/lessons": 2,
+    "GET /api/search": 2,
+    "GET /api/health": 0,
+}
+# Routes sharing the heavy concurrency cap; bookings and payments never wait behind them
+HEAVY_ROUTES = {
+    "GET /api/admin/export",
+    "GET /api/instructor/export",
+    "GET /api/weather/{station_id}",
+    "GET /api/admin/stats",
+    "GET /api/instructor/stats",
+    "GET /api/lessons",
+}
+HEAVY_CONCURRENCY = int(os.environ.get('HEAVY_CONCURRENCY', '8'))
+HEAVY_QUEUE_SIZE = int(os.environ.get('HEAVY_QUEUE_SIZE', '32'))
+HEAVY_QUEUE_TIMEOUT = float(os.environ.get('HEAVY_QUEUE_TIMEOUT', '2'))
+
+def _compile_routes(keys) -> List[tuple]:
+    """(method, path regex, key) for "METHOD /route" setting keys"""
+    compiled = []
+    for key in keys:
+        method, path = key.split(" ", 1)
+        compiled.append((method, compile_path(path)[0], key))
+    return compiled
+
+def match_route(routes: List[tuple], method: str, path: str) -> Optional[str]:
+    """The "METHOD /route" key matching a request, before the router has run"""
+    for route_method, regex, key in routes:
+        if route_method == method and regex.match(path):
+            return key
+    return None
+
+_ADMISSION_ROUTES = _compile_routes(set(RATE_LIMIT_COSTS) | HEAVY_ROUTES)
+_DEADLINE_ROUTES = _compile_routes(ROUTE_DEADLINES)
+
+class RateLimiter:
+    """Token buckets per client key, the least recently seen clients are forgotten first"""
+
+    def __init__(self, rate: float, burst: float, max_clients: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: OrderedDict = OrderedDict()  # key -> (tokens, updated_at)
+
+    def acquire(self, key: str, cost: float) -> float:
+        """Take `cost` tokens; returns 0 when allowed, else the seconds until it would be"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / self.rate if self.rate > 0 else 60.0
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+class AdmissionGate:
+    """Concurrency cap with a bounded wait queue; requests beyond it are shed at once"""
+
+    def __init__(self, limit: int, queue_size: int, timeout: float):
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.waiting = 0
+        self._slots = asyncio.Semaphore(limit)
+
+    async def acquire(self) -> bool:
+        if self._slots.locked() and self.waiting >= self.queue_size:
+            return False
+        self.waiting += 1
+        HEAVY_QUEUED.inc()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+            HEAVY_QUEUED.dec()
+
+    def release(self):
+        self._slots.release()
+
+rate_limiter = RateLimiter(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST, RATE_LIMIT_MAX_CLIENTS)
+# Session lookups made by the middleware itself, per IP (see verified_client_key)
+session_checks = RateLimiter(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST, RATE_LIMIT_MAX_CLIENTS)
+heavy_gate = AdmissionGate(HEAVY_CONCURRENCY, HEAVY_QUEUE_SIZE, HEAVY_QUEUE_TIMEOUT)
+
+def is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+def client_ip(request: Request) -> str:
+    """The peer address, or behind trusted proxies the nearest untrusted hop of X-Forwarded-For"""
+    address = request.client.host if request.client else "unknown"
+    if not is_trusted_proxy(address):
+        return address
+    hops = [hop.strip() for header in request.headers.getlist("x-forwarded-for") for hop in header.split(",")]
+    for hop in reversed([hop for hop in hops if hop]):
+        if not is_trusted_proxy(hop):
+            return hop
+        address = hop
+    return address
+
+def client_key(request: Request) -> str:
+    """Rate limit key: the user of a verified session, else the client IP.
+
+    An unverified token never gets its own bucket, or a client could send a new random
+    token with every request. Signed tokens are checked in memory; opaque ones count
+    once get_session_from_request() has verified them, so this never queries Mongo.
+    """
+    session_token = session_token_from_request(request)
+    if session_token:
+        if SESSION_MODE == "signed" and "." in session_token:
+            claims = verify_session(session_token)
+            user_id = claims["sub"] if claims else None
+        else:
+            user_id = session_owners.get(session_token)
+        if user_id:
+            return "user:" + user_id
+    return "ip:" + client_ip(request)
+
+async def verified_client_key(request: Request) -> Optional[str]:
+    """User key of an opaque session this worker hasn't verified yet, looked up in user_sessions.
+
+    Called only when the IP bucket refuses a request, so that clients behind a shared
+    IP (NAT, office, school) are not turned away before their session is known here.
+    The lookups are themselves limited per IP: random tokens can't multiply queries.
+    """
+    session_token = session_token_from_request(request)
+    if not session_token or (SESSION_MODE == "signed" and "." in session_token):
+        return None
+    if session_checks.acquire(client_ip(request), 1):
+        return None
+    session = await get_session_from_request(request)
+    return "user:" + session.user_id if session else None
+
 # Include router
 app.include_router(api_router)
 
+@app.middleware("http")
+async def bind_request_loaders(request: Request, call_next):
+    """Give every request its own batching/memoizing loaders"""
+    token = _request_loaders.set(Loaders())
+    try:
+        return await call_next(request)
+    finally:
+        _request_loaders.reset(token)
+
+@app.middleware("http")
+async def conditional_get(request: Request, call_next):
+    """ETag/304, Cache-Control and compression for the routes in CACHE_POLICIES"""
+    response = await call_next(request)
+    route = request.scope.get("route")
+    policy = CACHE_POLICIES.get(getattr(route, "path", None))
+    if request.method != "GET" or policy is None or response.status_code != 200:
+        return response
+    
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        out = Response(status_code=304)
+    else:
+        encoding = pick_encoding(request.headers.get("accept-encoding", ""))
+        if encoding and len(body) >= COMPRESSION_MIN_SIZE:
+            out = Response(content=compress_body(body, encoding))
+            out.headers["Content-Encoding"] = encoding
+        else:
+            out = Response(content=body)
+    
+    out.raw_headers.extend(
+        (k, v) for k, v in response.raw_headers
+        if k not in (b"content-length", b"content-encoding", b"etag", b"cache-control", b"vary")
+    )
+    out.headers["ETag"] = etag
+    out.headers["Cache-Control"] = policy
+    out.headers["Vary"] = "Accept-Encoding"
+    return out
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Latency, status and in-flight metrics per route template"""
+    start = time.perf_counter()
+    status = 500
+    HTTP_IN_FLIGHT.inc()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_LATENCY.observe((request.method, route), time.perf_counter() - start)
+        HTTP_REQUESTS.inc((request.method, route, str(status)))
+
+@app.middleware("http")
+async def enforce_query_budget(request: Request, call_next):
+    """Count Mongo commands per request and warn when a route goes over budget"""
+    stats = _request_query_stats.get()
+    token = None
+    if stats is None:  # an enclosing query_budget() block keeps its own stats
+        stats = QueryStats()
+        token = _request_query_stats.set(stats)
+    try:
+        response = await call_next(request)
+    finally:
+        if token is not None:
+            _request_query_stats.reset(token)
+    
+    route = f"{request.method} {getattr(request.scope.get('route'), 'path', request.url.path)}"
+    budget = QUERY_BUDGETS.get(route, QUERY_BUDGET)
+    if token is not None and stats.count > budget:
+        logger.warning(f"Query budget exceeded on {route}: {stats.count} Mongo commands (budget {budget}), {stats.duration * 1000:.1f} ms")
+    if QUERY_DEBUG_HEADERS:
+        response.headers["X-DB-Queries"] = str(stats.count)
+        response.headers["X-DB-Time-Ms"] = f"{stats.duration * 1000:.1f}"
+    return response
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    """Per-client token buckets (429) and a concurrency cap on heavy routes (503)"""
+    if not ADMISSION_CONTROL:
+        return await call_next(request)
+    route = match_route(_ADMISSION_ROUTES, request.method, request.url.path)
+    label = route.split(" ", 1)[1] if route else "other"
+    
+    cost = RATE_LIMIT_COSTS.get(route, 1)
+    if cost:
+        key = client_key(request)
+        wait = rate_limiter.acquire(key, cost)
+        if wait and key.startswith("ip:"):
+            user_key = await verified_client_key(request)
+            if user_key:
+                wait = rate_limiter.acquire(user_key, cost)
+        if wait:
+            HTTP_REJECTED.inc((request.method, label, "rate_limited"))
+            return FastJSONResponse(
+                {"detail": "Trop de requêtes, veuillez réessayer dans quelques instants"},
+                status_code=429, headers={"Retry-After": str(max(1, round(wait)))}
+            )
+    
+    if route not in HEAVY_ROUTES:
+        return await call_next(request)
+    if not await heavy_gate.acquire():
+        HTTP_REJECTED.inc((request.method, label, "overloaded"))
+        return FastJSONResponse(
+            {"detail": "Service momentanément surchargé, veuillez réessayer"},
+            status_code=503, headers={"Retry-After": "1"}
+        )
+    HEAVY_IN_FLIGHT.inc()
+    try:
+        return await call_next(request)
+    finally:
+        HEAVY_IN_FLIGHT.dec()
+        heavy_gate.release()
+
+@app.middleware("http")
+async def apply_request_deadline(request: Request, call_next):
+    """Start the route's time budget at request entry (queueing in admission control included)"""
+    route = match_route(_DEADLINE_ROUTES, request.method, request.url.path)
+    with request_deadline(ROUTE_DEADLINES.get(route, REQUEST_DEADLINE)):
+        return await call_next(request)
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return FastJSONResponse({"detail": "Délai de traitement dépassé, veuillez réessayer"}, status_code=504)
+
+@app.exception_handler(PyMongoError)
+async def mongo_error_handler(request: Request, exc: PyMongoError):
+    """Mongo operations cut short by the request deadline become 504s; other errors stay 500s"""
+    if not exc.timeout:
+        raise exc
+    logger.warning(f"Deadline exceeded on {request.method} {request.url.path}: {exc}")
+    return await deadline_exceeded_handler(request, DeadlineExceeded())
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -2047,6 +4147,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+_warm_views_task: Optional[asyncio.Task] = None
+
+async def warm_views():
+    """Mirror the stations and fill the in-memory views once the worker is serving"""
+    try:
+        await sync_stations()
+        if INSTRUCTOR_DIRECTORY and not invalidation_bus.local_only:
+            await instructor_directory.build()
+        if LESSON_ENGINE == "numpy" and not invalidation_bus.local_only:
+            await lesson_engine.build()
+    except PyMongoError as e:
+        # Requests fall back to Mongo; the views are built again on first use
+        logger.warning(f"Background warm-up failed: {e}")
+
+@app.on_event("startup")
+async def warm_up():
+    """Open the Mongo pool, check indexes and start the background syncers before serving.
+
+    One-off backfills (copied search/geo fields, availability inventory) are not run here:
+    see backfill_search_fields.py.
+    """
+    global _warm_views_task
+    start = time.perf_counter()
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(max(MONGO_MIN_POOL_SIZE, 1))))
+    await asyncio.gather(ensure_session_indexes(), ensure_date_indexes(), ensure_search_indexes(), ensure_geo_indexes(),
+                         ensure_availability())
+    await invalidation_bus.start()
+    await revocations.start()
+    _warm_views_task = background_task(warm_views())
+    logger.info(f"Startup warm-up done in {(time.perf_counter() - start) * 1000:.0f} ms")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    if _warm_views_task is not None:
+        _warm_views_task.cancel()
+    await invalidation_bus.stop()
+    await revocations.stop()
+    await instructor_directory.stop()
+    await lesson_engine.stop()
     client.close()
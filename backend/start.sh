@@ -1,3 +1,3 @@
 #!/bin/bash
 cd "$(dirname "$0")"
-uvicorn server:app --host 0.0.0.0 --port ${PORT:-8000}
+uvicorn server:app --host 0.0.0.0 --port ${PORT:-8000} --workers ${WEB_CONCURRENCY:-1}
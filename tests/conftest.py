@@ -0,0 +1,108 @@
+"""Shared fixtures for the backend tests.
+
+server.py runs in process against an in-memory MongoDB (mongomock-motor), or
+against a real server when TEST_MONGO_URL is set. Tests needing features the
+in-memory one lacks ($text, $geoNear, $toDate) are marked `real_mongo`.
+"""
+import asyncio
+import functools
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+TEST_MONGO_URL = os.environ.get("TEST_MONGO_URL")
+
+# server.py reads its configuration at import
+os.environ["MONGO_URL"] = TEST_MONGO_URL or "mongodb://localhost:27017"
+os.environ["DB_NAME"] = os.environ.get("TEST_DB_NAME", "skimonitor_test")
+os.environ["CACHE_INVALIDATION"] = "off"
+os.environ["ADMISSION_CONTROL"] = "off"
+os.environ["QUERY_DEBUG_HEADERS"] = "true"
+os.environ.pop("METRICS_TOKEN", None)
+
+if not TEST_MONGO_URL:
+    import mongomock_motor
+    import motor.motor_asyncio
+
+    class InMemoryClient(mongomock_motor.AsyncMongoMockClient):
+        def __init__(self, *args, tz_aware=False, **kwargs):
+            # Pool sizes and command listeners have no in-memory equivalent
+            super().__init__(tz_aware=tz_aware)
+
+    motor.motor_asyncio.AsyncIOMotorClient = InMemoryClient
+
+import server  # noqa: E402
+
+if not TEST_MONGO_URL:
+    # Without a wire protocol there are no command events: count each collection call as one
+    # command, which is what a request issues for the small result sets used here
+    def _counted(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            stats = server._request_query_stats.get()
+            if stats is not None:
+                stats.record(0.0)
+            return method(self, *args, **kwargs)
+        return wrapper
+
+    _collection_class = type(server.db.users)
+    for _name in ("find", "find_one", "find_one_and_update", "aggregate", "count_documents", "distinct",
+                  "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+                  "delete_one", "delete_many", "bulk_write"):
+        setattr(_collection_class, _name, _counted(getattr(_collection_class, _name)))
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "real_mongo: needs a real MongoDB (TEST_MONGO_URL)")
+
+
+def pytest_collection_modifyitems(config, items):
+    if TEST_MONGO_URL:
+        return
+    skip = pytest.mark.skip(reason="needs a real MongoDB: set TEST_MONGO_URL")
+    for item in items:
+        if "real_mongo" in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture(scope="session")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def run(loop):
+    """Run a coroutine to completion on the shared event loop"""
+    return loop.run_until_complete
+
+
+@pytest.fixture
+def db(run):
+    """The app's database, emptied, with empty caches and in-memory views"""
+    async def reset():
+        for name in await server.db.list_collection_names():
+            await server.db.drop_collection(name)
+    run(reset())
+    server.response_cache.clear()
+    server.response_cache.stats.clear()
+    server.session_owners._owners.clear()
+    server.rate_limiter._buckets.clear()
+    server.session_checks._buckets.clear()
+    server.revocations.sessions.clear()
+    server.revocations.users.clear()
+    return server.db
+
+
+@pytest.fixture
+def api():
+    """In-process HTTP client factory: `async with api() as c: await c.get(...)`"""
+    def client(**kwargs):
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test", **kwargs)
+    return client
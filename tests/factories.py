@@ -0,0 +1,55 @@
+"""Documents shaped like the ones the API writes"""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import server
+
+
+async def add_user(db, role="client", name=None, **fields) -> dict:
+    user_id = fields.pop("id", None) or str(uuid.uuid4())
+    user = {"id": user_id, "email": f"{user_id}@example.com", "name": name or f"User {user_id[:6]}",
+            "picture": None, "role": role, "created_at": datetime.now(timezone.utc), **fields}
+    await db.users.insert_one(dict(user))
+    return user
+
+
+async def add_session(db, user: dict, days: float = 7) -> str:
+    """Opaque database session for `user`; negative `days` gives an expired one"""
+    now = datetime.now(timezone.utc)
+    token = f"token-{uuid.uuid4().hex}"
+    await db.user_sessions.insert_one({"id": str(uuid.uuid4()), "user_id": user["id"], "session_token": token,
+                                       "expires_at": now + timedelta(days=days), "created_at": now})
+    return token
+
+
+async def add_instructor(db, user: dict = None, station_id="courchevel", specialties=("Ski alpin",),
+                         ski_levels=("Débutant",), hourly_rate=60.0, status="approved", **fields) -> dict:
+    if user is None:
+        user = await add_user(db, role="instructor")
+    instructor = {"id": fields.pop("id", None) or str(uuid.uuid4()), "user_id": user["id"], "bio": "",
+                  "specialties": list(specialties), "ski_levels": list(ski_levels), "hourly_rate": hourly_rate,
+                  "station_id": station_id, "status": status, "created_at": datetime.now(timezone.utc), **fields}
+    instructor.update(server.instructor_copies(instructor, user))
+    await db.instructors.insert_one(dict(instructor))
+    return instructor
+
+
+async def add_lesson(db, instructor: dict, date="2030-01-15", start_time="10:00", lesson_type="private",
+                     price=60.0, max_participants=1, current_participants=0, status="available",
+                     user: dict = None, **fields) -> dict:
+    lesson = {"id": fields.pop("id", None) or str(uuid.uuid4()), "instructor_id": instructor["id"],
+              "lesson_type": lesson_type, "title": fields.pop("title", "Cours"), "description": "",
+              "date": date, "start_time": start_time, "end_time": "18:00", "max_participants": max_participants,
+              "current_participants": current_participants, "price": price, "status": status,
+              "is_recurring": False, "created_at": datetime.now(timezone.utc), **fields}
+    try:
+        lesson.setdefault("starts_at", server.lesson_starts_at(date, start_time))
+    except ValueError:
+        pass  # malformed on purpose
+    lesson.update(server.lesson_copies(instructor, user))
+    await db.lessons.insert_one(dict(lesson))
+    return lesson
+
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
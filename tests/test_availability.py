@@ -0,0 +1,79 @@
+"""station_availability kept by $inc on API writes, checked against a full rebuild"""
+import server
+from tests.factories import add_instructor, add_lesson, add_session, add_user, bearer
+
+
+async def inventory(db) -> list:
+    rows = await db.station_availability.find({}, {"_id": 0, "updated_at": 0}).to_list(None)
+    return sorted(rows, key=lambda row: (row["station_id"], row["date"]))
+
+
+async def assert_matches_rebuild(db):
+    incremental = await inventory(db)
+    await server.rebuild_availability()
+    assert incremental == await inventory(db)
+
+
+async def world(db):
+    user = await add_user(db, role="instructor")
+    instructor = await add_instructor(db, user, station_id="tignes")
+    other = await add_instructor(db, station_id="meribel")
+    lessons = [await add_lesson(db, instructor, lesson_type="group", max_participants=4),
+               await add_lesson(db, instructor, start_time="14:00"),
+               await add_lesson(db, other, date="2030-01-16", lesson_type="group", max_participants=6)]
+    await server.rebuild_availability()
+    return {"instructor": await add_session(db, user), "client": await add_session(db, await add_user(db)),
+            "lessons": lessons}
+
+
+def test_booking_and_cancelling(db, run, api):
+    async def scenario():
+        w = await world(db)
+        group, private, _ = w["lessons"]
+        async with api() as c:
+            booked = await c.post("/api/bookings", headers=bearer(w["client"]), json={"lesson_id": group["id"], "participants": 3})
+            await c.post("/api/bookings", headers=bearer(w["client"]), json={"lesson_id": private["id"]})
+            row = (await c.get("/api/stations/tignes/availability", params={"from": "2030-01-15", "to": "2030-01-15"})).json()
+            assert row["days"][0]["open_lessons"] == 1 and row["days"][0]["seats_left"] == 1
+            await assert_matches_rebuild(db)
+
+            await c.delete(f"/api/bookings/{booked.json()['id']}", headers=bearer(w["client"]))
+            await assert_matches_rebuild(db)
+        row = await db.station_availability.find_one({"station_id": "tignes", "date": "2030-01-15"})
+        assert row["by_type"] == {"group": {"open_lessons": 1, "seats_left": 4}, "private": {"open_lessons": 0, "seats_left": 0}}
+    run(scenario())
+
+
+def test_creating_and_deleting_lessons(db, run, api):
+    async def scenario():
+        w = await world(db)
+        async with api() as c:
+            created = await c.post("/api/lessons", headers=bearer(w["instructor"]), json={
+                "lesson_type": "private", "title": "Cours", "date": "2030-01-15", "start_time": "16:00",
+                "end_time": "17:00", "price": 60.0, "is_recurring": True, "recurrence_type": "weekly",
+                "recurrence_end_date": "2030-01-29"})
+            assert created.json()["lessons_created"] == 3
+            await assert_matches_rebuild(db)
+
+            await c.delete(f"/api/lessons/{w['lessons'][0]['id']}", headers=bearer(w["instructor"]))
+            await c.delete(f"/api/lessons/{created.json()['first_lesson']['id']}", headers=bearer(w["instructor"]))
+            await assert_matches_rebuild(db)
+        assert {row["date"] for row in await inventory(db) if row["station_id"] == "tignes"} == {
+            "2030-01-15", "2030-01-22", "2030-01-29"}
+    run(scenario())
+
+
+def test_a_booking_costs_one_inventory_write_and_no_aggregation(db, run, api, monkeypatch):
+    async def scenario():
+        w = await world(db)
+        calls = []
+        collection_class = type(db.station_availability)
+        for method in ("bulk_write", "aggregate"):
+            def counting(self, *args, _method=method, _original=getattr(collection_class, method), **kwargs):
+                calls.append((self.name, _method))
+                return _original(self, *args, **kwargs)
+            monkeypatch.setattr(collection_class, method, counting)
+        async with api() as c:
+            await c.post("/api/bookings", headers=bearer(w["client"]), json={"lesson_id": w["lessons"][0]["id"]})
+        assert calls == [("station_availability", "bulk_write")]
+    run(scenario())
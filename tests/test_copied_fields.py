@@ -0,0 +1,73 @@
+"""The search/location copies: kept in sync with their sources, never returned by the API"""
+import server
+from tests.factories import add_instructor, add_lesson, add_session, add_user, bearer
+
+
+def no_copies(doc: dict) -> bool:
+    return not set(server.COPIED_FIELDS) & set(doc)
+
+
+def test_responses_leave_the_copies_out(db, run, api):
+    async def scenario():
+        instructor = await add_instructor(db)
+        lesson = await add_lesson(db, instructor)
+        client = await add_user(db)
+        async with api() as c:
+            instructors = (await c.get("/api/instructors")).json()
+            detail = (await c.get(f"/api/instructors/{instructor['id']}")).json()
+            lessons = (await c.get("/api/lessons")).json()
+            one = (await c.get(f"/api/lessons/{lesson['id']}")).json()
+            created = (await c.post("/api/instructors", headers=bearer(await add_session(db, client)),
+                                    json={"station_id": "meribel"})).json()
+        for doc in (*instructors, detail, *lessons, one, created):
+            assert no_copies(doc), doc
+        assert (one["id"], detail["id"]) == (lesson["id"], instructor["id"])
+        assert lessons[0]["instructor"] and no_copies(lessons[0]["instructor"])
+        assert (await db.instructors.find_one({"id": created["id"]}))["search"]["station"] == "Méribel"
+    run(scenario())
+
+
+def test_profile_update_refreshes_instructor_and_lesson_copies(db, run, api):
+    async def scenario():
+        user = await add_user(db, role="instructor", name="Jean")
+        instructor = await add_instructor(db, user)
+        lesson = await add_lesson(db, instructor)
+        async with api() as c:
+            response = await c.put(f"/api/instructors/{instructor['id']}", headers=bearer(await add_session(db, user)),
+                                   json={"station_id": "tignes", "ski_levels": ["Expert"], "specialties": ["Freeride"]})
+        assert response.status_code == 200
+        stored_instructor = await db.instructors.find_one({"id": instructor["id"]})
+        stored_lesson = await db.lessons.find_one({"id": lesson["id"]})
+        assert stored_instructor["search"] == {"name": "Jean", "station": "Tignes"}
+        assert stored_instructor["location"] == stored_lesson["location"] == server.station_point("tignes")
+        assert stored_lesson["search"] == {"instructor": "Jean", "station": "Tignes", "station_id": "tignes",
+                                           "ski_levels": ["Expert"], "specialties": ["Freeride"]}
+    run(scenario())
+
+
+def test_refresh_picks_up_a_renamed_user(db, run):
+    async def scenario():
+        user = await add_user(db, role="instructor", name="Jean")
+        instructor = await add_instructor(db, user)
+        lesson = await add_lesson(db, instructor, user=user)
+        await db.users.update_one({"id": user["id"]}, {"$set": {"name": "Jeanne"}})
+
+        await server.refresh_instructor_copies([instructor["id"]])
+
+        assert (await db.instructors.find_one({"id": instructor["id"]}))["search"]["name"] == "Jeanne"
+        assert (await db.lessons.find_one({"id": lesson["id"]}))["search"]["instructor"] == "Jeanne"
+    run(scenario())
+
+
+def test_refresh_without_ids_fills_documents_missing_copies(db, run):
+    async def scenario():
+        instructor = await add_instructor(db)
+        lesson = await add_lesson(db, instructor)
+        await db.instructors.update_one({"id": instructor["id"]}, {"$unset": {"search": "", "location": ""}})
+        await db.lessons.update_one({"id": lesson["id"]}, {"$unset": {"search": ""}})
+
+        await server.refresh_instructor_copies()
+
+        assert (await db.instructors.find_one({"id": instructor["id"]}))["search"]["station"] == "Courchevel"
+        assert (await db.lessons.find_one({"id": lesson["id"]}))["search"]["station_id"] == "courchevel"
+    run(scenario())
@@ -0,0 +1,40 @@
+"""POST /api/lessons: dates and times are validated and stored zero-padded"""
+import pytest
+
+from tests.factories import add_instructor, add_session, add_user, bearer
+
+LESSON = {"lesson_type": "private", "title": "Cours", "date": "2030-01-05", "start_time": "09:00", "end_time": "10:00",
+          "price": 60.0}
+
+
+async def instructor_token(db) -> str:
+    user = await add_user(db, role="instructor")
+    await add_instructor(db, user)
+    return await add_session(db, user)
+
+
+@pytest.mark.parametrize("field, value", [("date", "demain"), ("date", "2030-02-30"), ("start_time", "9h"),
+                                          ("end_time", "25:00"), ("recurrence_end_date", "bientôt"), ("date", "")])
+def test_malformed_date_or_time_is_a_400(db, run, api, field, value):
+    async def scenario():
+        token = await instructor_token(db)
+        async with api() as c:
+            response = await c.post("/api/lessons", headers=bearer(token), json={**LESSON, field: value})
+        assert response.status_code == 400
+        assert await db.lessons.count_documents({}) == 0
+    run(scenario())
+
+
+def test_unpadded_values_are_stored_padded(db, run, api):
+    async def scenario():
+        token = await instructor_token(db)
+        async with api() as c:
+            response = await c.post("/api/lessons", headers=bearer(token), json={
+                **LESSON, "date": "2030-1-5", "start_time": "9:00", "end_time": "10:5",
+                "is_recurring": True, "recurrence_type": "weekly", "recurrence_end_date": "2030-1-19"})
+        assert response.status_code == 200
+        assert response.json()["lessons_created"] == 3
+        stored = await db.lessons.find({}, {"_id": 0, "date": 1, "start_time": 1, "end_time": 1}).sort("date", 1).to_list(None)
+        assert stored == [{"date": d, "start_time": "09:00", "end_time": "10:05"}
+                          for d in ("2030-01-05", "2030-01-12", "2030-01-19")]
+    run(scenario())
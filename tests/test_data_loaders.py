@@ -0,0 +1,65 @@
+import asyncio
+
+import server
+from tests.factories import add_instructor, add_lesson, add_user
+
+
+def test_load_many_fetches_all_keys_in_one_query(db, run):
+    async def scenario():
+        users = [await add_user(db) for _ in range(5)]
+        loader = server.DataLoader(db.users)
+        with server.query_budget(1) as stats:
+            docs = await loader.load_many([u["id"] for u in users] + [None, "missing"])
+        assert stats.count == 1
+        assert [d["id"] for d in docs[:5]] == [u["id"] for u in users]
+        assert docs[5:] == [None, None]
+    run(scenario())
+
+
+def test_concurrent_loads_in_the_same_tick_are_batched(db, run):
+    async def scenario():
+        users = [await add_user(db) for _ in range(3)]
+        loader = server.DataLoader(db.users)
+        with server.query_budget(1):
+            docs = await asyncio.gather(*(loader.load(u["id"]) for u in users))
+        assert [d["name"] for d in docs] == [u["name"] for u in users]
+    run(scenario())
+
+
+def test_loaded_documents_are_memoized_and_copied(db, run):
+    async def scenario():
+        user = await add_user(db)
+        loader = server.DataLoader(db.users)
+        first = await loader.load(user["id"])
+        first["name"] = "changed by the caller"
+        with server.query_budget(0):
+            second = await loader.load(user["id"])
+        assert second["name"] == user["name"]
+    run(scenario())
+
+
+def test_clear_forgets_a_key(db, run):
+    async def scenario():
+        user = await add_user(db)
+        loader = server.DataLoader(db.users)
+        await loader.load(user["id"])
+        await db.users.update_one({"id": user["id"]}, {"$set": {"name": "Renamed"}})
+        loader.clear(user["id"])
+        assert (await loader.load(user["id"]))["name"] == "Renamed"
+    run(scenario())
+
+
+def test_lesson_list_loads_instructors_and_users_once(db, run, api):
+    async def scenario():
+        for _ in range(4):
+            instructor = await add_instructor(db)
+            await add_lesson(db, instructor)
+            await add_lesson(db, instructor, start_time="14:00")
+        async with api() as client:
+            response = await client.get("/api/lessons")
+        lessons = response.json()
+        assert len(lessons) == 8
+        assert all(lesson["instructor"]["user"]["id"] == lesson["instructor"]["user_id"] for lesson in lessons)
+        # lessons, then one batched query each for instructors and users
+        assert response.headers["X-DB-Queries"] == "3"
+    run(scenario())
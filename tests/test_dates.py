@@ -0,0 +1,134 @@
+"""Native/legacy date reads, period bounds and the resumable migrate_dates.py"""
+import argparse
+from datetime import datetime, timezone
+
+import pytest
+
+import migrate_dates
+import server
+from tests.factories import add_instructor, add_lesson
+
+
+def utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2030-01-05T10:00:00+00:00", utc(2030, 1, 5, 10)),
+    ("2030-01-05T10:00:00Z", utc(2030, 1, 5, 10)),
+    ("2030-01-05T11:00:00+01:00", utc(2030, 1, 5, 10)),
+    (datetime(2030, 1, 5, 10), utc(2030, 1, 5, 10)),  # naive values from Mongo are UTC
+    (utc(2030, 1, 5, 10), utc(2030, 1, 5, 10)),
+    ("pas une date", None), (None, None), (42, None),
+])
+def test_as_datetime(value, expected):
+    assert server.as_datetime(value) == expected
+
+
+@pytest.mark.parametrize("year, month, expected", [
+    (2030, None, (utc(2030, 1, 1), utc(2031, 1, 1))),
+    (2030, 2, (utc(2030, 2, 1), utc(2030, 3, 1))),
+    (2030, 12, (utc(2030, 12, 1), utc(2031, 1, 1))),
+    (None, None, None),
+])
+def test_period_range(year, month, expected):
+    assert server.period_range(year, month) == expected
+
+
+def test_period_range_defaults_to_the_current_year():
+    assert server.period_range(month=3)[0].year == datetime.now(timezone.utc).year
+
+
+def test_date_range_query_reads_both_formats(db, run, monkeypatch):
+    async def scenario():
+        docs = {"native-in": utc(2030, 2, 1), "native-last": utc(2030, 2, 28, 23, 59),
+                "legacy-in": utc(2030, 2, 14, 12).isoformat(), "native-next-month": utc(2030, 3, 1),
+                "legacy-previous-month": utc(2030, 1, 31, 23, 59).isoformat(), "legacy-next-year": utc(2031, 2, 1).isoformat()}
+        await db.payment_transactions.insert_many([{"id": key, "created_at": value} for key, value in docs.items()])
+        start, end = server.period_range(2030, 2)
+
+        async def matching():
+            query = server.date_range_query("created_at", start, end)
+            return sorted(d["id"] for d in await db.payment_transactions.find(query).to_list(None))
+
+        assert await matching() == ["legacy-in", "native-in", "native-last"]
+        monkeypatch.setattr(server, "DATE_DUAL_READ", False)
+        assert await matching() == ["native-in", "native-last"]
+    run(scenario())
+
+
+def test_lesson_range_query_falls_back_to_the_date_of_unmigrated_lessons(db, run):
+    async def scenario():
+        instructor = await add_instructor(db)
+        await add_lesson(db, instructor, date="2030-12-31", start_time="23:00", id="native-december")
+        await add_lesson(db, instructor, date="2031-01-01", start_time="00:00", id="native-january")
+        for lesson_id, date in (("legacy-december", "2030-12-01"), ("legacy-january", "2031-01-01")):
+            await add_lesson(db, instructor, date=date, id=lesson_id)
+            await db.lessons.update_one({"id": lesson_id}, {"$unset": {"starts_at": ""}})
+        start, end = server.period_range(2030, 12)
+        found = await db.lessons.find(server.lesson_range_query(start, end)).to_list(None)
+        assert sorted(l["id"] for l in found) == ["legacy-december", "native-december"]
+    run(scenario())
+
+
+def options(**overrides) -> argparse.Namespace:
+    return argparse.Namespace(**{"batch_size": 3, "pause": 0, "dry_run": False, "restart": False, **overrides})
+
+
+def test_interrupted_migration_resumes_where_it_stopped(db, run, monkeypatch):
+    async def scenario():
+        await db.users.insert_many([{"id": str(i), "created_at": utc(2030, 1, 1 + i).isoformat()} for i in range(10)])
+        await db.users.insert_one({"id": "bad", "created_at": "pas une date"})
+        await db.users.insert_one({"id": "native", "created_at": utc(2030, 2, 1)})
+        step = migrate_dates.created_at_step("users")
+        batches = []
+
+        async def interrupt_after_two_batches(_):
+            batches.append(1)
+            if len(batches) == 2:
+                raise KeyboardInterrupt
+
+        monkeypatch.setattr(migrate_dates.asyncio, "sleep", interrupt_after_two_batches)
+        with pytest.raises(KeyboardInterrupt):
+            await migrate_dates.run_step(step, options())
+        progress = await db.migrations.find_one({"_id": "users.created_at"})
+        assert (progress["converted"], progress["done"]) == (6, False)
+
+        monkeypatch.undo()
+        await migrate_dates.run_step(step, options())
+        progress = await db.migrations.find_one({"_id": "users.created_at"})
+        assert (progress["converted"], progress["invalid"], progress["done"]) == (10, 1, True)
+        users = {u["id"]: u["created_at"] for u in await db.users.find().to_list(None)}
+        assert all(isinstance(users[str(i)], datetime) for i in range(10))
+        assert server.as_datetime(users["3"]) == utc(2030, 1, 4)
+        assert users["bad"] == "pas une date"
+
+        # A finished step is skipped unless --restart
+        await db.users.update_one({"id": "native"}, {"$set": {"created_at": utc(2030, 3, 1).isoformat()}})
+        await migrate_dates.run_step(step, options())
+        assert isinstance((await db.users.find_one({"id": "native"}))["created_at"], str)
+        await migrate_dates.run_step(step, options(restart=True))
+        assert isinstance((await db.users.find_one({"id": "native"}))["created_at"], datetime)
+    run(scenario())
+
+
+def test_dry_run_writes_nothing(db, run):
+    async def scenario():
+        await db.users.insert_many([{"id": str(i), "created_at": utc(2030, 1, 1).isoformat()} for i in range(4)])
+        await migrate_dates.run_step(migrate_dates.created_at_step("users"), options(dry_run=True))
+        assert await db.users.count_documents({"created_at": {"$type": "string"}}) == 4
+        assert await db.migrations.count_documents({}) == 0
+    run(scenario())
+
+
+def test_starts_at_step_computes_the_lesson_start(db, run):
+    async def scenario():
+        instructor = await add_instructor(db)
+        await add_lesson(db, instructor, date="2030-01-05", start_time="09:30", id="ok")
+        await add_lesson(db, instructor, date="2030-01-05", start_time="9h", id="bad")
+        await db.lessons.update_many({}, {"$unset": {"starts_at": ""}})
+        await migrate_dates.run_step(migrate_dates.starts_at_step(), options())
+        lessons = {l["id"]: l.get("starts_at") for l in await db.lessons.find().to_list(None)}
+        assert server.as_datetime(lessons["ok"]) == utc(2030, 1, 5, 9, 30)
+        assert lessons["bad"] is None
+    run(scenario())
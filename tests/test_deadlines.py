@@ -0,0 +1,103 @@
+"""Request deadlines: out-of-time requests answer 504 whichever call ran out"""
+import asyncio
+
+import httpx
+import pytest
+from pymongo.errors import ExecutionTimeout, OperationFailure
+
+import server
+from tests.factories import add_instructor, add_lesson
+
+
+@pytest.fixture
+def weather(monkeypatch):
+    """get_weather() calls OpenWeatherMap for courchevel"""
+    monkeypatch.setattr(server, "OPENWEATHER_API_KEY", "test-key")
+
+
+def outbound(monkeypatch, fake):
+    """Replace the outbound GETs of the server (the test client still reaches the app)"""
+    original = httpx.AsyncClient.get
+
+    async def get(self, url, **kwargs):
+        if isinstance(self._transport, httpx.ASGITransport):
+            return await original(self, url, **kwargs)
+        return await fake()
+
+    monkeypatch.setattr(httpx.AsyncClient, "get", get)
+
+
+def test_outbound_timeout_is_capped_by_the_deadline():
+    assert server.outbound_timeout(10) == 10
+    with server.request_deadline(2):
+        assert 1.9 < server.outbound_timeout(10) <= 2
+        assert server.outbound_timeout(1) == 1
+    with server.request_deadline(0):
+        with pytest.raises(server.DeadlineExceeded):
+            server.outbound_timeout(10)
+
+
+def test_expired_deadline_before_an_outbound_call_is_a_504(db, run, api, weather, monkeypatch):
+    monkeypatch.setattr(server, "REQUEST_DEADLINE", 0)
+
+    async def scenario():
+        async with api() as c:
+            weather_response = await c.get("/api/weather/courchevel")
+            session_response = await c.post("/api/auth/session", json={"session_id": "abc"})
+        assert weather_response.status_code == session_response.status_code == 504
+        assert "Délai" in weather_response.json()["detail"]
+    run(scenario())
+
+
+def test_outbound_call_cut_by_the_deadline_is_a_504(db, run, api, weather, monkeypatch):
+    monkeypatch.setattr(server, "REQUEST_DEADLINE", 0.05)
+
+    async def slow():
+        await asyncio.sleep(0.1)
+        raise httpx.ReadTimeout("timed out")
+
+    outbound(monkeypatch, slow)
+
+    async def scenario():
+        async with api() as c:
+            assert (await c.get("/api/weather/courchevel")).status_code == 504
+            assert (await c.post("/api/auth/session", json={"session_id": "abc"})).status_code == 504
+    run(scenario())
+
+
+def test_failures_within_the_deadline_keep_their_fallbacks(db, run, api, weather, monkeypatch):
+    async def refused():
+        raise httpx.ConnectError("refused")
+
+    outbound(monkeypatch, refused)
+
+    async def scenario():
+        async with api() as c:
+            weather_response = await c.get("/api/weather/courchevel")
+            session_response = await c.post("/api/auth/session", json={"session_id": "abc"})
+        assert weather_response.status_code == 200 and weather_response.json()["source"] != "openweathermap"
+        assert session_response.status_code == 401
+    run(scenario())
+
+
+@pytest.mark.parametrize("error, status", [(ExecutionTimeout("operation exceeded time limit", 50), 504),
+                                           (OperationFailure("boom", 2), 500)])
+def test_mongo_timeouts_are_504s_other_errors_500s(db, run, monkeypatch, error, status):
+    async def scenario():
+        lesson = await add_lesson(db, await add_instructor(db))
+
+        def failing(self, *args, **kwargs):
+            raise error
+
+        monkeypatch.setattr(type(db.lessons), "find", failing)
+        transport = httpx.ASGITransport(app=server.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+            response = await c.get(f"/api/lessons/{lesson['id']}")
+        assert response.status_code == status
+    run(scenario())
+
+
+def test_route_deadlines_override_the_default():
+    route = server.match_route(server._DEADLINE_ROUTES, "GET", "/api/admin/export")
+    assert server.ROUTE_DEADLINES[route] == 30
+    assert server.match_route(server._DEADLINE_ROUTES, "GET", "/api/lessons") is None
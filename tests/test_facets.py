@@ -0,0 +1,115 @@
+"""Facet counts and price histograms, checked against counts made in Python over the same rows"""
+import random
+from collections import Counter
+
+import pytest
+
+import server
+from tests.factories import add_instructor, add_lesson
+
+STATIONS = ("courchevel", "meribel", "tignes")
+LEVELS = ("Débutant", "Intermédiaire", "Expert")
+SPECIALTIES = ("Ski alpin", "Snowboard", "Freeride")
+
+
+async def world(db, seed=7):
+    rng = random.Random(seed)
+    instructors, lessons = [], []
+    for i in range(8):
+        instructors.append(await add_instructor(
+            db, station_id=rng.choice(STATIONS), hourly_rate=rng.choice((35.0, 40.0, 59.0, 60.0, 95.0, 150.0, 220.0)),
+            ski_levels=rng.sample(LEVELS, rng.randint(1, 3)), specialties=rng.sample(SPECIALTIES, rng.randint(1, 2)),
+            status="pending" if i == 7 else "approved"))
+    for instructor in instructors[:7]:
+        for _ in range(4):
+            lessons.append(await add_lesson(
+                db, instructor, lesson_type=rng.choice(("private", "group")), price=rng.choice((20.0, 50.0, 99.0, 300.0, 800.0)),
+                date=f"2030-01-{rng.randint(10, 20)}", status=rng.choice(("available", "available", "cancelled"))))
+    return instructors, lessons
+
+
+def histogram(values, boundaries):
+    """Buckets [low, high), the last one open-ended (every value here is >= the first boundary)"""
+    edges = boundaries + [None]
+    return [{"min": low, "max": high, "count": sum(1 for v in values if low <= v and (high is None or v < high))}
+            for low, high in zip(edges, edges[1:])]
+
+
+def counts(values):
+    return sorted(({"value": v, "count": c} for v, c in Counter(values).items()), key=lambda r: (-r["count"], r["value"]))
+
+
+@pytest.mark.parametrize("params", [{}, {"station_id": "meribel"}, {"level": "Expert", "max_price": 300}, {"lesson_type": "group"},
+                                    {"date_from": "2030-01-12", "date_to": "2030-01-15"}])
+def test_lesson_facets(db, run, api, params):
+    async def scenario():
+        instructors, lessons = await world(db)
+        by_id = {i["id"]: i for i in instructors}
+
+        def matches(lesson):
+            owner = by_id[lesson["instructor_id"]]
+            return (lesson["status"] == "available"
+                    and params.get("lesson_type", lesson["lesson_type"]) == lesson["lesson_type"]
+                    and params.get("station_id", owner["station_id"]) == owner["station_id"]
+                    and ("level" not in params or params["level"] in owner["ski_levels"])
+                    and lesson["price"] <= params.get("max_price", float("inf"))
+                    and params.get("date_from", "") <= lesson["date"] <= params.get("date_to", "9999"))
+
+        matching = [l for l in lessons if matches(l)]
+        async with api() as c:
+            body = (await c.get("/api/lessons/facets", params=params)).json()
+
+        assert body["total"] == len(matching)
+        owner = [by_id[l["instructor_id"]] for l in matching]
+        assert body["facets"] == {
+            "station_id": counts(i["station_id"] for i in owner),
+            "lesson_type": counts(l["lesson_type"] for l in matching),
+            "level": counts(level for i in owner for level in i["ski_levels"]),
+            "specialty": counts(s for i in owner for s in i["specialties"]),
+        }
+        assert body["price"] == histogram([l["price"] for l in matching], server.LESSON_PRICE_BUCKETS)
+        assert sum(bucket["count"] for bucket in body["price"]) == len(matching)
+    run(scenario())
+
+
+@pytest.mark.parametrize("params", [{}, {"status": "pending"}, {"specialty": "Snowboard"}, {"min_price": 40, "max_price": 100}])
+def test_instructor_facets(db, run, api, params):
+    async def scenario():
+        instructors, _ = await world(db)
+        matching = [i for i in instructors if i["status"] == params.get("status", "approved")
+                    and ("specialty" not in params or params["specialty"] in i["specialties"])
+                    and params.get("min_price", 0) <= i["hourly_rate"] <= params.get("max_price", float("inf"))]
+        async with api() as c:
+            body = (await c.get("/api/instructors/facets", params=params)).json()
+
+        assert body["total"] == len(matching)
+        assert body["facets"] == {
+            "station_id": counts(i["station_id"] for i in matching),
+            "level": counts(level for i in matching for level in i["ski_levels"]),
+            "specialty": counts(s for i in matching for s in i["specialties"]),
+        }
+        assert body["price"] == histogram([i["hourly_rate"] for i in matching], server.INSTRUCTOR_RATE_BUCKETS)
+    run(scenario())
+
+
+def test_no_match_gives_zero_counts(db, run, api):
+    async def scenario():
+        await world(db)
+        async with api() as c:
+            body = (await c.get("/api/lessons/facets", params={"station_id": "nowhere"})).json()
+        assert body["total"] == 0
+        assert all(not values for values in body["facets"].values())
+        assert [b["count"] for b in body["price"]] == [0] * len(server.LESSON_PRICE_BUCKETS)
+    run(scenario())
+
+
+def test_facets_follow_writes(db, run, api):
+    async def scenario():
+        instructors, _ = await world(db)
+        async with api() as c:
+            before = (await c.get("/api/lessons/facets")).json()["total"]
+            await add_lesson(db, instructors[0])
+            server.response_cache.invalidate("lessons")
+            after = (await c.get("/api/lessons/facets")).json()["total"]
+        assert after == before + 1
+    run(scenario())
@@ -0,0 +1,75 @@
+import gzip
+
+import server
+from tests.factories import add_instructor
+
+
+def test_etag_matches_weak_and_lists():
+    assert server.etag_matches('W/"abc"', 'W/"abc"')
+    assert server.etag_matches('"abc"', 'W/"abc"')
+    assert server.etag_matches('"x", W/"abc"', 'W/"abc"')
+    assert server.etag_matches("*", 'W/"abc"')
+    assert not server.etag_matches('W/"abd"', 'W/"abc"')
+    assert not server.etag_matches(None, 'W/"abc"')
+
+
+def test_pick_encoding_honours_q_zero():
+    assert server.pick_encoding("gzip, deflate") == "gzip"
+    assert server.pick_encoding("gzip;q=0, identity") is None
+    assert server.pick_encoding("identity") is None
+    if server.brotli is not None:
+        assert server.pick_encoding("gzip, br") == "br"
+
+
+def test_public_listing_revalidates_with_304(db, run, api):
+    async def scenario():
+        async with api() as client:
+            first = await client.get("/api/stations")
+            etag = first.headers["ETag"]
+            assert first.headers["Cache-Control"] == "public, max-age=86400"
+            assert etag.startswith('W/"')
+            again = await client.get("/api/stations", headers={"If-None-Match": etag})
+            assert again.status_code == 304
+            assert again.content == b""
+            assert again.headers["ETag"] == etag
+            stale = await client.get("/api/stations", headers={"If-None-Match": 'W/"old"'})
+            assert stale.status_code == 200
+    run(scenario())
+
+
+def test_etag_changes_with_the_body(db, run, api):
+    async def scenario():
+        await add_instructor(db, hourly_rate=50.0)
+        async with api() as client:
+            before = (await client.get("/api/instructors")).headers["ETag"]
+            await add_instructor(db, hourly_rate=70.0)
+            server.response_cache.invalidate("instructors")
+            after = await client.get("/api/instructors", headers={"If-None-Match": before})
+        assert after.status_code == 200
+        assert after.headers["ETag"] != before
+    run(scenario())
+
+
+def test_large_bodies_are_gzipped_small_ones_are_not(db, run, api):
+    async def scenario():
+        async with api() as client:
+            stations = await client.get("/api/stations", headers={"Accept-Encoding": "gzip"})
+            plain = await client.get("/api/stations", headers={"Accept-Encoding": "identity"})
+            missing = await client.get("/api/stations/nowhere", headers={"Accept-Encoding": "gzip"})
+        assert len(plain.content) >= server.COMPRESSION_MIN_SIZE
+        assert stations.headers["Content-Encoding"] == "gzip"
+        assert stations.headers["Vary"] == "Accept-Encoding"
+        assert stations.json() == plain.json()  # httpx decodes gzip
+        assert "Content-Encoding" not in plain.headers
+        assert missing.status_code == 404
+        assert "ETag" not in missing.headers
+        assert gzip.decompress(server.compress_body(plain.content, "gzip")) == plain.content
+    run(scenario())
+
+
+def test_private_routes_get_no_etag(db, run, api):
+    async def scenario():
+        async with api() as client:
+            response = await client.get("/api/health")
+        assert "ETag" not in response.headers
+    run(scenario())
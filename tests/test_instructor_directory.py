@@ -0,0 +1,150 @@
+"""InstructorDirectory.select against the Mongo query it stands in for"""
+import random
+
+import server
+from tests.factories import add_instructor, add_user
+
+STATIONS = ("courchevel", "meribel", "tignes", "")
+LEVELS = ("Débutant", "Intermédiaire", "Expert")
+SPECIALTIES = ("Ski alpin", "Snowboard", "Freeride", "Télémark")
+RATES = (35.0, 40.0, 45.0, 60.0, 60.0, 80.0, 99.5, 150.0)
+
+
+async def world(db, rng: random.Random, size=60):
+    for _ in range(size):
+        # Some profiles have no rate: null, or no field at all
+        rate = rng.choice(RATES + (None, None))
+        instructor = await add_instructor(db, station_id=rng.choice(STATIONS), hourly_rate=rate,
+                                          ski_levels=rng.sample(LEVELS, rng.randint(0, 3)),
+                                          specialties=rng.sample(SPECIALTIES, rng.randint(0, 3)),
+                                          status=rng.choice(("approved", "approved", "approved", "pending", "rejected")))
+        if rate is None and rng.random() < 0.5:
+            await db.instructors.update_one({"id": instructor["id"]}, {"$unset": {"hourly_rate": ""}})
+
+
+def random_filters(rng: random.Random) -> dict:
+    filters = {}
+    if rng.random() < 0.5:
+        filters["station_id"] = rng.choice(STATIONS[:-1] + ("unknown",))
+    if rng.random() < 0.4:
+        filters["specialty"] = rng.choice(SPECIALTIES)
+    if rng.random() < 0.4:
+        filters["level"] = rng.choice(LEVELS)
+    if rng.random() < 0.4:
+        filters["min_price"] = rng.choice(RATES + (0.0, 37.5, 200.0))
+    if rng.random() < 0.4:
+        filters["max_price"] = rng.choice(RATES + (0.0, 37.5, 200.0))
+    return filters
+
+
+async def mongo_ids(db, filters: dict, limit=100) -> list:
+    query = server.instructor_query(None, **filters)
+    cursor = db.instructors.find(query, {"id": 1}).sort([("hourly_rate", 1), ("id", 1)]).limit(limit)
+    return [i["id"] for i in await cursor.to_list(None)]
+
+
+def test_select_matches_the_mongo_filter(db, run):
+    async def scenario():
+        rng = random.Random(49)
+        await world(db, rng)
+        directory = server.InstructorDirectory()
+        await directory.build()
+        for _ in range(300):
+            filters = random_filters(rng)
+            selected = directory.select(**filters)
+            assert [i["id"] for i in selected] == await mongo_ids(db, filters), filters
+    run(scenario())
+
+
+def test_instructors_without_a_rate_only_match_unbounded_filters(db, run):
+    async def scenario():
+        free = await add_instructor(db, hourly_rate=0.0, id="a")
+        unset = await add_instructor(db, id="b")
+        await db.instructors.update_one({"id": "b"}, {"$unset": {"hourly_rate": ""}})
+        null = await add_instructor(db, hourly_rate=None, id="c")
+        rated = await add_instructor(db, hourly_rate=50.0, id="d")
+        directory = server.InstructorDirectory()
+        await directory.build()
+        for filters, expected in (({}, [unset, null, free, rated]),
+                                  ({"max_price": 60}, [free, rated]),
+                                  ({"min_price": 0}, [free, rated]),
+                                  ({"min_price": 10, "max_price": 60}, [rated])):
+            assert [i["id"] for i in directory.select(**filters)] == [i["id"] for i in expected], filters
+            assert await mongo_ids(db, filters) == [i["id"] for i in expected], filters
+    run(scenario())
+
+
+def test_limit_keeps_the_cheapest(db, run):
+    async def scenario():
+        await world(db, random.Random(1), size=40)
+        directory = server.InstructorDirectory()
+        await directory.build()
+        assert [i["id"] for i in directory.select(limit=7)] == await mongo_ids(db, {}, limit=7)
+    run(scenario())
+
+
+def test_entries_are_shaped_like_the_mongo_path(db, run, api, monkeypatch):
+    async def scenario():
+        await world(db, random.Random(2), size=15)
+        await server.instructor_directory.build()
+        async with api() as c:
+            from_directory = (await c.get("/api/instructors")).json()
+            monkeypatch.setattr(server, "INSTRUCTOR_DIRECTORY", False)
+            server.response_cache.clear()
+            from_mongo = (await c.get("/api/instructors")).json()
+        assert from_directory == from_mongo
+        assert from_directory and all("search" not in i and i["user"] for i in from_directory)
+    run(scenario())
+
+
+def test_cold_or_stale_directory_falls_back_and_rebuilds(db, run):
+    async def scenario():
+        user = await add_user(db, role="instructor", name="Jean")
+        instructor = await add_instructor(db, user)
+        directory = server.InstructorDirectory()
+        assert directory.select() is None  # cold: build scheduled
+        await directory._task
+        assert [i["id"] for i in directory.select()] == [instructor["id"]]
+
+        directory.on_invalidate(("lessons", "reviews:x"))
+        assert directory.select() is not None
+
+        await db.users.update_one({"id": user["id"]}, {"$set": {"name": "Jeanne"}})
+        directory.on_invalidate(("users",))
+        assert directory.select() is None
+        await directory._task
+        assert directory.select()[0]["user"]["name"] == "Jeanne"
+        assert directory.builds == 2
+    run(scenario())
+
+
+def test_write_during_a_build_leaves_it_stale(db, run, monkeypatch):
+    async def scenario():
+        await add_instructor(db)
+        directory = server.InstructorDirectory()
+        find_station = server.find_station
+
+        def write_then_find_station(station_id):
+            directory.on_invalidate(("instructors",))  # lands after the build has read the instructors
+            return find_station(station_id)
+
+        monkeypatch.setattr(server, "find_station", write_then_find_station)
+        await directory.build()
+        assert not directory.ready
+        monkeypatch.undo()
+        await directory.build()
+        assert directory.ready
+    run(scenario())
+
+
+def test_disabled_or_local_only_directory_never_answers(db, run, monkeypatch):
+    async def scenario():
+        directory = server.InstructorDirectory()
+        await directory.build()
+        assert directory.select() == []
+        monkeypatch.setattr(server.invalidation_bus, "local_only", True)
+        assert directory.select() is None
+        monkeypatch.undo()
+        monkeypatch.setattr(server, "INSTRUCTOR_DIRECTORY", False)
+        assert directory.select() is None
+    run(scenario())
@@ -0,0 +1,205 @@
+"""LESSON_ENGINE=numpy: LessonEngine.select/patch against the lesson_query() Mongo filter"""
+import random
+
+import pytest
+
+import server
+from tests.factories import add_instructor, add_lesson
+
+pytest.importorskip("numpy")
+
+STATIONS = ("courchevel", "meribel", "tignes")
+LEVELS = ("Débutant", "Intermédiaire", "Expert")
+TIMES = ("08:00", "09:00", "09:30", "10:00", "12:00", "14:00", "16:30")
+
+
+@pytest.fixture
+def engine(db, monkeypatch):
+    monkeypatch.setattr(server, "LESSON_ENGINE", "numpy")
+    return server.LessonEngine()
+
+
+async def world(db, rng: random.Random, lessons=150) -> list:
+    instructors = [await add_instructor(db, station_id=rng.choice(STATIONS), ski_levels=rng.sample(LEVELS, rng.randint(1, 3)))
+                   for _ in range(6)]
+    for _ in range(lessons):
+        max_participants = rng.choice((1, 4, 8))
+        await add_lesson(db, rng.choice(instructors), date=f"2030-01-{rng.randint(1, 20):02d}", start_time=rng.choice(TIMES),
+                         lesson_type=rng.choice(("private", "group")), price=rng.choice((40.0, 55.5, 60.0, 90.0, 120.0)),
+                         max_participants=max_participants, current_participants=rng.randint(0, max_participants),
+                         status=rng.choice(("available", "available", "available", "cancelled", "completed")))
+    return instructors
+
+
+def random_filters(rng: random.Random, instructors: list) -> dict:
+    pick = lambda probability: rng.random() < probability  # noqa: E731
+    return {
+        "instructor_id": rng.choice(instructors)["id"] if pick(0.15) else None,
+        "date": rng.choice(("2030-01-05", "2030-01-12", "2030-1-5", "2031-01-01")) if pick(0.15) else None,
+        "lesson_type": rng.choice(("private", "group", "other")) if pick(0.3) else None,
+        "station_id": rng.choice(STATIONS + ("unknown",)) if pick(0.3) else None,
+        "min_price": rng.choice((40.0, 55.5, 70.0)) if pick(0.3) else None,
+        "max_price": rng.choice((55.5, 60.0, 100.0)) if pick(0.3) else None,
+        "level": rng.choice(LEVELS + ("Compétition",)) if pick(0.3) else None,
+        "date_from": server.normalized_date(rng.choice(("2030-1-3", "2030-01-10", "2029-12-31"))) if pick(0.4) else None,
+        "date_to": server.normalized_date(rng.choice(("2030-1-8", "2030-01-15"))) if pick(0.4) else None,
+        "start_after": server.normalized_time(rng.choice(("9:00", "09:30", "12:00"))) if pick(0.3) else None,
+        "start_before": server.normalized_time(rng.choice(("10:00", "14:00", "16:30"))) if pick(0.3) else None,
+        "min_seats": rng.choice((1, 2, 5)) if pick(0.3) else None,
+    }
+
+
+async def mongo_ids(db, filters: dict, limit=100) -> list:
+    query = server.lesson_query(filters["instructor_id"], filters["date"], filters["lesson_type"], filters["min_price"],
+                                filters["max_price"], filters["station_id"], filters["level"],
+                                date_from=filters["date_from"], date_to=filters["date_to"],
+                                start_after=filters["start_after"], start_before=filters["start_before"],
+                                min_seats=filters["min_seats"])
+    cursor = db.lessons.find(query, {"id": 1}).sort(server.LESSON_SORT).limit(limit)
+    return [l["id"] for l in await cursor.to_list(None)]
+
+
+def test_select_matches_lesson_query(engine, db, run):
+    async def scenario():
+        rng = random.Random(50)
+        instructors = await world(db, rng)
+        await engine.build()
+        assert not engine.irregular
+        for _ in range(300):
+            filters = random_filters(rng, instructors)
+            selected = engine.select(**filters)
+            if selected is None:
+                assert filters["date"] == "2030-1-5"  # left to Mongo
+                continue
+            assert selected == await mongo_ids(db, filters), filters
+    run(scenario())
+
+
+def test_unpadded_exact_date_is_left_to_mongo(engine, db, run):
+    async def scenario():
+        instructor = await add_instructor(db)
+        await add_lesson(db, instructor, date="2030-01-05")
+        await engine.build()
+        assert engine.select(date="2030-1-5") is None  # Mongo compares the raw string
+        assert engine.select(date="demain") is None
+        assert len(engine.select(date="2030-01-05")) == 1
+    run(scenario())
+
+
+def test_patch_follows_bookings_and_cancellations(engine, db, run):
+    async def scenario():
+        instructor = await add_instructor(db)
+        group = await add_lesson(db, instructor, lesson_type="group", max_participants=2)
+        private = await add_lesson(db, instructor, start_time="14:00")
+        await engine.build()
+        assert engine.select(min_seats=2) == [group["id"]]
+
+        await db.lessons.update_one({"id": group["id"]}, {"$inc": {"current_participants": 1}})
+        await db.lessons.update_one({"id": private["id"]}, {"$set": {"status": "cancelled"}})
+        engine.on_invalidate((f"lesson:{group['id']}", f"lesson:{private['id']}"))
+        assert engine.select() is None  # pending patch: the caller goes to Mongo
+        await engine._task
+
+        assert engine.select() == [group["id"]]
+        assert engine.select(min_seats=2) == []
+        assert (engine.builds, engine.patches) == (1, 1)
+    run(scenario())
+
+
+def test_delete_without_pre_image_rebuilds(engine, db, run):
+    async def scenario():
+        instructor = await add_instructor(db)
+        kept = await add_lesson(db, instructor)
+        gone = await add_lesson(db, instructor, start_time="14:00")
+        await engine.build()
+
+        await db.lessons.delete_one({"id": gone["id"]})
+        engine.on_invalidate(tuple(server.change_tags({"ns": {"coll": "lessons"}, "operationType": "delete"})))
+        await engine._task
+        assert engine.select() == [kept["id"]]
+        assert (engine.builds, engine.patches) == (2, 0)
+    run(scenario())
+
+
+def test_new_lesson_is_inserted_in_sort_order(engine, db, run):
+    async def scenario():
+        instructor = await add_instructor(db)
+        late = await add_lesson(db, instructor, date="2030-01-06", id="b")
+        early = await add_lesson(db, instructor, date="2030-01-05", start_time="16:00", id="d")
+        await engine.build()
+
+        same_slot = await add_lesson(db, instructor, date="2030-01-06", id="a")
+        first = await add_lesson(db, instructor, date="2030-01-05", start_time="08:00", id="c")
+        await engine.patch([same_slot["id"], first["id"]])
+
+        assert engine.select() == [first["id"], early["id"], same_slot["id"], late["id"]]
+        assert engine.select(date_from="2030-01-06") == [same_slot["id"], late["id"]]
+    run(scenario())
+
+
+def test_legacy_rows_are_read_by_value(engine, db, run):
+    async def scenario():
+        instructor = await add_instructor(db)
+        regular = await add_lesson(db, instructor, start_time="10:00")
+        legacy = await add_lesson(db, instructor, date="2030-1-15", start_time="9:00", price="55")
+        await engine.build()
+        assert not engine.irregular
+        assert engine.select() == [legacy["id"], regular["id"]]
+        assert engine.select(start_before="09:30", max_price=60) == [legacy["id"]]
+    run(scenario())
+
+
+def test_unreadable_row_is_left_out_on_its_own(engine, db, run):
+    async def scenario():
+        instructor = await add_instructor(db)
+        regular = await add_lesson(db, instructor)
+        broken = await add_lesson(db, instructor, start_time="9h")
+        await engine.build()
+        assert engine.irregular == {broken["id"]}
+        assert engine.select() == [regular["id"]]
+
+        await db.lessons.update_one({"id": broken["id"]}, {"$set": {"start_time": "09:00"}})
+        await engine.patch([broken["id"]])
+        assert not engine.irregular
+        assert engine.select() == [broken["id"], regular["id"]]
+
+        await db.lessons.update_one({"id": regular["id"]}, {"$set": {"price": None}})
+        await engine.patch([regular["id"]])
+        assert engine.irregular == {regular["id"]}
+        assert engine.select() == [broken["id"]]
+    run(scenario())
+
+
+def test_page_stays_full_when_the_read_back_drops_rows(db, run, api, monkeypatch):
+    async def scenario():
+        instructor = await add_instructor(db)
+        for day in range(1, 26):
+            for hour in range(8, 18):
+                await add_lesson(db, instructor, date=f"2030-01-{day:02d}", start_time=f"{hour:02d}:00")
+        monkeypatch.setattr(server, "LESSON_ENGINE", "numpy")
+        server.response_cache.clear()
+        await server.lesson_engine._task
+        # Booked on another worker: the engine has not seen it yet
+        stale = [l["id"] for l in await db.lessons.find({}).sort(server.LESSON_SORT).limit(150).to_list(None)]
+        await db.lessons.update_many({"id": {"$in": stale}}, {"$set": {"status": "completed"}})
+        async with api() as c:
+            lessons = (await c.get("/api/lessons")).json()
+        assert len(lessons) == server.LESSON_PAGE_SIZE
+        assert not set(stale) & {l["id"] for l in lessons}
+        assert lessons[0]["date"] == "2030-01-16"
+    run(scenario())
+
+
+def test_list_lessons_is_the_same_with_and_without_the_engine(db, run, api, monkeypatch):
+    async def scenario():
+        await world(db, random.Random(5), lessons=40)
+        params = {"date_from": "2030-1-3", "start_after": "9:00", "min_seats": 1}
+        async with api() as c:
+            from_mongo = (await c.get("/api/lessons", params=params)).json()
+            monkeypatch.setattr(server, "LESSON_ENGINE", "numpy")
+            server.response_cache.clear()  # schedules a rebuild of the engine
+            await server.lesson_engine._task
+            assert server.lesson_engine.select() is not None
+            from_engine = (await c.get("/api/lessons", params=params)).json()
+        assert from_engine == from_mongo and from_engine
+    run(scenario())
@@ -0,0 +1,105 @@
+"""Date range and time-of-day filters of /api/lessons and their sort order"""
+import pytest
+from fastapi import HTTPException
+
+import server
+from tests.factories import add_instructor, add_lesson, add_session, add_user, bearer
+
+
+@pytest.mark.parametrize("value, expected", [("2030-1-5", "2030-01-05"), ("2030-01-05", "2030-01-05"), (None, None), ("", None)])
+def test_normalized_date(value, expected):
+    assert server.normalized_date(value) == expected
+
+
+@pytest.mark.parametrize("value, expected", [("9:00", "09:00"), ("9:5", "09:05"), ("14:30", "14:30")])
+def test_normalized_time(value, expected):
+    assert server.normalized_time(value) == expected
+
+
+@pytest.mark.parametrize("value", ["25:00", "9h", "12:60", "noon"])
+def test_invalid_time_is_a_400(value):
+    with pytest.raises(HTTPException) as raised:
+        server.normalized_time(value)
+    assert raised.value.status_code == 400
+
+
+def test_query_uses_normalized_bounds():
+    query = server.lesson_query(date_from="2030-1-5", date_to="2030-01-12", start_after="9:00", start_before="12:00")
+    assert query["date"] == {"$gte": "2030-01-05", "$lte": "2030-01-12"}
+    assert query["start_time"] == {"$gte": "09:00", "$lt": "12:00"}
+
+
+def test_exact_date_combines_with_a_range():
+    query = server.lesson_query(date="2030-01-07", date_from="2030-01-05")
+    assert query["date"] == {"$eq": "2030-01-07", "$gte": "2030-01-05"}
+
+
+@pytest.mark.parametrize("params", [{"date_from": "2030-13-01"}, {"date_to": "tomorrow"}, {"start_after": "25:00"},
+                                    {"start_before": "10h"}])
+def test_invalid_parameters_answer_400(db, run, api, params):
+    async def scenario():
+        async with api() as c:
+            response = await c.get("/api/lessons", params=params)
+        assert response.status_code == 400
+        assert "invalide" in response.json()["detail"]
+    run(scenario())
+
+
+def test_ranges_filter_and_results_are_sorted(db, run, api):
+    async def scenario():
+        instructor = await add_instructor(db)
+        rows = [("2030-01-06", "14:00"), ("2030-01-05", "10:00"), ("2030-01-05", "09:00"), ("2030-01-05", "12:00"),
+                ("2030-01-04", "10:00"), ("2030-01-08", "10:00"), ("2030-01-07", "08:59"), ("2030-01-06", "09:00")]
+        for date, start in rows:
+            await add_lesson(db, instructor, date=date, start_time=start)
+        await add_lesson(db, instructor, date="2030-01-06", start_time="10:00", id="b")
+        await add_lesson(db, instructor, date="2030-01-06", start_time="10:00", id="a")
+        await add_lesson(db, instructor, date="2030-01-06", start_time="10:30", status="cancelled")
+
+        async with api() as c:
+            response = await c.get("/api/lessons", params={"date_from": "2030-1-5", "date_to": "2030-01-07",
+                                                           "start_after": "9:00", "start_before": "12:00"})
+        assert response.status_code == 200
+        assert [(l["date"], l["start_time"], l["id"] if l["id"] in "ab" else "") for l in response.json()] == [
+            ("2030-01-05", "09:00", ""), ("2030-01-05", "10:00", ""), ("2030-01-06", "09:00", ""),
+            ("2030-01-06", "10:00", "a"), ("2030-01-06", "10:00", "b"),
+        ]
+    run(scenario())
+
+
+def test_unfiltered_list_is_sorted_by_date_start_and_id(db, run, api):
+    async def scenario():
+        instructor = await add_instructor(db)
+        for date, start, lesson_id in (("2030-02-01", "09:00", "c"), ("2030-01-01", "15:00", "b"),
+                                       ("2030-01-01", "15:00", "a"), ("2030-01-01", "08:00", "d")):
+            await add_lesson(db, instructor, date=date, start_time=start, id=lesson_id)
+        async with api() as c:
+            lessons = (await c.get("/api/lessons")).json()
+        assert [l["id"] for l in lessons] == ["d", "a", "b", "c"]
+    run(scenario())
+
+
+def test_lesson_created_with_unpadded_values_matches_the_filters(db, run, api):
+    async def scenario():
+        user = await add_user(db, role="instructor")
+        await add_instructor(db, user)
+        async with api() as c:
+            created = await c.post("/api/lessons", headers=bearer(await add_session(db, user)), json={
+                "lesson_type": "private", "title": "Cours", "date": "2030-1-5", "start_time": "9:00",
+                "end_time": "10:00", "price": 60.0})
+            assert created.status_code == 200
+            found = (await c.get("/api/lessons", params={"start_before": "10:00", "start_after": "08:30",
+                                                         "date_from": "2030-01-05", "date_to": "2030-01-05"})).json()
+        assert [l["id"] for l in found] == [created.json()["id"]]
+    run(scenario())
+
+
+@pytest.mark.real_mongo
+def test_sort_is_served_by_the_index(db, run):
+    async def scenario():
+        await server.ensure_date_indexes()
+        query = server.lesson_query(date_from="2030-01-05", date_to="2030-01-12", start_after="09:00")
+        plan = await db.lessons.find(query).sort(server.LESSON_SORT).explain()
+        winning = str(plan["queryPlanner"]["winningPlan"])
+        assert "IXSCAN" in winning and "SORT" not in winning.replace("SORT_KEY", "")
+    run(scenario())
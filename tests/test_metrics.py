@@ -0,0 +1,40 @@
+import server
+
+
+def test_metrics_are_disabled_without_a_token(db, run, api, monkeypatch):
+    monkeypatch.delenv("METRICS_TOKEN", raising=False)
+
+    async def scenario():
+        async with api() as client:
+            response = await client.get("/api/metrics")
+        assert response.status_code == 404
+    run(scenario())
+
+
+def test_metrics_require_the_bearer_token(db, run, api, monkeypatch):
+    monkeypatch.setenv("METRICS_TOKEN", "scrape-me")
+
+    async def scenario():
+        async with api() as client:
+            await client.get("/api/stations")
+            missing = await client.get("/api/metrics")
+            wrong = await client.get("/api/metrics", headers={"Authorization": "Bearer nope"})
+            ok = await client.get("/api/metrics", headers={"Authorization": "Bearer scrape-me"})
+        assert missing.status_code == wrong.status_code == 403
+        assert ok.status_code == 200
+        assert 'http_requests_total{method="GET",route="/api/stations",status="200"}' in ok.text
+        assert "response_cache_lookups_total" in ok.text
+    run(scenario())
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = server.MetricsRegistry()
+    histogram = registry.register(server.Histogram("demo_seconds", "Demo", ("route",), buckets=(0.01, 0.5)))
+    histogram.observe(("/a",), 0.003)
+    histogram.observe(("/a",), 0.2)
+    text = registry.render()
+    assert "# TYPE demo_seconds histogram" in text
+    assert 'demo_seconds_bucket{route="/a",le="0.01"} 1' in text
+    assert 'demo_seconds_bucket{route="/a",le="0.5"} 2' in text
+    assert 'demo_seconds_bucket{route="/a",le="+Inf"} 2' in text
+    assert 'demo_seconds_count{route="/a"} 2' in text
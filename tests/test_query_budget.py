@@ -0,0 +1,103 @@
+"""Mongo commands per request for the list endpoints, pinned so an N+1 shows up as a failure.
+
+Each endpoint is measured with a few rows and with ten times as many: the
+count must be the pinned one both times, i.e. independent of the page size.
+"""
+import pytest
+
+import server
+from tests.factories import add_instructor, add_lesson, add_session, add_user, bearer
+
+SIZES = (3, 30)
+
+
+async def world(db, size: int) -> dict:
+    """`size` approved instructors with two lessons each, one client booked on each lesson,
+    `size` reviews of the first instructor and `size` pending applications"""
+    client = await add_user(db)
+    instructors, lessons = [], []
+    for i in range(size):
+        instructor = await add_instructor(db, hourly_rate=40.0 + i)
+        instructors.append(instructor)
+        for start in ("09:00", "14:00"):
+            lessons.append(await add_lesson(db, instructor, start_time=start, lesson_type="group", max_participants=8))
+    for lesson in lessons:
+        await db.bookings.insert_one(server.Booking(lesson_id=lesson["id"], user_id=client["id"]).model_dump())
+    for i in range(size):
+        await add_instructor(db, status="pending")
+        reviewer = await add_user(db)
+        await db.reviews.insert_one(server.Review(instructor_id=instructors[0]["id"], user_id=reviewer["id"],
+                                                  rating=1 + i % 5).model_dump())
+    admin = await add_user(db, role="admin")
+    return {
+        "client": await add_session(db, client),
+        "instructor": await add_session(db, {"id": instructors[0]["user_id"]}),
+        "admin": await add_session(db, admin),
+        "instructor_id": instructors[0]["id"],
+    }
+
+
+ENDPOINTS = [
+    # (path, session, pinned Mongo commands)
+    ("/api/instructors", None, 2),                             # instructors, users
+    ("/api/lessons", None, 3),                                 # lessons, instructors, users
+    ("/api/lessons/facets", None, 1),                          # one $facet aggregation
+    ("/api/instructors/facets", None, 1),
+    ("/api/reviews?instructor_id={instructor_id}", None, 2),   # reviews, users
+    ("/api/bookings", "client", 6),                            # session, user, bookings, lessons, instructors, users
+    ("/api/my-lessons", "instructor", 6),                      # session, user, instructor, lessons, bookings, users
+    ("/api/admin/pending-instructors", "admin", 4),            # session, user, instructors, users
+]
+
+
+@pytest.mark.parametrize("path,session,pinned", ENDPOINTS, ids=[e[0] for e in ENDPOINTS])
+def test_list_endpoint_query_count_is_pinned(db, run, api, monkeypatch, path, session, pinned):
+    monkeypatch.setattr(server, "INSTRUCTOR_DIRECTORY", False)  # measure the Mongo path
+
+    async def scenario():
+        counts = []
+        for size in SIZES:
+            for name in await db.list_collection_names():
+                await db.drop_collection(name)
+            server.response_cache.clear()
+            ids = await world(db, size)
+            headers = bearer(ids[session]) if session else {}
+            async with api() as client:
+                with server.query_budget(pinned) as stats:
+                    response = await client.get(path.format(**ids), headers=headers)
+            assert response.status_code == 200, response.text
+            counts.append(stats.count)
+        assert counts == [pinned] * len(SIZES)
+    run(scenario())
+
+
+def test_query_budget_fails_the_block_when_exceeded(db, run, api):
+    async def scenario():
+        await world(db, 3)
+        async with api() as client:
+            with pytest.raises(AssertionError, match="budget de 1"):
+                with server.query_budget(1):
+                    await client.get("/api/lessons")
+    run(scenario())
+
+
+def test_cached_responses_issue_no_query(db, run, api):
+    async def scenario():
+        await world(db, 3)
+        async with api() as client:
+            await client.get("/api/lessons")
+            with server.query_budget(0):
+                response = await client.get("/api/lessons")
+        assert response.headers["X-DB-Queries"] == "0"
+    run(scenario())
+
+
+def test_over_budget_requests_are_logged(db, run, api, monkeypatch, caplog):
+    monkeypatch.setitem(server.QUERY_BUDGETS, "GET /api/lessons", 1)
+
+    async def scenario():
+        await world(db, 3)
+        async with api() as client:
+            await client.get("/api/lessons")
+    run(scenario())
+    assert "Query budget exceeded on GET /api/lessons" in caplog.text
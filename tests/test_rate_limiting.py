@@ -0,0 +1,132 @@
+"""Client keys and token buckets of the admission control middleware"""
+import ipaddress
+import uuid
+
+import pytest
+
+import server
+from tests.factories import add_instructor, add_lesson, add_session, add_user, bearer
+
+
+def request(peer="203.0.113.7", token=None, forwarded=()):
+    headers = [(b"x-forwarded-for", hop.encode()) for hop in forwarded]
+    if token:
+        headers.append((b"authorization", f"Bearer {token}".encode()))
+    return server.Request({"type": "http", "headers": headers, "client": (peer, 4321)})
+
+
+@pytest.fixture
+def proxies(monkeypatch):
+    monkeypatch.setattr(server, "TRUSTED_PROXIES", [ipaddress.ip_network("10.0.0.0/8")])
+
+
+def test_unverified_tokens_share_the_ip_bucket(db):
+    keys = {server.client_key(request(token=uuid.uuid4().hex)) for _ in range(5)}
+    keys.add(server.client_key(request(token="forged.token")))
+    assert keys == {"ip:203.0.113.7"}
+
+
+def test_verified_opaque_session_gets_a_user_key(db, run, api):
+    async def scenario():
+        user = await add_user(db)
+        token = await add_session(db, user)
+        assert server.client_key(request(token=token)) == "ip:203.0.113.7"
+        async with api() as c:
+            assert (await c.get("/api/auth/me", headers=bearer(token))).status_code == 200
+        assert server.client_key(request(token=token)) == f"user:{user['id']}"
+        assert server.client_key(request(peer="198.51.100.1", token=token)) == f"user:{user['id']}"
+    run(scenario())
+
+
+def test_signed_session_gets_a_user_key(db, monkeypatch):
+    monkeypatch.setattr(server, "SESSION_MODE", "signed")
+    monkeypatch.setattr(server, "SESSION_SECRET", "s" * 32)
+    user = server.User(email="alice@example.com", name="Alice")
+    token = server.sign_session(user)
+    assert server.client_key(request(token=token)) == f"user:{user.id}"
+    assert server.client_key(request(token=token[:-1] + "x")) == "ip:203.0.113.7"
+
+
+def test_forwarded_for_is_ignored_from_untrusted_peers(proxies):
+    assert server.client_ip(request(forwarded=["1.2.3.4"])) == "203.0.113.7"
+
+
+def test_forwarded_for_from_trusted_proxies(proxies):
+    # The client may prepend anything; the first hop not added by our proxies is the client
+    assert server.client_ip(request(peer="10.0.0.2", forwarded=["6.6.6.6, 1.2.3.4"])) == "1.2.3.4"
+    assert server.client_ip(request(peer="10.0.0.2", forwarded=["6.6.6.6, 1.2.3.4", "10.0.0.9"])) == "1.2.3.4"
+    assert server.client_ip(request(peer="10.0.0.2", forwarded=["10.0.0.9"])) == "10.0.0.9"
+    assert server.client_ip(request(peer="10.0.0.2", forwarded=["garbage"])) == "garbage"
+    assert server.client_ip(request(peer="10.0.0.2")) == "10.0.0.2"
+
+
+def test_bucket_refills_over_time(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: now[0])
+    limiter = server.RateLimiter(rate=2, burst=4, max_clients=10)
+    assert [limiter.acquire("a", 1) for _ in range(4)] == [0, 0, 0, 0]
+    assert limiter.acquire("a", 1) == pytest.approx(0.5)
+    assert limiter.acquire("b", 1) == 0
+    now[0] += 1
+    assert limiter.acquire("a", 2) == 0
+    assert limiter.acquire("a", 1) > 0
+
+
+def test_least_recently_seen_clients_are_forgotten():
+    limiter = server.RateLimiter(rate=1, burst=1, max_clients=2)
+    for key in ("a", "b", "a", "c"):
+        limiter.acquire(key, 1)
+    assert list(limiter._buckets) == ["a", "c"]
+
+
+def test_middleware_answers_429_with_retry_after(db, run, api, monkeypatch):
+    monkeypatch.setattr(server, "ADMISSION_CONTROL", True)
+    monkeypatch.setattr(server, "rate_limiter", server.RateLimiter(rate=0.5, burst=3, max_clients=10))
+
+    async def scenario():
+        async with api() as c:
+            statuses = [(await c.get("/api/stations")).status_code for _ in range(4)]
+            throttled = await c.get("/api/stations", headers=bearer(uuid.uuid4().hex))
+            health = await c.get("/api/health")
+        assert statuses == [200, 200, 200, 429]
+        assert throttled.status_code == 429 and int(throttled.headers["Retry-After"]) >= 1
+        assert health.status_code == 200
+    run(scenario())
+
+
+def test_clients_behind_one_ip_can_book(db, run, api, monkeypatch):
+    monkeypatch.setattr(server, "ADMISSION_CONTROL", True)
+    monkeypatch.setattr(server, "rate_limiter", server.RateLimiter(rate=0.001, burst=3, max_clients=100))
+
+    async def scenario():
+        lesson = await add_lesson(db, await add_instructor(db), lesson_type="group", max_participants=10)
+        tokens = [await add_session(db, await add_user(db)) for _ in range(8)]
+        async with api() as c:
+            assert [(await c.get("/api/stations")).status_code for _ in range(4)][-1] == 429  # the IP is spent
+            booked = [await c.post("/api/bookings", headers=bearer(token), json={"lesson_id": lesson["id"]})
+                      for token in tokens]
+            forged = await c.post("/api/bookings", headers=bearer(uuid.uuid4().hex), json={"lesson_id": lesson["id"]})
+        assert [r.status_code for r in booked] == [200] * 8
+        assert forged.status_code == 429
+        assert set(server.rate_limiter._buckets) >= {f"user:{server.session_owners.get(t)}" for t in tokens}
+    run(scenario())
+
+
+def test_session_checks_are_limited_per_ip(db, run, api, monkeypatch):
+    monkeypatch.setattr(server, "ADMISSION_CONTROL", True)
+    monkeypatch.setattr(server, "rate_limiter", server.RateLimiter(rate=0.001, burst=1, max_clients=100))
+    monkeypatch.setattr(server, "session_checks", server.RateLimiter(rate=0.001, burst=2, max_clients=100))
+    lookups = []
+    verify = server.get_session_from_request
+
+    async def counted(request):
+        lookups.append(request.url.path)
+        return await verify(request)
+    monkeypatch.setattr(server, "get_session_from_request", counted)
+
+    async def scenario():
+        async with api() as c:
+            statuses = [(await c.get("/api/stations", headers=bearer(uuid.uuid4().hex))).status_code for _ in range(6)]
+        assert statuses == [200] + [429] * 5
+        assert len(lookups) == 2
+    run(scenario())
@@ -0,0 +1,68 @@
+import pytest
+from pymongo.read_preferences import Primary, Secondary, SecondaryPreferred
+
+import server
+from tests.factories import add_instructor, add_session, add_user, bearer
+
+
+def test_overrides_replace_and_extend_the_analytics_defaults():
+    preferences = server.parse_read_preferences(
+        " GET /api/admin/export = secondary ;GET /api/admin/stats=primary;; GET  /api/lessons=nearest;GET /api/x=",
+        analytics="secondaryPreferred")
+    assert preferences["GET /api/admin/export"] == "secondary"
+    assert preferences["GET /api/admin/stats"] == "primary"
+    assert preferences["GET /api/lessons"] == "nearest"
+    assert preferences["GET /api/instructor/stats"] == "secondaryPreferred"
+    assert "GET /api/x" not in preferences
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError, match="secondaryOnly"):
+        server.parse_read_preferences("GET /api/admin/stats=secondaryOnly")
+    with pytest.raises(ValueError):
+        server.parse_read_preferences("", analytics="slave")
+
+
+def test_max_staleness_is_floored_at_the_mongodb_minimum():
+    assert server.read_preference("secondary", 30).max_staleness == 90
+    assert server.read_preference("nearest", 300).max_staleness == 300
+    assert isinstance(server.read_preference("primary", 30), Primary)
+
+
+def test_analytics_routes_read_from_secondaries(monkeypatch):
+    monkeypatch.setattr(server, "READ_PREFERENCES", server.parse_read_preferences(
+        "GET /api/admin/export=secondary", analytics="secondaryPreferred"))
+    monkeypatch.setattr(server, "_read_dbs", {"primary": server.db})
+    for route in server.ANALYTICS_ROUTES:
+        preference = server.read_db(route).payment_transactions.read_preference
+        expected = Secondary if route == "GET /api/admin/export" else SecondaryPreferred
+        assert isinstance(preference, expected), route
+        assert preference.max_staleness == server.READ_MAX_STALENESS_SECONDS
+    for route in ("POST /api/bookings", "POST /api/payments/checkout", "GET /api/auth/me", "GET /api/lessons"):
+        assert server.read_db(route) is server.db
+        assert isinstance(server.read_db(route).bookings.read_preference, Primary)
+
+
+def test_routed_names_match_real_routes():
+    routes = {f"{method} {route.path}" for route in server.app.routes for method in getattr(route, "methods", ())}
+    assert set(server.ANALYTICS_ROUTES) <= routes
+
+
+def test_each_analytics_handler_asks_for_its_own_route(db, run, api, monkeypatch):
+    asked = []
+    monkeypatch.setattr(server, "read_db", lambda route: asked.append(route) or db)
+
+    async def scenario():
+        admin = bearer(await add_session(db, await add_user(db, role="admin")))
+        user = await add_user(db, role="instructor")
+        await add_instructor(db, user)
+        instructor = bearer(await add_session(db, user))
+        async with api() as c:
+            for path, headers in (("/api/admin/stats", admin), ("/api/admin/transactions", admin),
+                                  ("/api/admin/export", admin), ("/api/instructor/stats", instructor),
+                                  ("/api/instructor/export", instructor)):
+                asked.clear()
+                response = await c.get(path, headers=headers)
+                assert response.status_code == 200, (path, response.text)
+                assert asked == [f"GET {path}"]
+    run(scenario())
@@ -0,0 +1,253 @@
+import asyncio
+
+import pytest
+from pymongo.errors import AutoReconnect, OperationFailure
+
+import server
+from tests.factories import add_instructor, add_lesson
+
+
+def test_invalidate_drops_only_tagged_entries():
+    cache = server.ResponseCache(max_entries=10, max_bytes=1000, ttl=60)
+    cache.set("a", "a?1", b"one", ["lessons", "lesson:1"])
+    cache.set("a", "a?2", b"two", ["lessons", "lesson:2"])
+    cache.set("b", "b?", b"three", ["instructors"])
+    cache.invalidate("lesson:1")
+    assert cache.get("a", "a?1") is None
+    assert cache.get("a", "a?2") == b"two"
+    cache.invalidate("lessons")
+    assert cache.get("a", "a?2") is None
+    assert cache.get("b", "b?") == b"three"
+    assert cache.size == len(b"three")
+
+
+def test_lru_eviction_and_byte_limit():
+    cache = server.ResponseCache(max_entries=2, max_bytes=10, ttl=60)
+    cache.set("e", "e?1", b"1111", [])
+    cache.set("e", "e?2", b"2222", [])
+    cache.get("e", "e?1")  # most recently used
+    cache.set("e", "e?3", b"3333", [])
+    assert cache.get("e", "e?2") is None
+    assert cache.get("e", "e?1") == b"1111"
+    cache.set("e", "e?big", b"x" * 11, [])  # larger than the whole cache: never stored
+    assert cache.get("e", "e?big") is None
+    assert cache.stats["e"]["evictions"] == 1
+
+
+def test_expired_entries_are_misses():
+    cache = server.ResponseCache(max_entries=10, max_bytes=1000, ttl=60)
+    cache.set("t", "t?", b"body", [], ttl=-1)
+    assert cache.get("t", "t?") is None
+    assert cache.stats["t"] == {"hits": 0, "misses": 1, "evictions": 0}
+
+
+def test_listeners_see_invalidations_and_clears():
+    cache = server.ResponseCache(max_entries=10, max_bytes=1000, ttl=60)
+    seen = []
+    cache.listeners.append(seen.append)
+    cache.invalidate("lessons", "lesson:1")
+    cache.clear()
+    assert seen == [("lessons", "lesson:1"), None]
+
+
+def test_change_tags_for_each_collection():
+    def change(coll, doc):
+        return {"ns": {"coll": coll}, "fullDocument": doc}
+    assert server.change_tags(change("lessons", {"id": "l1"})) == ["lessons", "lesson:l1"]
+    assert server.change_tags(change("bookings", {"lesson_id": "l1"})) == ["lessons", "lesson:l1"]
+    assert server.change_tags(change("instructors", {"id": "i1"})) == ["instructors", "instructor:i1"]
+    assert server.change_tags(change("reviews", {"instructor_id": "i1"})) == ["reviews:i1"]
+    assert server.change_tags(change("payments", {"id": "p1"})) is None
+
+
+def test_deletes_are_tagged_from_their_pre_image():
+    def delete(coll, before=None):
+        return {"ns": {"coll": coll}, "operationType": "delete", "fullDocumentBeforeChange": before}
+    assert server.change_tags(delete("lessons", {"id": "l1"})) == ["lessons", "lesson:l1"]
+    assert server.change_tags(delete("reviews", {"instructor_id": "i1"})) == ["reviews:i1"]
+    # Without pre-images: every tag of that collection, and nothing else
+    assert server.change_tags(delete("lessons")) == ["lessons", "lesson:*"]
+    assert server.change_tags(delete("bookings")) == ["lessons", "lesson:*"]
+    assert server.change_tags(delete("reviews")) == ["reviews:*"]
+
+
+def test_wildcard_invalidation_stays_within_its_prefix():
+    cache = server.ResponseCache(max_entries=10, max_bytes=1000, ttl=60)
+    cache.set("l", "l?1", b"1", ["lesson:l1"])
+    cache.set("l", "l?2", b"2", ["lesson:l2", "instructor:i1"])
+    cache.set("r", "r?", b"3", ["reviews:i1"])
+    cache.set("i", "i?", b"4", ["instructor:i1"])
+    cache.invalidate("lesson:*")
+    assert cache.get("l", "l?1") is None and cache.get("l", "l?2") is None
+    assert cache.get("r", "r?") == b"3" and cache.get("i", "i?") == b"4"
+    assert cache.size == 2
+
+
+def test_bus_applies_change_events_to_the_cache():
+    cache = server.ResponseCache(max_entries=10, max_bytes=1000, ttl=60)
+    bus = server.CacheInvalidationBus(cache)
+    cache.set("l", "l?1", b"1", ["lesson:l1"])
+    cache.set("l", "l?2", b"2", ["lesson:l2"])
+    bus.apply({"ns": {"coll": "bookings"}, "fullDocument": {"lesson_id": "l1"}})
+    assert cache.get("l", "l?1") is None
+    assert cache.get("l", "l?2") == b"2"
+    cache.set("r", "r?", b"3", ["reviews:i1"])
+    bus.apply({"ns": {"coll": "lessons"}, "operationType": "delete"})
+    assert cache.get("l", "l?2") is None
+    assert cache.get("r", "r?") == b"3"
+
+
+def bus_in_mode(monkeypatch, mode, workers=1, supported=False):
+    monkeypatch.setattr(server, "CACHE_INVALIDATION", mode)
+    monkeypatch.setattr(server, "WEB_CONCURRENCY", workers)
+    bus = server.CacheInvalidationBus(server.ResponseCache(max_entries=10, max_bytes=1000, ttl=60))
+
+    async def hello():
+        assert mode != "off", "off must not contact the server"
+        return supported
+    monkeypatch.setattr(bus, "supported", hello)
+    return bus
+
+
+def test_off_mode_never_starts(run, monkeypatch):
+    bus = bus_in_mode(monkeypatch, "off", workers=4)
+    run(bus.start())
+    assert not bus.running and not bus.local_only and bus.cache.max_entries == 10
+
+
+def test_on_mode_refuses_to_start_without_change_streams(run, monkeypatch):
+    bus = bus_in_mode(monkeypatch, "on")
+    with pytest.raises(RuntimeError, match="replica set"):
+        run(bus.start())
+
+
+def test_auto_mode_with_one_worker_keeps_the_cache(run, monkeypatch):
+    bus = bus_in_mode(monkeypatch, "auto")
+    run(bus.start())
+    assert not bus.running and not bus.local_only and bus.cache.max_entries == 10
+
+
+def test_auto_mode_with_several_workers_disables_the_cache(run, monkeypatch):
+    bus = bus_in_mode(monkeypatch, "auto", workers=3)
+    run(bus.start())
+    assert bus.local_only and not bus.running
+    bus.cache.set("l", "l?", b"body", ["lessons"])
+    assert bus.cache.get("l", "l?") is None
+
+
+class FakeStream:
+    """Yields (resume token, change) pairs, then raises `error` (or waits forever)"""
+
+    def __init__(self, events, error=None):
+        self.events, self.error, self.resume_token = events, error, None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        for token, change in self.events:
+            self.resume_token = token
+            yield change
+        if self.error is None:
+            await asyncio.Event().wait()
+        raise self.error
+
+
+class FakeDatabase:
+    def __init__(self, cache, streams):
+        self.cache, self.streams, self.watches, self.modified = cache, streams, [], []
+
+    async def list_collection_names(self, filter=None):
+        return [filter["name"]]
+
+    async def command(self, name, collection, **options):
+        self.modified.append((name, collection, options))
+
+    def watch(self, pipeline, **options):
+        self.watches.append({**options, "cached": sorted(self.cache._entries)})
+        return self.streams.pop(0)
+
+
+def test_watch_loop_resumes_after_errors(run, monkeypatch):
+    bus = bus_in_mode(monkeypatch, "auto", workers=2, supported=True)
+    cache = bus.cache
+    for lesson in ("l1", "l2", "l3"):
+        cache.set("l", f"l?{lesson}", b"x", [f"lesson:{lesson}"])
+    fake = FakeDatabase(cache, [
+        FakeStream([("t1", {"ns": {"coll": "lessons"}, "fullDocument": {"id": "l1"}})], AutoReconnect("primary stepped down")),
+        FakeStream([("t2", {"ns": {"coll": "lessons"}, "operationType": "delete", "fullDocument": None,
+                            "fullDocumentBeforeChange": {"id": "l2"}})],
+                   OperationFailure("resume point no longer in the oplog", code=286)),
+        FakeStream([]),
+    ])
+    monkeypatch.setattr(server, "db", fake)
+    sleep = asyncio.sleep
+
+    async def no_backoff(delay, *args):
+        await sleep(0)
+    monkeypatch.setattr(server.asyncio, "sleep", no_backoff)
+
+    async def scenario():
+        await bus.start()
+        while len(fake.watches) < 3:
+            await sleep(0)
+        assert bus.running
+        await bus.stop()
+    run(scenario())
+
+    assert bus.pre_images and not bus.local_only
+    assert {collection for _, collection, _ in fake.modified} == set(server.WATCHED_COLLECTIONS)
+    first, resumed, restarted = fake.watches
+    assert first["resume_after"] is None and first["full_document_before_change"] == "whenAvailable"
+    # After a network error: resumed from the last event, which evicted l1 only
+    assert resumed["resume_after"] == "t1" and resumed["cached"] == ["l?l2", "l?l3"]
+    # After a lost resume point: started over with an emptied cache
+    assert restarted["resume_after"] is None and restarted["cached"] == []
+    assert bus.events == 2 and bus.restarts == 2
+
+
+def test_cached_listing_is_served_until_a_write_invalidates_it(db, run, api):
+    async def scenario():
+        instructor = await add_instructor(db)
+        lesson = await add_lesson(db, instructor)
+        async with api() as client:
+            first = (await client.get("/api/lessons")).json()
+            await db.lessons.update_one({"id": lesson["id"]}, {"$set": {"title": "Nouveau titre"}})
+            cached = await client.get("/api/lessons")
+            assert cached.json() == first
+            assert cached.headers["X-DB-Queries"] == "0"
+            server.response_cache.invalidate(f"lesson:{lesson['id']}")
+            assert (await client.get("/api/lessons")).json() == first  # tagged "lessons", not per lesson
+            server.response_cache.invalidate("lessons")
+            assert (await client.get("/api/lessons")).json()[0]["title"] == "Nouveau titre"
+    run(scenario())
+
+
+def test_response_racing_with_a_write_is_not_stored(db, run):
+    calls = []
+
+    @server.cached_response("race", lambda **_: ["lessons"])
+    async def handler(value=None):
+        calls.append(value)
+        # A write lands while the handler is still reading
+        server.response_cache.invalidate("lessons")
+        return {"value": value}
+
+    async def scenario():
+        await handler(value="x")
+        await handler(value="x")
+        assert calls == ["x", "x"]
+
+        @server.cached_response("calm", lambda **_: ["lessons"])
+        async def calm(value=None):
+            calls.append(value)
+            await asyncio.sleep(0)
+            return {"value": value}
+
+        await calm(value="y")
+        await calm(value="y")
+        assert calls == ["x", "x", "y"]
+    run(scenario())
@@ -0,0 +1,109 @@
+"""/api/search ($text) and the `near` distance filters ($geoNear).
+
+The in-memory MongoDB has neither operator: only parameter validation runs
+without TEST_MONGO_URL.
+"""
+import pytest
+
+import server
+from tests.factories import add_instructor, add_lesson, add_user
+
+COURCHEVEL = "45.4167,6.6333"
+
+
+@pytest.mark.parametrize("path, params, status", [
+    ("/api/search", {"q": "a"}, 422),
+    ("/api/search", {"q": "x" * 101}, 422),
+    ("/api/search", {"q": "ski", "kind": "stations"}, 422),
+    ("/api/search", {"q": "ski", "page": 0}, 422),
+    ("/api/search", {"q": "ski", "page_size": 51}, 422),
+    ("/api/search", {}, 422),
+    ("/api/instructors", {"near": "45.4"}, 400),
+    ("/api/instructors", {"near": "nord,est"}, 400),
+    ("/api/lessons", {"near": "91,6.6"}, 400),
+    ("/api/stations", {"near": "45.4,181"}, 400),
+    ("/api/stations", {"near": COURCHEVEL, "radius_km": 0}, 422),
+    ("/api/lessons", {"near": COURCHEVEL, "radius_km": 501}, 422),
+])
+def test_invalid_parameters(db, run, api, path, params, status):
+    async def scenario():
+        async with api() as c:
+            response = await c.get(path, params=params)
+        assert response.status_code == status
+    run(scenario())
+
+
+@pytest.fixture
+def indexed(db, run):
+    async def setup():
+        await server.ensure_search_indexes()
+        await server.ensure_geo_indexes()
+        await server.sync_stations()
+    run(setup())
+    return db
+
+
+@pytest.mark.real_mongo
+def test_results_are_ranked_by_relevance(indexed, run, api):
+    async def scenario():
+        db = indexed
+        named = await add_instructor(db, await add_user(db, role="instructor", name="Freeride Martin"),
+                                     specialties=("Freeride",))
+        mentioned = await add_instructor(db, bio="Un peu de freeride le week-end")
+        await add_instructor(db, bio="Ski alpin uniquement")
+        await add_instructor(db, await add_user(db, role="instructor", name="Freeride Pending"), status="pending")
+        title = await add_lesson(db, mentioned, title="Stage freeride hors-piste")
+        await add_lesson(db, mentioned, title="Cours débutant", description="On parlera de freeride")
+        await add_lesson(db, mentioned, title="Stage freeride annulé", status="cancelled")
+
+        async with api() as c:
+            body = (await c.get("/api/search", params={"q": "freeride"})).json()
+        instructors, lessons = body["instructors"], body["lessons"]
+        assert [i["id"] for i in instructors["results"]] == [named["id"], mentioned["id"]]
+        assert instructors["total"] == 2 and lessons["total"] == 2
+        assert lessons["results"][0]["id"] == title["id"]
+        scores = [l["score"] for l in lessons["results"]]
+        assert scores == sorted(scores, reverse=True)
+        assert all("search" not in doc and "location" not in doc for doc in instructors["results"] + lessons["results"])
+    run(scenario())
+
+
+@pytest.mark.real_mongo
+def test_pagination_and_filters(indexed, run, api):
+    async def scenario():
+        db = indexed
+        instructor = await add_instructor(db, station_id="tignes")
+        for i in range(7):
+            await add_lesson(db, instructor, title=f"Stage snowboard {i}", price=40.0 + i)
+        async with api() as c:
+            pages = [(await c.get("/api/search", params={"q": "snowboard", "kind": "lessons", "page": page,
+                                                          "page_size": 3})).json()["lessons"] for page in (1, 2, 3)]
+            cheap = (await c.get("/api/search", params={"q": "snowboard", "kind": "lessons", "max_price": 42,
+                                                         "station_id": "tignes"})).json()
+        ids = [l["id"] for page in pages for l in page["results"]]
+        assert [len(page["results"]) for page in pages] == [3, 3, 1]
+        assert len(set(ids)) == 7 and all(page["total"] == 7 for page in pages)
+        assert cheap["lessons"]["total"] == 3 and "instructors" not in cheap
+    run(scenario())
+
+
+@pytest.mark.real_mongo
+def test_near_filters_by_distance_and_sorts_closest_first(indexed, run, api):
+    async def scenario():
+        db = indexed
+        far = await add_instructor(db, station_id="tignes")  # ~22 km from Courchevel
+        close = await add_instructor(db, station_id="meribel")  # ~6 km
+        here = await add_instructor(db, station_id="courchevel")
+        await add_lesson(db, far)
+        await add_lesson(db, here)
+        async with api() as c:
+            within_10 = (await c.get("/api/instructors", params={"near": COURCHEVEL, "radius_km": 10})).json()
+            within_30 = (await c.get("/api/instructors", params={"near": COURCHEVEL, "radius_km": 30})).json()
+            lessons = (await c.get("/api/lessons", params={"near": COURCHEVEL, "radius_km": 30})).json()
+            stations = (await c.get("/api/stations", params={"near": COURCHEVEL, "radius_km": 10})).json()
+        assert [i["id"] for i in within_10] == [here["id"], close["id"]]
+        assert [i["id"] for i in within_30] == [here["id"], close["id"], far["id"]]
+        assert [l["instructor_id"] for l in lessons] == [here["id"], far["id"]]
+        assert within_30[1]["distance_km"] == pytest.approx(5.6, abs=1)
+        assert stations[0]["id"] == "courchevel" and "location" not in stations[0]
+    run(scenario())
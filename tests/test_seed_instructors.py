@@ -0,0 +1,32 @@
+from seed_instructors import FICTIONAL_INSTRUCTORS, upsert_demo_instructors
+
+
+def test_reseeding_creates_nothing_twice(db, run):
+    async def scenario():
+        first = await upsert_demo_instructors(db)
+        second = await upsert_demo_instructors(db)
+        assert first["created_users"] == first["created_instructors"] == len(FICTIONAL_INSTRUCTORS)
+        assert second["created_users"] == second["created_instructors"] == second["created_lessons"] == 0
+        assert second["skipped"] == len(FICTIONAL_INSTRUCTORS)
+        assert await db.users.count_documents({}) == len(FICTIONAL_INSTRUCTORS)
+        assert await db.lessons.count_documents({}) == first["created_lessons"]
+        assert sorted(first["instructor_ids"]) == sorted(await db.instructors.distinct("id"))
+    run(scenario())
+
+
+def test_reseeding_moves_past_unbooked_lessons_forward(db, run):
+    async def scenario():
+        await upsert_demo_instructors(db)
+        fresh = {l["id"]: l["date"] for l in await db.lessons.find({}).to_list(None)}
+        booked, cancelled, *_ = fresh
+        await db.lessons.update_many({}, {"$set": {"date": "2020-01-01"}})
+        await db.lessons.update_one({"id": booked}, {"$set": {"current_participants": 1}})
+        await db.lessons.update_one({"id": cancelled}, {"$set": {"status": "cancelled"}})
+
+        result = await upsert_demo_instructors(db)
+
+        dates = {l["id"]: l["date"] for l in await db.lessons.find({}).to_list(None)}
+        assert result["moved_lessons"] == len(fresh) - 2
+        assert dates[booked] == dates[cancelled] == "2020-01-01"
+        assert all(dates[i] == fresh[i] for i in fresh if i not in (booked, cancelled))
+    run(scenario())
@@ -0,0 +1,91 @@
+"""Database sessions: expiry, per-user cap and the indexes that purge them"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+from tests.factories import add_session, add_user, bearer
+
+
+def test_valid_session_authenticates(db, run, api):
+    async def scenario():
+        user = await add_user(db, name="Alice")
+        token = await add_session(db, user)
+        async with api() as c:
+            response = await c.get("/api/auth/me", headers=bearer(token))
+        assert response.status_code == 200
+        assert response.json()["id"] == user["id"]
+    run(scenario())
+
+
+def test_expired_session_is_rejected_before_the_ttl_monitor_purges_it(db, run, api):
+    async def scenario():
+        user = await add_user(db)
+        token = await add_session(db, user, days=-1)
+        async with api() as c:
+            response = await c.get("/api/auth/me", headers=bearer(token))
+        assert response.status_code == 401
+        assert await db.user_sessions.count_documents({"session_token": token}) == 1
+        assert server.session_owners.get(token) is None
+    run(scenario())
+
+
+def test_legacy_string_expiry_is_still_honoured(db, run, api):
+    async def scenario():
+        user = await add_user(db)
+        valid, expired = await add_session(db, user), await add_session(db, user)
+        for token, delta in ((valid, timedelta(days=1)), (expired, timedelta(days=-1))):
+            iso = (datetime.now(timezone.utc) + delta).isoformat()
+            await db.user_sessions.update_one({"session_token": token}, {"$set": {"expires_at": iso}})
+        async with api() as c:
+            assert (await c.get("/api/auth/me", headers=bearer(valid))).status_code == 200
+            assert (await c.get("/api/auth/me", headers=bearer(expired))).status_code == 401
+    run(scenario())
+
+
+def test_logout_deletes_the_session(db, run, api):
+    async def scenario():
+        token = await add_session(db, await add_user(db))
+        async with api() as c:
+            assert (await c.post("/api/auth/logout", headers=bearer(token))).status_code == 200
+            assert (await c.get("/api/auth/me", headers=bearer(token))).status_code == 401
+        assert await db.user_sessions.count_documents({}) == 0
+    run(scenario())
+
+
+def test_trim_keeps_the_most_recent_sessions(db, run):
+    async def scenario():
+        user, other = await add_user(db), await add_user(db)
+        base = datetime.now(timezone.utc)
+        tokens = []
+        for i in range(server.MAX_SESSIONS_PER_USER + 3):
+            token = await add_session(db, user)
+            await db.user_sessions.update_one({"session_token": token},
+                                              {"$set": {"created_at": base + timedelta(minutes=i)}})
+            tokens.append(token)
+        other_token = await add_session(db, other)
+
+        await server.trim_user_sessions(user["id"])
+
+        kept = set(await db.user_sessions.distinct("session_token", {"user_id": user["id"]}))
+        assert kept == set(tokens[-server.MAX_SESSIONS_PER_USER:])
+        assert await db.user_sessions.count_documents({"session_token": other_token}) == 1
+    run(scenario())
+
+
+@pytest.mark.real_mongo
+def test_indexes_convert_string_dates_and_expire_sessions(db, run):
+    async def scenario():
+        user = await add_user(db)
+        token = await add_session(db, user)
+        iso = datetime.now(timezone.utc).isoformat()
+        await db.user_sessions.update_one({"session_token": token}, {"$set": {"expires_at": iso, "created_at": iso}})
+
+        await server.ensure_session_indexes()
+
+        session = await db.user_sessions.find_one({"session_token": token})
+        assert isinstance(session["expires_at"], datetime) and isinstance(session["created_at"], datetime)
+        indexes = {tuple(spec["key"]): spec for spec in (await db.user_sessions.index_information()).values()}
+        assert indexes[(("expires_at", 1),)]["expireAfterSeconds"] == 0
+        assert indexes[(("session_token", 1),)]["unique"]
+    run(scenario())
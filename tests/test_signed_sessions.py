@@ -0,0 +1,114 @@
+"""SESSION_MODE=signed: HMAC tokens verified without Mongo, revoked through session_revocations"""
+import time
+
+import pytest
+
+import server
+from tests.factories import add_session, add_user, bearer
+
+
+@pytest.fixture
+def signed(monkeypatch, db):
+    monkeypatch.setattr(server, "SESSION_MODE", "signed")
+    monkeypatch.setattr(server, "SESSION_SECRET", "s" * 32)
+    return server.User(email="alice@example.com", name="Alice", role="client")
+
+
+def test_roundtrip(signed):
+    claims = server.verify_session(server.sign_session(signed))
+    assert (claims["sub"], claims["email"], claims["role"]) == (signed.id, signed.email, "client")
+
+
+def test_tampered_and_malformed_tokens_are_rejected(signed):
+    token = server.sign_session(signed)
+    payload, _, signature = token.partition(".")
+    forged = server._b64encode(server.orjson.dumps({"sub": signed.id, "role": "admin"}))
+    for bad in (f"{forged}.{signature}", f"{payload}.{signature[:-2]}xx", f"{payload}.é{signature}",
+                f"{payload}.", "no-dot", "!!!.!!!", f"{payload}x.{server._signature(payload + 'x')}"):
+        assert server.verify_session(bad) is None, bad
+
+
+def test_other_secret_is_rejected(signed, monkeypatch):
+    token = server.sign_session(signed)
+    monkeypatch.setattr(server, "SESSION_SECRET", "t" * 32)
+    assert server.verify_session(token) is None
+
+
+def test_expired_token_is_rejected(signed, monkeypatch):
+    token = server.sign_session(signed)
+    later = time.time() + server.SESSION_TTL_DAYS * 86400 + 1
+    monkeypatch.setattr(server.time, "time", lambda: later)
+    assert server.verify_session(token) is None
+
+
+def test_revoke_session_and_user(signed, run):
+    async def scenario():
+        first, second = server.sign_session(signed), server.sign_session(signed)
+        await server.revocations.revoke_session(server.verify_session(first))
+        assert server.verify_session(first) is None
+        assert server.verify_session(second) is not None
+
+        await server.revocations.revoke_user(signed.id)
+        assert server.verify_session(second) is None
+        assert server.verify_session(server.sign_session(signed)) is not None
+    run(scenario())
+
+
+def test_revocations_reach_other_workers(signed, run):
+    async def scenario():
+        other_worker = server.RevocationList()
+        token = server.sign_session(signed)
+        claims = server.verify_session(token)
+        assert not other_worker.is_revoked(claims)
+
+        await server.revocations.revoke_session(claims)
+        await server.revocations.revoke_user("someone-else")
+        await other_worker.sync()
+
+        assert other_worker.is_revoked(claims)
+        assert set(other_worker.sessions) == {claims["sid"]}
+        assert set(other_worker.users) == {"someone-else"}
+    run(scenario())
+
+
+def test_authenticates_without_mongo(signed, run, api):
+    async def scenario():
+        token = server.sign_session(signed)
+        async with api() as c:
+            with server.query_budget(0):
+                user = await server.get_current_user(_request(token))
+            assert user.id == signed.id and user.role == "client"
+            assert (await c.get("/api/auth/me", headers=bearer(token))).status_code == 200
+    run(scenario())
+
+
+def test_crafted_non_ascii_cookie_is_a_401(signed, run, api):
+    async def scenario():
+        async with api() as c:
+            response = await c.get("/api/auth/me", headers={"Cookie": "session_token=a.é".encode("latin-1")})
+        assert response.status_code == 401
+    run(scenario())
+
+
+def test_logout_revokes_the_token(signed, run, api, db):
+    async def scenario():
+        token = server.sign_session(signed)
+        async with api() as c:
+            assert (await c.post("/api/auth/logout", headers=bearer(token))).status_code == 200
+            assert (await c.get("/api/auth/me", headers=bearer(token))).status_code == 401
+        assert await db.session_revocations.count_documents({}) == 1
+    run(scenario())
+
+
+def test_opaque_legacy_tokens_still_work(signed, run, api, db):
+    async def scenario():
+        user = await add_user(db)
+        token = await add_session(db, user)
+        async with api() as c:
+            response = await c.get("/api/auth/me", headers=bearer(token))
+        assert response.status_code == 200 and response.json()["id"] == user["id"]
+    run(scenario())
+
+
+def _request(token: str):
+    return server.Request({"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())]})